@@ -1,91 +1,270 @@
-# from django.contrib import admin
-# from .models import (
-#     Role, User, StudentProfile,
-#     Club, ClubMember, Event,
-#     EventRegistration, Feedback
-# )
-
-# # ---------- ROLE ----------
-# @admin.register(Role)
-# class RoleAdmin(admin.ModelAdmin):
-#     list_display = ('id', 'name')
-#     search_fields = ('name',)
-
-
-# # ---------- USER ----------
-# @admin.register(User)
-# class UserAdmin(admin.ModelAdmin):
-#     list_display = ('username', 'email', 'is_active', 'is_staff')
-#     search_fields = ('username', 'email')
-#     filter_horizontal = ('roles',)
-#     fieldsets = (
-#         (None, {'fields': ('username', 'email', 'password')}),
-#         ('Permissions', {'fields': ('is_staff', 'is_superuser', 'is_active', 'roles')}),
-#     )
-#     add_fieldsets = (
-#         (None, {
-#             'classes': ('wide',),
-#             'fields': ('username', 'email', 'password1', 'password2', 'roles', 'is_active'),
-#         }),
-#     )
-
-# admin.site.register(Role)
-# admin.site.register(StudentProfile)
-
-
-# # ---------- STUDENT PROFILE ----------
-# @admin.register(StudentProfile)
-# class StudentProfileAdmin(admin.ModelAdmin):
-#     list_display = ('id', 'user', 'department', 'university_id')
-#     search_fields = ('user__username', 'university_id', 'department')
-
-
-# # ---------- CLUB ----------
-# @admin.register(Club)
-# class ClubAdmin(admin.ModelAdmin):
-#     list_display = ('id', 'name', 'moderator', 'status', 'created_by', 'created_at')
-#     list_filter = ('status',)
-#     search_fields = ('name', 'description')
-#     readonly_fields = ('created_at',)
-
-
-# # ---------- CLUB MEMBER ----------
-# @admin.register(ClubMember)
-# class ClubMemberAdmin(admin.ModelAdmin):
-#     list_display = ('id', 'club', 'user', 'approved')
-#     list_filter = ('approved', 'club')
-#     search_fields = ('club__name', 'user__username')
-
-
-# # ---------- EVENT ----------
-# @admin.register(Event)
-# class EventAdmin(admin.ModelAdmin):
-#     list_display = ('id', 'title', 'club', 'venue', 'date_time', 'approved')
-#     list_filter = ('approved', 'club')
-#     search_fields = ('title', 'club__name', 'venue')
-#     ordering = ('-date_time',)
-
-
-# # ---------- EVENT REGISTRATION ----------
-# @admin.register(EventRegistration)
-# class EventRegistrationAdmin(admin.ModelAdmin):
-#     list_display = ('id', 'event', 'student', 'registered_at', 'payment_done')
-#     list_filter = ('payment_done', 'event')
-#     search_fields = ('event__title', 'student__username')
-
-
-# # ---------- FEEDBACK ----------
-# @admin.register(Feedback)
-# class FeedbackAdmin(admin.ModelAdmin):
-#     list_display = ('id', 'get_event', 'get_student', 'rating')
-#     list_filter = ('rating',)
-#     search_fields = ('registration__event__title', 'registration__student__username')
-
-#     def get_event(self, obj):
-#         return obj.registration.event.title
-#     get_event.short_description = 'Event'
-
-#     def get_student(self, obj):
-#         return obj.registration.student.username
-#     get_student.short_description = 'Student'
+from collections import defaultdict
+from django import forms
+from django.contrib import admin, messages
+from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
+from django.db import router, transaction
+from django.utils import timezone
+from .models import (
+    Role, User, StudentProfile,
+    Club, ClubMember, Event,
+    EventRegistration, Feedback
+)
+from .feed import fan_out_event, sync_member_feed
+from .jobs import enqueue
+from .outbox import queue_email, queue_bulk_email
+from .admin_pagination import EstimatedCountPaginator
+from .sharding import tenant_db, user_db
 
+
+# Changelists are built for big tables: related objects come from list_select_related
+# joins, FK inputs are autocompletes instead of <select>s with every row, filters only use
+# low-cardinality fields, and counts go through EstimatedCountPaginator.
+# Deleting a club, event or user from the admin soft-deletes it and queues the chunked
+# purge job, like the API does.
+# Clubs, events and their dependents are shown for the tenant picked with ?tenant=<code>
+# ( see TenantMiddleware in app/sharding.py ).
+
+
+class FastAdmin(admin.ModelAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False   # no extra COUNT(*) of the whole table next to filtered results
+    list_per_page = 50
+    ordering = ('-id',)              # primary key order, no sort over the whole table
+
+
+# delete = soft delete + purge job ( see app/purge.py )
+class SoftDeleteAdminMixin:
+    purge_job = None   # (job name, payload key)
+
+    # stamps deleted_at; models with more to do on delete override it
+    def soft_delete(self, queryset):
+        queryset.update(deleted_at=timezone.now())
+
+    def get_deleted_objects(self, objs, request):
+        # the confirmation page would otherwise collect every dependent row, which is what the purge job avoids
+        return [str(obj) for obj in objs], {self.model._meta.verbose_name_plural: len(objs)}, set(), []
+
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, self.model._default_manager.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        job_name, key = self.purge_job
+        with transaction.atomic(using=router.db_for_write(self.model)):
+            ids = list(queryset.values_list('id', flat=True))
+            self.soft_delete(self.model._default_manager.filter(id__in=ids))
+            for object_id in ids:
+                enqueue(job_name, {key: object_id}, user=request.user, tenant=self.purge_tenant(object_id))
+
+    def purge_tenant(self, object_id):
+        return None   # the shard the admin is working on
+
+
+# ---------- ROLE ----------
+@admin.register(Role)
+class RoleAdmin(admin.ModelAdmin):
+    list_display = ('id', 'name')
+    search_fields = ('name',)
+
+
+# ---------- USER ----------
+@admin.register(User)
+class UserAdmin(SoftDeleteAdminMixin, BaseUserAdmin):
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_display = ('username', 'email', 'tenant', 'is_active', 'is_staff')
+    list_filter = ('is_active', 'is_staff', 'is_superuser', 'tenant')
+    search_fields = ('^username', '^email')
+    filter_horizontal = ('roles',)
+    fieldsets = (
+        (None, {'fields': ('username', 'email', 'password', 'tenant')}),
+        ('Permissions', {'fields': ('is_staff', 'is_superuser', 'is_active', 'roles')}),
+    )
+    add_fieldsets = (
+        (None, {
+            'classes': ('wide',),
+            'fields': ('username', 'email', 'password1', 'password2', 'tenant', 'roles', 'is_active'),
+        }),
+    )
+    purge_job = ('purge_user', 'user_id')
+
+    def soft_delete(self, queryset):
+        # saved one by one, so the copies in the shards are deactivated as well
+        for user in queryset:
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+
+    def purge_tenant(self, object_id):
+        # the user's data lives in the shard of its own tenant
+        return User.objects.values_list('tenant', flat=True).get(pk=object_id)
+
+
+# ---------- STUDENT PROFILE ----------
+@admin.register(StudentProfile)
+class StudentProfileAdmin(FastAdmin):
+    list_display = ('id', 'user', 'department', 'university_id')
+    list_select_related = ('user',)
+    search_fields = ('^user__username', '=university_id', 'department')
+    autocomplete_fields = ('user',)
+
+
+# ---------- CLUB ----------
+class ClubAdminForm(forms.ModelForm):
+    class Meta:
+        model = Club
+        fields = '__all__'
+
+    def clean_moderator(self):
+        # the moderator must belong to the club's tenant ( see app/sharding.py )
+        moderator = self.cleaned_data.get('moderator')
+        club_db = self.instance._state.db or tenant_db()
+        if moderator is not None and user_db(moderator) != club_db:
+            raise forms.ValidationError(f"'{moderator.username}' belongs to another university than this club.")
+        return moderator
+
+
+@admin.register(Club)
+class ClubAdmin(SoftDeleteAdminMixin, FastAdmin):
+    form = ClubAdminForm
+    list_display = ('id', 'name', 'moderator', 'status', 'created_by', 'created_at')
+    list_select_related = ('moderator', 'created_by')
+    list_filter = ('status',)
+    search_fields = ('name',)
+    readonly_fields = ('created_at',)
+    autocomplete_fields = ('moderator', 'created_by')
+    actions = ['approve_clubs', 'reject_clubs']
+    purge_job = ('purge_club', 'club_id')
+
+    # ids of the users that may moderate a club of this tenant ( same rule as ClubSerializer )
+    def _valid_moderators(self, moderator_ids):
+        # roles live on the global database, so this is a second query rather than a join
+        moderators = User.objects.filter(id__in=moderator_ids, roles__name='moderator').only('id', 'tenant')
+        return {moderator.id for moderator in moderators if user_db(moderator) == tenant_db()}
+
+    def _set_status(self, request, queryset, new_status):
+        skipped = []
+        with transaction.atomic(using=tenant_db()):
+            clubs = list(queryset.exclude(status=new_status).values_list('id', 'name', 'created_by__email', 'moderator_id'))
+            if new_status == 'approved':
+                # "Moderator must be assigned before approval", which update() would skip
+                valid = self._valid_moderators({moderator_id for *_, moderator_id in clubs if moderator_id})
+                skipped = [name for _, name, _, moderator_id in clubs if moderator_id not in valid]
+                clubs = [club for club in clubs if club[3] in valid]
+            Club.objects.filter(id__in=[club_id for club_id, *_ in clubs]).update(status=new_status)
+            for _, name, email, _ in clubs:
+                queue_email(email, f"Your club '{name}' has been {new_status}", f"Your request to create the club '{name}' has been {new_status}.")
+        self.message_user(request, f"{len(clubs)} club(s) {new_status}.", messages.SUCCESS)
+        if skipped:
+            self.message_user(
+                request,
+                f"{len(skipped)} club(s) not approved, assign a moderator of their university first: {', '.join(skipped)}.",
+                messages.WARNING
+            )
+
+    @admin.action(description="Approve selected clubs")
+    def approve_clubs(self, request, queryset):
+        self._set_status(request, queryset, 'approved')
+
+    @admin.action(description="Reject selected clubs")
+    def reject_clubs(self, request, queryset):
+        self._set_status(request, queryset, 'rejected')
+
+    def soft_delete(self, queryset):
+        for club in queryset:
+            club.soft_delete()
+
+
+# ---------- CLUB MEMBER ----------
+@admin.register(ClubMember)
+class ClubMemberAdmin(FastAdmin):
+    list_display = ('id', 'club', 'user', 'approved')
+    list_select_related = ('club', 'user')
+    list_filter = ('approved',)
+    search_fields = ('^club__name', '^user__username')
+    autocomplete_fields = ('club', 'user')
+    actions = ['approve_members']
+
+    @admin.action(description="Approve selected membership requests")
+    def approve_members(self, request, queryset):
+        with transaction.atomic(using=tenant_db()):
+            # deactivated students' requests are left to the purge job, like in the API
+            pending = list(queryset.filter(approved=False, user__is_active=True).values_list('id', 'club_id', 'club__name', 'user_id', 'user__email'))
+            ClubMember.objects.filter(id__in=[row[0] for row in pending]).update(approved=True)
+
+            by_club = defaultdict(list)
+            for _, club_id, club_name, user_id, email in pending:
+                by_club[(club_id, club_name)].append((user_id, email))
+            for (club_id, club_name), members in by_club.items():
+                sync_member_feed([user_id for user_id, _ in members], club_id, True)
+                queue_bulk_email(
+                    [email for _, email in members],
+                    f"Membership approved: {club_name}",
+                    f"Your membership request for '{club_name}' has been approved."
+                )
+        self.message_user(request, f"{len(pending)} membership(s) approved.", messages.SUCCESS)
+
+
+# ---------- EVENT ----------
+@admin.register(Event)
+class EventAdmin(SoftDeleteAdminMixin, FastAdmin):
+    list_display = ('id', 'title', 'club', 'venue', 'date_time', 'approved')
+    list_select_related = ('club',)
+    list_filter = ('approved', 'requires_approval')
+    search_fields = ('title', '^club__name')
+    ordering = ('-date_time',)
+    autocomplete_fields = ('club',)
+    actions = ['approve_events']
+    purge_job = ('purge_event', 'event_id')
+
+    def get_queryset(self, request):
+        # also used by autocomplete, where Event.__str__ shows the club name
+        # ( the changelist skips list_select_related once the queryset has select_related )
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+    @admin.action(description="Approve selected events")
+    def approve_events(self, request, queryset):
+        with transaction.atomic(using=tenant_db()):
+            events = list(queryset.filter(approved=False).select_related('club'))
+            Event.objects.filter(id__in=[event.id for event in events]).update(approved=True, requires_approval=False)
+            for event in events:
+                event.approved = True
+                fan_out_event(event)
+                member_emails = ClubMember.objects.filter(club_id=event.club_id, approved=True, user__is_active=True).values_list('user__email', flat=True)
+                queue_bulk_email(
+                    member_emails,
+                    f"New event: {event.title}",
+                    f"{event.club.name} has a new event '{event.title}' on {event.date_time:%Y-%m-%d %H:%M} at {event.venue}."
+                )
+        self.message_user(request, f"{len(events)} event(s) approved.", messages.SUCCESS)
+
+
+# ---------- EVENT REGISTRATION ----------
+@admin.register(EventRegistration)
+class EventRegistrationAdmin(FastAdmin):
+    list_display = ('id', 'event', 'student', 'registered_at', 'payment_done')
+    list_select_related = ('event__club', 'student')
+    list_filter = ('payment_done',)
+    search_fields = ('^event__title', '^student__username')
+    autocomplete_fields = ('event', 'student')
+
+    def get_queryset(self, request):
+        # also used by autocomplete, where EventRegistration.__str__ shows the student and event
+        # ( the changelist skips list_select_related once the queryset has select_related )
+        return super().get_queryset(request).select_related(*self.list_select_related)
+
+
+# ---------- FEEDBACK ----------
+@admin.register(Feedback)
+class FeedbackAdmin(FastAdmin):
+    list_display = ('id', 'get_event', 'get_student', 'rating')
+    list_select_related = ('registration__event', 'registration__student')
+    list_filter = ('rating',)
+    search_fields = ('^registration__event__title', '^registration__student__username')
+    autocomplete_fields = ('registration',)
+
+    @admin.display(description='Event')
+    def get_event(self, obj):
+        return obj.registration.event.title
+
+    @admin.display(description='Student')
+    def get_student(self, obj):
+        return obj.registration.student.username
@@ -0,0 +1,53 @@
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections, transaction
+from django.utils.functional import cached_property
+
+
+# Kept apart from app/pagination.py, which needs DRF: the admin is loaded by
+# django.setup() in every process, including job workers and management commands.
+
+
+# admin changelist paginator that does not COUNT(*) big tables: results up to
+# ADMIN_EXACT_COUNT_LIMIT rows are counted exactly (a bounded scan), an unfiltered
+# list over a bigger table shows the row estimate kept by the database
+class EstimatedCountPaginator(Paginator):
+    @cached_property
+    def count(self):
+        limit = settings.ADMIN_EXACT_COUNT_LIMIT
+        queryset = self.object_list.order_by()
+        capped = queryset[:limit + 1].count()
+        if capped <= limit:
+            return capped
+        if self._is_unfiltered(queryset):
+            estimate = estimated_row_count(queryset.model, queryset.db)
+            if estimate:
+                return max(estimate, capped)
+        return capped
+
+    def _is_unfiltered(self, queryset):
+        # the default manager may filter too ( soft-deleted clubs and events )
+        return queryset.query.where == queryset.model._default_manager.all().query.where
+
+
+# row count estimate from the database statistics, None when there is none
+def estimated_row_count(model, using='default'):
+    connection = connections[using]
+    table = model._meta.db_table
+    queries = {
+        'postgresql': ("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", [table]),
+        'mysql': ("SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s", [table]),
+        # filled by ANALYZE: the first number of `stat` is the row count
+        'sqlite': ("SELECT stat FROM sqlite_stat1 WHERE tbl = %s LIMIT 1", [table]),
+    }
+    if connection.vendor not in queries:
+        return None
+    try:
+        with transaction.atomic(using=using), connection.cursor() as cursor:
+            cursor.execute(*queries[connection.vendor])
+            row = cursor.fetchone()
+    except DatabaseError:
+        return None
+    if not row or row[0] is None:
+        return None
+    return int(str(row[0]).split()[0])
@@ -4,3 +4,18 @@ from django.apps import AppConfig
 class AppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'app'
+
+    def ready(self):
+        # register background job handlers
+        from . import tasks
+
+        # copy users and student profiles into their tenant's shard
+        from django.db.models.signals import post_delete, post_save
+        from .sharding import mirror_on_save
+        post_save.connect(mirror_on_save, sender=self.get_model('User'), dispatch_uid='mirror_user')
+        post_save.connect(mirror_on_save, sender=self.get_model('StudentProfile'), dispatch_uid='mirror_student_profile')
+
+        # cached club ids of moderators ( see app/moderation.py )
+        from .moderation import club_changed
+        post_save.connect(club_changed, sender=self.get_model('Club'), dispatch_uid='moderator_scope_save')
+        post_delete.connect(club_changed, sender=self.get_model('Club'), dispatch_uid='moderator_scope_delete')
@@ -0,0 +1,100 @@
+import time
+from datetime import timedelta
+from django.db import transaction
+from django.utils import timezone
+from .models import (
+    Event, EventRegistration, Feedback, Attendance, EventSimilarity, RegistrationRollup,
+    ArchivedEvent, ArchivedEventRegistration, ArchivedFeedback,
+)
+from .sharding import tenant_db
+
+
+EVENT_FIELDS = ['id', 'club_id', 'title', 'description', 'date_time', 'venue', 'max_participants', 'fee', 'requires_approval', 'approved']
+REGISTRATION_FIELDS = ['id', 'event_id', 'student_id', 'registered_at', 'payment_done']
+FEEDBACK_FIELDS = ['id', 'registration_id', 'rating', 'comments']
+
+STATISTICS_FIELDS = ['id', 'title', 'total_registrations', 'total_amount_collected']
+
+
+# Move one chunk of events, with their registrations and feedback, to the archive tables.
+# The copy and the delete happen in the same transaction, so a row is always in exactly
+# one of hot or archive.
+def archive_chunk(event_ids):
+    with transaction.atomic(using=tenant_db()):
+        events = list(Event.objects.filter(id__in=event_ids).values(*EVENT_FIELDS))
+        registrations = list(EventRegistration.objects.filter(event_id__in=event_ids).values(*REGISTRATION_FIELDS))
+        feedback = list(Feedback.objects.filter(registration__event_id__in=event_ids).values(*FEEDBACK_FIELDS))
+
+        ArchivedEvent.objects.bulk_create([ArchivedEvent(**row) for row in events], batch_size=500)
+        ArchivedEventRegistration.objects.bulk_create([ArchivedEventRegistration(**row) for row in registrations], batch_size=500)
+        ArchivedFeedback.objects.bulk_create([ArchivedFeedback(**row) for row in feedback], batch_size=500)
+
+        # leaves first, so deleting the events has little left to cascade
+        Feedback.objects.filter(registration__event_id__in=event_ids).delete()
+        Attendance.objects.filter(event_id__in=event_ids).delete()
+        EventSimilarity.objects.filter(event_id__in=event_ids).delete()
+        EventSimilarity.objects.filter(similar_event_id__in=event_ids).delete()
+        RegistrationRollup.objects.filter(event_id__in=event_ids).delete()
+        EventRegistration.objects.filter(event_id__in=event_ids).delete()
+        Event.objects.filter(id__in=event_ids).delete()
+
+    return len(events), len(registrations), len(feedback)
+
+
+# Archive every event that took place before `before`, chunk_size events per transaction
+def archive_events(before, chunk_size, report=None):
+    totals = {'events': 0, 'registrations': 0, 'feedback': 0}
+    while True:
+        event_ids = list(Event.objects.filter(date_time__lt=before).order_by('id').values_list('id', flat=True)[:chunk_size])
+        if not event_ids:
+            break
+        events, registrations, feedback = archive_chunk(event_ids)
+        totals['events'] += events
+        totals['registrations'] += registrations
+        totals['feedback'] += feedback
+        if report:
+            report(f"archived {events} events, {registrations} registrations, {feedback} feedback")
+    return totals
+
+
+def archive_horizon(days):
+    return timezone.now() - timedelta(days=days)
+
+
+# Row counts of the hot and archive tables
+def table_sizes():
+    return {
+        model._meta.db_table: model.objects.count()
+        for model in [Event, EventRegistration, Feedback, ArchivedEvent, ArchivedEventRegistration, ArchivedFeedback]
+    }
+
+
+# Latency (ms, best of `repeat`) of the queries that run on every student request
+def hot_query_latency(repeat=5):
+    def best(func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return min(timings)
+
+    now = timezone.now()
+    sample_event = Event.objects.filter(date_time__gt=now).order_by('date_time').first()
+    latency = {
+        'approved_event_list': best(
+            lambda: list(Event.objects.filter(approved=True, date_time__gt=now).order_by('date_time')[:50])
+        ),
+    }
+    if sample_event:
+        latency['registration_seat_count'] = best(lambda: sample_event.registrations.count())
+    return latency
+
+
+# Statistics for hot and archived events together ( values rows, see EventStatisticsSerializer )
+def statistics_with_archive(hot_events, archived_events):
+    return (
+        hot_events.with_statistics().values(*STATISTICS_FIELDS)
+        .union(archived_events.with_statistics().values(*STATISTICS_FIELDS), all=True)
+        .order_by('id')
+    )
@@ -0,0 +1,20 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from .revocation import is_revoked
+from .sharding import set_tenant
+
+
+# JWT authentication that also rejects revoked tokens ( see app/revocation.py, no DB lookup )
+# and routes the rest of the request to the user's shard ( see app/sharding.py )
+class RevocableJWTAuthentication(JWTAuthentication):
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is not None:
+            set_tenant(result[0].tenant)
+        return result
+
+    def get_validated_token(self, raw_token):
+        token = super().get_validated_token(raw_token)
+        if is_revoked(token.payload):
+            raise InvalidToken({"detail": "Token has been revoked.", "code": "token_revoked"})
+        return token
@@ -0,0 +1,99 @@
+import contextvars
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import connections
+from django.urls import Resolver404, resolve
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# In-process execution of the sub-requests of a /batch/ call.
+#
+# Every sub-request is a real WSGIRequest dispatched straight to the view resolved
+# from app/urls.py, so permissions, throttles, validation and idempotency behave as
+# for a normal call. The user authenticated on the batch request is handed to DRF as
+# a forced authentication, so the JWT is decoded once per batch and the middleware
+# stack runs once.
+
+SAFE_METHODS = ['GET', 'HEAD', 'OPTIONS']
+
+# request.META keys carried over to sub-requests
+_INHERITED_META = ['SERVER_NAME', 'SERVER_PORT', 'SERVER_PROTOCOL', 'REMOTE_ADDR']
+
+
+def _build_environ(parent, method, path, query, body, headers):
+    payload = json.dumps(body, cls=JSONEncoder).encode() if body is not None else b''
+    environ = {
+        key: value for key, value in parent.META.items()
+        if key in _INHERITED_META or (key.startswith('HTTP_') and key != 'HTTP_AUTHORIZATION')
+    }
+    environ.pop('HTTP_IDEMPOTENCY_KEY', None)
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'SCRIPT_NAME': '',
+        'QUERY_STRING': query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(payload)),
+        'wsgi.input': io.BytesIO(payload),
+        'wsgi.url_scheme': parent.scheme,
+    })
+    for name, value in (headers or {}).items():
+        environ['HTTP_' + name.upper().replace('-', '_')] = str(value)
+    return environ
+
+
+def _response_body(response):
+    if hasattr(response, 'data'):
+        return response.data
+    if response.streaming:
+        content = b''.join(response.streaming_content)
+    else:
+        content = response.content
+    try:
+        return json.loads(content) if content else None
+    except ValueError:
+        return content.decode(errors='replace')
+
+
+def run_sub_request(parent, user, auth, spec, excluded_views):
+    method = str(spec.get('method', 'GET')).upper()
+    url = urlsplit(str(spec.get('path', '')))
+    path = url.path if url.path.startswith('/') else '/' + url.path
+
+    try:
+        match = resolve(path, urlconf='app.urls')
+    except Resolver404:
+        return {"status": 404, "body": {"detail": f"No route for '{path}'."}}
+    if getattr(match.func, 'view_class', None) in excluded_views:
+        return {"status": 400, "body": {"detail": "This route cannot be used inside a batch."}}
+
+    sub_request = WSGIRequest(_build_environ(parent, method, path, url.query, spec.get('body'), spec.get('headers')))
+    sub_request._force_auth_user = user
+    sub_request._force_auth_token = auth
+
+    response = match.func(sub_request, *match.args, **match.kwargs)
+    return {"status": response.status_code, "body": _response_body(response)}
+
+
+def _run_in_thread(*args):
+    try:
+        return run_sub_request(*args)
+    finally:
+        # worker threads open their own connections, close them before the thread is reused
+        connections.close_all()
+
+
+# Run all sub-requests; when `parallel` is set and every sub-request is a read,
+# they run concurrently on a thread pool (each thread uses its own DB connection)
+def run_batch(parent, user, auth, specs, parallel, max_workers, excluded_views):
+    if parallel and all(str(spec.get('method', 'GET')).upper() in SAFE_METHODS for spec in specs):
+        # each thread runs in a copy of this context, so it sees the tenant ( see app/sharding.py )
+        contexts = [contextvars.copy_context() for _ in specs]
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(
+                lambda context, spec: context.run(_run_in_thread, parent, user, auth, spec, excluded_views), contexts, specs
+            ))
+    return [run_sub_request(parent, user, auth, spec, excluded_views) for spec in specs]
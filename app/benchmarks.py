@@ -0,0 +1,840 @@
+import asyncio
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from types import SimpleNamespace
+from concurrent.futures import ProcessPoolExecutor
+import django
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import caches
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.db.models import Count
+from django.db.models.functions import TruncDay
+from django.test import Client, override_settings
+from rest_framework.test import APIClient
+from django.utils import timezone
+from .models import User, Role, StudentProfile, Club, ClubMember, Event, EventRegistration, EventWaitlist, Feedback
+from .feed import fan_out_event, feed_queryset, naive_feed_queryset
+from .purge import purge_club
+from . import revocation
+from .payments import parse_payment_file, reconcile_payments
+from .tickets import issue_ticket, read_ticket
+from .recommendations import build_similarities, recommended_events
+from .rollups import rebuild_rollups, registration_series
+from .registrations import register_student
+from .sharding import tenant_context
+from .startup import child_environ
+from .seats import current_seats, get_hub, seat_events, seats_key
+from .moderation import moderated_club_ids
+from .serializers import ClubListSerializer, ClubListValuesSerializer, ModeratorEventSerializer, ModeratorEventValuesSerializer, EventRegistrationFormSerializer
+
+
+# Benchmarks run by `manage.py bench <name>`. Each one seeds its own data inside a
+# transaction that is rolled back at the end, so they can run against a dev database.
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def run(name, report, **options):
+    # 4xx responses are expected in load tests, keep them out of the report
+    logging.getLogger('django.request').setLevel(logging.ERROR)
+    with transaction.atomic():
+        BENCHMARKS[name](report, **options)
+        transaction.set_rollback(True)
+
+
+# Call func `repeat` times; returns (best ms, mean ms, queries of one call)
+def measure(func, repeat=5):
+    timings = []
+    counter = QueryCounter()
+    for _ in range(repeat):
+        counter.count = 0
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+    return min(timings), sum(timings) / len(timings), counter.count
+
+
+# execute_wrapper that counts statements (the debug query log is capped at 9000)
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def format_result(label, result):
+    best, mean, queries = result
+    return f"{label:<40} best {best:9.2f} ms   mean {mean:9.2f} ms   {queries:4d} queries"
+
+
+# test client that passes ALLOWED_HOSTS outside the test runner
+def bench_client():
+    return Client(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+
+
+def bench_api_client(user):
+    client = APIClient(HTTP_HOST=settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost')
+    client.force_authenticate(user)
+    return client
+
+
+# ---------- seed helpers ----------
+
+def seed_users(count, prefix, role=None):
+    users = User.objects.bulk_create(
+        [User(username=f"{prefix}{i}", email=f"{prefix}{i}@bench.local", password='!') for i in range(count)],
+        batch_size=1000,
+    )
+    if role:
+        role_obj, _ = Role.objects.get_or_create(name=role)
+        User.roles.through.objects.bulk_create(
+            [User.roles.through(user_id=user.id, role_id=role_obj.id) for user in users],
+            batch_size=1000,
+        )
+    return users
+
+
+def seed_clubs(count, moderator, creator, prefix='club'):
+    return Club.objects.bulk_create(
+        [
+            Club(name=f"{prefix}{i}", description='benchmark club ' * 20, moderator=moderator, created_by=creator, status='approved')
+            for i in range(count)
+        ],
+        batch_size=1000,
+    )
+
+
+def seed_events(clubs, per_club, approved=True, days_ahead=7, **extra):
+    now = timezone.now()
+    return Event.objects.bulk_create(
+        [
+            Event(
+                club=club, title=f"{club.name} event {i}", description='benchmark event ' * 20,
+                date_time=now + timedelta(days=days_ahead, minutes=i), venue='Main hall',
+                max_participants=1000, fee=100, approved=approved, **extra
+            )
+            for club in clubs for i in range(per_club)
+        ],
+        batch_size=1000,
+    )
+
+
+def seed_memberships(users, clubs, approved=True):
+    return ClubMember.objects.bulk_create(
+        [ClubMember(user=user, club=club, approved=approved) for user in users for club in clubs],
+        batch_size=1000,
+    )
+
+
+
+# ---------- benchmarks ----------
+
+# "my feed": precomputed feed table vs joining events with memberships on every read
+@benchmark('feed')
+def bench_feed(report, scale=1):
+    moderator = seed_users(1, 'feedmod', role='moderator')[0]
+    students = seed_users(200 * scale, 'feedstudent', role='student')
+    clubs = seed_clubs(50 * scale, moderator, students[0], prefix='feedclub')
+    events = seed_events(clubs, 20)
+
+    # every student is in 5 clubs, spread over all clubs
+    ClubMember.objects.bulk_create(
+        [
+            ClubMember(user=student, club=clubs[(i * 7 + k) % len(clubs)], approved=True)
+            for i, student in enumerate(students) for k in range(5)
+        ],
+        batch_size=1000,
+    )
+    report(f"seeded {len(students)} students, {len(clubs)} clubs, {len(events)} events")
+
+    started = time.perf_counter()
+    for event in events:
+        fan_out_event(event)
+    report(f"fan-out on approval: {(time.perf_counter() - started) * 1000 / len(events):.2f} ms per event")
+
+    sample = students[::max(len(students) // 20, 1)]
+    for label, build in [('naive join', naive_feed_queryset), ('precomputed feed', feed_queryset)]:
+        result = measure(lambda: [list(build(student)[:20]) for student in sample])
+        report(format_result(f"{label} (first page x{len(sample)})", result))
+
+
+
+# load test: one client hammering the login endpoint while a normal user keeps logging in
+# with their own account, then the attacked account's owner logs in from another address
+@benchmark('throttle')
+def bench_throttle(report, scale=1):
+    victim = User.objects.create_user(username='throttleuser', email='throttle@bench.local', password='correct horse')
+    user = User.objects.create_user(username='throttlenormal', email='throttlenormal@bench.local', password='correct horse')
+    # fresh client addresses so earlier runs' buckets do not interfere
+    abuser_ip, normal_ip, owner_ip = (f"10.{uuid.uuid4().int % 250}.0.{host}" for host in (1, 2, 3))
+    client = bench_client()
+
+    def login(ip, account, password):
+        started = time.perf_counter()
+        response = client.post('/token/', {'username': account.username, 'password': password}, REMOTE_ADDR=ip)
+        return response.status_code, (time.perf_counter() - started) * 1000, response.get('Retry-After')
+
+    abusive = [login(abuser_ip, victim, 'wrong password') for _ in range(200 * scale)]
+    normal = [login(normal_ip, user, 'correct horse') for _ in range(3)]
+    owner = login(owner_ip, victim, 'correct horse')
+
+    rejected = [ms for code, ms, _ in abusive if code == 429]
+    attempted = [ms for code, ms, _ in abusive if code != 429]
+    report(f"abusive client: {len(abusive)} requests, {len(attempted)} reached the password check, {len(rejected)} throttled")
+    if attempted:
+        report(f"  password check   mean {sum(attempted) / len(attempted):8.2f} ms")
+    if rejected:
+        report(f"  throttled (429)  mean {sum(rejected) / len(rejected):8.2f} ms   Retry-After {abusive[-1][2]}s")
+    report(f"normal client during the storm: {[code for code, _, _ in normal]}, "
+           f"mean {sum(ms for _, ms, _ in normal) / len(normal):.2f} ms")
+    # 429 here means the abusive client locked the owner out of the account
+    report(f"owner of the attacked account from another address: {owner[0]}"
+           + (f" ( locked out, Retry-After {owner[2]}s )" if owner[0] == 429 else ""))
+
+
+
+# list serialization: ModelSerializer over model instances vs ValuesSerializer over values()
+@benchmark('serializers')
+def bench_serializers(report, scale=1):
+    moderator = seed_users(1, 'sermod', role='moderator')[0]
+    creators = seed_users(50, 'sercreator', role='student')
+    clubs = Club.objects.bulk_create(
+        [
+            Club(name=f"serclub{i}", description='benchmark club ' * 50, moderator=moderator,
+                 created_by=creators[i % len(creators)], status='approved')
+            for i in range(2000 * scale)
+        ],
+        batch_size=1000,
+    )
+    seed_events(clubs[:200 * scale], 5)
+
+    clubs_qs = Club.objects.filter(status='approved', name__startswith='serclub')
+    events_qs = Event.objects.filter(club__moderator=moderator, approved=True)
+    cases = [
+        ('clubs', clubs_qs, ClubListSerializer, ClubListValuesSerializer, 'id,name'),
+        ('moderator events', events_qs, ModeratorEventSerializer, ModeratorEventValuesSerializer, 'id,title'),
+    ]
+
+    def values_path(values_serializer, fields, queryset):
+        serializer = values_serializer(fields)
+        return lambda: serializer.to_representation(serializer.values(queryset))
+
+    for label, queryset, model_serializer, values_serializer, sparse in cases:
+        rows = queryset.count()
+        report(f"{label}: {rows} rows")
+        paths = [
+            ('ModelSerializer', lambda: model_serializer(queryset.all(), many=True).data),
+            ('values()', values_path(values_serializer, None, queryset)),
+            (f"values() ?fields={sparse}", values_path(values_serializer, sparse, queryset)),
+        ]
+        for path_label, func in paths:
+            best, mean, queries = measure(func, repeat=3)
+            report(f"  {path_label:<28} {best:9.2f} ms  {best * 1000 / rows:8.2f} us/row  {queries:5d} queries")
+
+
+
+# full registration dump: rendered in one piece vs streamed with ?stream=true
+@benchmark('stream')
+def bench_stream(report, scale=1):
+    moderator = seed_users(1, 'streammod', role='moderator')[0]
+    client = bench_api_client(moderator)
+
+    for size in [1000 * scale, 5000 * scale]:
+        students = seed_users(size, f"stream{size}s", role='student')
+        club = seed_clubs(1, moderator, students[0], prefix=f"stream{size}club")[0]
+        event = seed_events([club], 1)[0]
+        EventRegistration.objects.bulk_create(
+            [EventRegistration(event=event, student=student) for student in students], batch_size=1000
+        )
+
+        def fetch(query):
+            response = client.get(f"/event/registrations/{event.id}/{query}")
+            if response.streaming:
+                return sum(len(part) for part in response.streaming_content)
+            return len(response.content)
+
+        for label, query in [('in memory', ''), ('streamed', '?stream=true')]:
+            best, _, queries = measure(lambda: fetch(query), repeat=3)
+            # memory is traced on a separate run, tracing slows everything down
+            tracemalloc.start()
+            body_size = fetch(query)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            report(
+                f"{size:7d} rows {label:<10} {best:9.2f} ms  {queries:3d} queries   "
+                f"peak {peak / 1024 / 1024:7.2f} MiB   body {body_size / 1024:8.1f} KiB"
+            )
+
+
+
+# write-lock hold time when deleting a big club: one cascading delete vs soft delete + chunked purge
+@benchmark('delete')
+def bench_delete(report, scale=1, chunk_size=None):
+    chunk_size = chunk_size or settings.PURGE_CHUNK_SIZE
+    moderator = seed_users(1, 'delmod', role='moderator')[0]
+    students = seed_users(500 * scale, 'dels', role='student')
+
+    def seed_club(prefix):
+        club = seed_clubs(1, moderator, moderator, prefix=prefix)[0]
+        seed_memberships(students, [club])
+        events = seed_events([club], 20)
+        registrations = EventRegistration.objects.bulk_create(
+            [EventRegistration(event=event, student=student) for event in events for student in students], batch_size=1000
+        )
+        Feedback.objects.bulk_create([Feedback(registration=registration) for registration in registrations], batch_size=1000)
+        return club
+
+    club = seed_club('delcascade')
+    rows = ClubMember.objects.filter(club=club).count() + Event.objects.filter(club=club).count()
+    rows += 2 * EventRegistration.objects.filter(event__club=club).count()
+    report(f"club with {rows} dependent rows, chunk size {chunk_size}")
+
+    started = time.perf_counter()
+    with transaction.atomic():
+        Club.objects.get(id=club.id).delete()
+    report(f"{'club.delete() (one transaction)':<40} lock held {(time.perf_counter() - started) * 1000:9.2f} ms")
+
+    club = seed_club('delchunked')
+    started = time.perf_counter()
+    with transaction.atomic():
+        club.soft_delete()
+    report(f"{'soft delete (request)':<40} lock held {(time.perf_counter() - started) * 1000:9.2f} ms")
+
+    chunks = []
+    started = time.perf_counter()
+    purge_club(club.id, chunk_size, lambda label, count, seconds: chunks.append(seconds * 1000))
+    total = (time.perf_counter() - started) * 1000
+    report(
+        f"{'chunked purge (job)':<40} lock held {max(chunks):9.2f} ms max per chunk, "
+        f"{len(chunks)} chunks, {total:.2f} ms total"
+    )
+
+
+
+# cost of the revocation check done on every authenticated request
+@benchmark('revocation')
+def bench_revocation(report, scale=1, checks=20000):
+    now = int(time.time())
+    revoked = 1000 * scale
+
+    # a process-local cache keeps the benchmark's revocations out of the shared one
+    bench_cache = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-revocation', 'OPTIONS': {'MAX_ENTRIES': revoked * 2}}
+    with override_settings(CACHES={**settings.CACHES, 'bench_revocation': bench_cache}, REVOCATION_CACHE='bench_revocation', REVOCATION_SYNC_SECONDS=0):
+        revocation._local.version = None
+        started = time.perf_counter()
+        for i in range(revoked):
+            revocation.revoke_token({'jti': f"revoked-{i}", 'exp': now + 3600, 'user_id': i})
+        report(f"revoked {revoked} tokens in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+        for label, sync_seconds in [('sync every check', 0), ('sync every second', 1)]:
+            with override_settings(REVOCATION_SYNC_SECONDS=sync_seconds):
+                payloads = [{'jti': f"live-{i}", 'iat': now, 'user_id': i} for i in range(checks)]
+                counter = QueryCounter()
+                with connection.execute_wrapper(counter):
+                    started = time.perf_counter()
+                    false_positives = sum(revocation.is_revoked(payload) for payload in payloads)
+                    elapsed = time.perf_counter() - started
+                report(
+                    f"{label:<20} {elapsed * 1e6 / checks:8.2f} us/check   {counter.count} queries   "
+                    f"{false_positives} wrongly revoked"
+                )
+                blocked = sum(revocation.is_revoked({'jti': f"revoked-{i}", 'iat': now, 'user_id': i}) for i in range(revoked))
+                report(f"{'':<20} {blocked}/{revoked} revoked tokens rejected")
+
+    revocation._local.version = None
+
+
+
+# reconciling a payment file: one joined lookup + batched updates vs one lookup and save per row
+@benchmark('payments')
+def bench_payments(report, scale=1):
+    size = 20000 * scale
+    moderator = seed_users(1, 'paymod', role='moderator')[0]
+    students = seed_users(size, 'pay', role='student')
+    StudentProfile.objects.bulk_create(
+        [StudentProfile(user=student, department='CS', university_id=f"U{student.id}") for student in students], batch_size=1000
+    )
+    club = seed_clubs(1, moderator, moderator, prefix='payclub')[0]
+    event = seed_events([club], 1)[0]
+    EventRegistration.objects.bulk_create([EventRegistration(event=event, student=student) for student in students], batch_size=1000)
+
+    # half matched by university id, half by email, plus unknown students and repeated payments
+    lines = ['university_id,email,amount']
+    lines += [f"U{student.id},,100" if i % 2 else f",{student.email},100" for i, student in enumerate(students)]
+    lines += [f"X{i},nobody{i}@bench.local,100" for i in range(size // 100)]
+    lines += [f"U{student.id},,100" for student in students[:size // 100]]
+    payment_file = '\n'.join(lines)
+
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        result = reconcile_payments(event, parse_payment_file(payment_file), settings.PAYMENT_RECONCILE_BATCH_SIZE)
+        elapsed = time.perf_counter() - started
+    report(
+        f"{'reconcile_payments':<24} {len(lines) - 1} rows in {elapsed * 1000:9.2f} ms   {counter.count} queries   "
+        f"{result['matched']} matched, {len(result['unmatched'])} unmatched, {len(result['duplicates'])} duplicates"
+    )
+
+    # the per-row way, timed on a sample and extrapolated
+    EventRegistration.objects.filter(event=event).update(payment_done=False)
+    sample = students[:1000]
+    counter = QueryCounter()
+    with connection.execute_wrapper(counter):
+        started = time.perf_counter()
+        for student in sample:
+            registration = EventRegistration.objects.get(event=event, student__email=student.email)
+            registration.payment_done = True
+            registration.save()
+        elapsed = (time.perf_counter() - started) * size / len(sample)
+    report(f"{'get() + save() per row':<24} ~{size} rows in {elapsed * 1000:9.2f} ms   ~{counter.count * size // len(sample)} queries (extrapolated)")
+
+
+
+# door check-in: scans per second through POST event/<id>/checkin/ in batches
+@benchmark('checkin')
+def bench_checkin(report, scale=1, batch=200):
+    size = 5000 * scale
+    moderator = seed_users(1, 'checkinmod', role='moderator')[0]
+    students = seed_users(size, 'checkin', role='student')
+    club = seed_clubs(1, moderator, moderator, prefix='checkinclub')[0]
+    event = seed_events([club], 1)[0]
+    registrations = EventRegistration.objects.bulk_create(
+        [EventRegistration(event=event, student=student) for student in students], batch_size=1000
+    )
+    tickets = [issue_ticket(registration) for registration in registrations]
+
+    started = time.perf_counter()
+    for ticket in tickets:
+        read_ticket(ticket)
+    report(f"{'signature check only':<32} {size / (time.perf_counter() - started):12.0f} scans/s")
+
+    client = bench_api_client(moderator)
+    for label in ['first scan', 'duplicate scan']:
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            started = time.perf_counter()
+            for start in range(0, size, batch):
+                response = client.post(f"/event/{event.id}/checkin/", {'tickets': tickets[start:start + batch]}, format='json')
+                assert response.status_code == 200, response.content
+            elapsed = time.perf_counter() - started
+        report(f"{label + f' (batches of {batch})':<32} {size / elapsed:12.0f} scans/s   {counter.count * batch / size:6.1f} queries per batch")
+
+
+
+# similarity build time as registrations grow, and the cost of serving recommendations
+@benchmark('recommendations')
+def bench_recommendations(report, scale=1):
+    moderator = seed_users(1, 'recmod', role='moderator')[0]
+    clubs = seed_clubs(50, moderator, moderator, prefix='recclub')
+    events = seed_events(clubs[:25], 20, days_ahead=-30) + seed_events(clubs, 20)
+    students = seed_users(2000 * scale, 'rec', role='student')
+    seed_memberships(students[:200], clubs[:10])
+
+    events_by_club = {}
+    for event in events:
+        events_by_club.setdefault(event.club_id, []).append(event)
+
+    # every student registers for events of a few "favourite" clubs, so co-registrations cluster
+    for step in range(1, 5):
+        rows = []
+        for i, student in enumerate(students):
+            club_events = events_by_club[clubs[(i * 7 + step * 13) % len(clubs)].id]
+            for offset in range(5):
+                rows.append(EventRegistration(event=club_events[(i + step + offset) % len(club_events)], student=student))
+        EventRegistration.objects.bulk_create(rows, batch_size=1000, ignore_conflicts=True)
+        stats = build_similarities()
+        report(
+            f"{EventRegistration.objects.count():8d} registrations  {stats['interactions']:8d} interactions  "
+            f"{stats['events']:5d} events  build {stats['seconds'] * 1000:9.2f} ms  {stats['similarities']} similarities"
+        )
+
+    student = students[0]
+    best, _, queries = measure(lambda: list(recommended_events(student)), repeat=5)
+    report(format_result('recommended_events()', (best, best, queries)))
+
+
+
+# club registration velocity: counting raw registrations vs reading the rollups
+@benchmark('rollups')
+def bench_rollups(report, scale=1):
+    moderator = seed_users(1, 'rollmod', role='moderator')[0]
+    students = seed_users(2000 * scale, 'roll', role='student')
+    club = seed_clubs(1, moderator, moderator, prefix='rollclub')[0]
+    events = seed_events([club], 25)
+    EventRegistration.objects.bulk_create(
+        [EventRegistration(event=event, student=student) for event in events for student in students], batch_size=1000
+    )
+    # spread the registrations of each event over a different day
+    now = timezone.now()
+    for offset, event in enumerate(events):
+        EventRegistration.objects.filter(event=event).update(registered_at=now - timedelta(days=offset, hours=offset))
+
+    started = time.perf_counter()
+    rows = rebuild_rollups([event.id for event in events])
+    report(f"rebuild_rollups(): {rows} rollup rows from {len(events) * len(students)} registrations in {(time.perf_counter() - started) * 1000:.2f} ms")
+
+    raw = lambda: list(
+        EventRegistration.objects.filter(event__club=club).annotate(bucket=TruncDay('registered_at'))
+        .values('bucket').annotate(count=Count('id')).order_by('bucket')
+    )
+    rolled = lambda: registration_series('day', club_id=club.id)
+    report(format_result('raw registrations (TruncDay)', measure(raw)))
+    report(format_result('rollups', measure(rolled)))
+
+
+
+# throwaway SQLite shards in a temporary directory: `count` copies of one migrated database
+@contextmanager
+def scratch_shards(count):
+    directory = tempfile.mkdtemp(prefix='bench-shards-')
+    aliases = [f'bench_shard_{i}' for i in range(count + 1)]
+    for alias in aliases:
+        connections.settings[alias] = {**connections.settings['default'], 'NAME': os.path.join(directory, f'{alias}.sqlite3')}
+    try:
+        template = aliases.pop()
+        call_command('migrate', database=template, verbosity=0)
+        connections[template].close()
+        for alias in aliases:
+            shutil.copyfile(connections.settings[template]['NAME'], connections.settings[alias]['NAME'])
+        with override_settings(SHARDS={f'bench{i}': alias for i, alias in enumerate(aliases)}):
+            yield settings.SHARDS
+    finally:
+        for alias in [*aliases, template]:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+# writer process of the shards benchmark: registers `student_ids` for one event of a scratch shard
+def _write_registrations(alias, path, tenant, event_id, student_ids):
+    connections.settings[alias] = {**connections.settings['default'], 'NAME': path}
+    try:
+        with override_settings(SHARDS={tenant: alias}), tenant_context(tenant):
+            event = Event.objects.get(pk=event_id)
+            for student in User.objects.db_manager(alias).filter(id__in=student_ids):
+                register_student(event, student)
+    finally:
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+def _warm_up(seconds):
+    time.sleep(seconds)
+
+
+# registration write throughput with the same writer processes ( like web workers )
+# spread over 1, 2, 4 ... shards
+@benchmark('shards')
+def bench_shards(report, scale=1, writers=8, max_shards=8):
+    per_writer = 50 * scale
+    # one SQLite file admits one writer at a time; shards only help while there are cores to write in parallel
+    report(f"{os.cpu_count()} CPU core(s)")
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=writers, mp_context=context, initializer=django.setup) as pool:
+        # start every process ( and set Django up in it ) before timing anything
+        list(pool.map(_warm_up, [0.5] * writers))
+
+        baseline = None
+        shard_count = 1
+        while shard_count <= max_shards:
+            with scratch_shards(shard_count) as shards:
+                # every writer gets its own students; each shard one event with room for all of them
+                events = []
+                for tenant, alias in shards.items():
+                    moderator = User.objects.db_manager(alias).create(username=f'{tenant}mod', email=f'{tenant}mod@bench.local', tenant=tenant)
+                    club = Club.objects.db_manager(alias).create(name=f'{tenant} club', description='', moderator=moderator, created_by=moderator, status='approved')
+                    events.append((tenant, alias, Event.objects.db_manager(alias).create(
+                        club=club, title=f'{tenant} event', description='', date_time=timezone.now() + timedelta(days=7),
+                        venue='Main hall', max_participants=writers * per_writer, fee=0, approved=True,
+                    )))
+                jobs = []
+                for writer in range(writers):
+                    tenant, alias, event = events[writer % len(events)]
+                    students = User.objects.db_manager(alias).bulk_create([
+                        User(username=f'{tenant}w{writer}s{i}', email=f'{tenant}w{writer}s{i}@bench.local', password='!', tenant=tenant)
+                        for i in range(per_writer)
+                    ])
+                    jobs.append((alias, connections.settings[alias]['NAME'], tenant, event.id, [student.id for student in students]))
+                for alias in shards.values():
+                    connections[alias].close()
+
+                started = time.perf_counter()
+                for future in [pool.submit(_write_registrations, *job) for job in jobs]:
+                    future.result()
+                elapsed = time.perf_counter() - started
+
+            throughput = writers * per_writer / elapsed
+            baseline = baseline or throughput
+            report(
+                f"{shard_count} shard(s), {writers} writers   {writers * per_writer} registrations in {elapsed * 1000:9.2f} ms   "
+                f"{throughput:8.1f} writes/s   x{throughput / baseline:.2f}"
+            )
+            shard_count *= 2
+
+
+
+# run in a fresh interpreter by the startup benchmark: load the WSGI / ASGI application,
+# then serve one request with it; prints {ready, first_request} in ms
+_STARTUP_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+from event_management_system.{kind} import application
+ready = time.perf_counter()
+from django.conf import settings
+host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS else 'localhost'
+path = {path!r}
+if '{kind}' == 'wsgi':
+    from wsgiref.util import setup_testing_defaults
+    environ = {{'PATH_INFO': path, 'HTTP_HOST': host}}
+    setup_testing_defaults(environ)
+    statuses = []
+    b''.join(application(environ, lambda status, headers: statuses.append(status)))
+    status = statuses[0]
+else:
+    async def request():
+        sent = []
+        body = [{{'type': 'http.request', 'body': b'', 'more_body': False}}]
+        async def receive():
+            if body:
+                return body.pop()
+            await asyncio.Event().wait()
+        async def send(message):
+            sent.append(message)
+        await application({{
+            'type': 'http', 'asgi': {{'version': '3.0'}}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', host.encode())], 'server': (host, 80), 'client': ('127.0.0.1', 50000),
+        }}, receive, send)
+        return sent[0]['status']
+    status = asyncio.run(request())
+done = time.perf_counter()
+print(json.dumps({{'ready': (ready - started) * 1000, 'first_request': (done - ready) * 1000, 'status': str(status)}}))
+"""
+
+
+# worker cold start: time to load wsgi.py / asgi.py and to serve the first request,
+# with the start-up warm-up and with lazy views only
+@benchmark('startup')
+def bench_startup(report, scale=1, repeat=3, path='/event/approved/'):
+    for kind in ['wsgi', 'asgi']:
+        for label, warm_up in [('warm-up', '1'), ('lazy views', '0')]:
+            runs = []
+            for _ in range(repeat * scale):
+                result = subprocess.run(
+                    [sys.executable, '-c', _STARTUP_PROBE.format(kind=kind, path=path)],
+                    env=child_environ({'WARM_UP_ON_STARTUP': warm_up}), capture_output=True, text=True, check=True,
+                )
+                runs.append(json.loads(result.stdout.strip().splitlines()[-1]))
+            report(
+                f"{kind} {label:<12} ready in {min(run['ready'] for run in runs):8.1f} ms   "
+                f"first request {min(run['first_request'] for run in runs):8.1f} ms   "
+                f"(best of {len(runs)}, status {runs[0]['status'].split()[0]})"
+            )
+
+
+
+async def _watch_seats(keys, initial, watchers, seconds, writes_per_second):
+    key, event_id = next(iter(keys.items()))
+    cache = caches[settings.SEATS_CACHE]
+    received = [0] * watchers
+
+    async def watch(index):
+        async for message in seat_events(keys, initial):
+            if message.startswith(b'event:'):
+                received[index] += 1
+
+    tasks = [asyncio.create_task(watch(index)) for index in range(watchers)]
+    await asyncio.sleep(0)
+    seats_left, writes = initial[event_id], 0
+    started = time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        # what publish_seats does when a registration commits
+        seats_left -= 1
+        cache.set(key, seats_left)
+        writes += 1
+        await asyncio.sleep(1 / writes_per_second)
+    await asyncio.sleep(settings.SEATS_STREAM_INTERVAL * 2)
+    elapsed = time.perf_counter() - started
+    polls = get_hub().polls
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return writes, received, polls, elapsed
+
+
+# thousands of students watching one event's seats_left: polling the API vs the SSE hub
+@benchmark('seats')
+def bench_seats(report, scale=1, watchers=2000, seconds=3.0, writes_per_second=200, poll_every=1.0):
+    watchers *= scale
+    moderator = seed_users(1, 'seatmod', role='moderator')[0]
+    club = seed_clubs(1, moderator, moderator, prefix='seatclub')[0]
+    event = seed_events([club], 1)[0]
+    event.max_participants = 100000
+    event.save(update_fields=['max_participants'])
+    students = seed_users(1000, 'seat', role='student')
+    EventRegistration.objects.bulk_create([EventRegistration(event=event, student=student) for student in students], batch_size=1000)
+
+    best, _, queries = measure(lambda: max(event.max_participants - event.registrations.count(), 0))
+    polls = watchers * seconds / poll_every
+    report(
+        f"{'polling every ' + str(poll_every) + ' s':<28} {polls:9.0f} COUNT queries   ~{polls * best:9.0f} ms of database time   "
+        f"for {watchers} watchers over {seconds:.0f} s"
+    )
+
+    bench_cache = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-seats'}
+    with override_settings(CACHES={**settings.CACHES, 'bench_seats': bench_cache}, SEATS_CACHE='bench_seats'):
+        counter = QueryCounter()
+        with connection.execute_wrapper(counter):
+            initial = current_seats([event.id])
+            writes, received, hub_polls, elapsed = asyncio.run(
+                _watch_seats({seats_key(event.id): event.id}, initial, watchers, seconds, writes_per_second)
+            )
+    report(
+        f"{'SSE hub':<28} {counter.count:9d} COUNT queries   {hub_polls:5d} cache reads   {writes} seat changes -> "
+        f"{min(received)}-{max(received)} messages per watcher ( {sum(received)} total ) in {elapsed:.1f} s"
+    )
+
+
+
+# The registration form's writes before they were made lean ( look-ups before the insert,
+# get_or_create and full saves outside a transaction ), kept for comparison
+def _previous_registration_form(event, user, form):
+    if EventRegistration.objects.filter(event=event, student=user).exists():
+        return None
+    if EventWaitlist.objects.filter(event=event, student=user).exists():
+        return None
+    profile, _ = StudentProfile.objects.get_or_create(user=user)
+    profile.department = form['department']
+    profile.university_id = form['university_id']
+    profile.save()
+    user.email = form['gmail']
+    user.save()
+    return register_student(event, user)
+
+
+# statements and latency of one registration through the registration form
+@benchmark('registration')
+def bench_registration(report, scale=1, count=200):
+    count *= scale
+    moderator = seed_users(1, 'regmod', role='moderator')[0]
+    club = seed_clubs(1, moderator, moderator, prefix='regclub')[0]
+    event = seed_events([club], 1)[0]
+    event.max_participants = count * 4
+    event.save(update_fields=['max_participants'])
+    students = seed_users(count * 3, 'regs', role='student')
+    StudentProfile.objects.bulk_create(
+        [StudentProfile(user=student, department='CS', university_id=f"U{student.id}") for student in students], batch_size=1000
+    )
+    # the usual case: the form repeats what the profile already has
+    forms = {
+        student.id: {'student_name': student.username, 'department': 'CS', 'university_id': f"U{student.id}", 'gmail': student.email}
+        for student in students
+    }
+
+    def lean(student):
+        serializer = EventRegistrationFormSerializer(
+            data=forms[student.id], context={'request': SimpleNamespace(user=student), 'event': event}
+        )
+        serializer.is_valid(raise_exception=True)
+        return serializer.save()
+
+    def per_registration(label, group, register):
+        counter = QueryCounter()
+        timings = []
+        with connection.execute_wrapper(counter):
+            for student in group:
+                started = time.perf_counter()
+                register(student)
+                timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        report(
+            f"{label:<40} {counter.count / len(group):5.1f} statements   "
+            f"median {timings[len(timings) // 2]:7.3f} ms   p95 {timings[int(len(timings) * 0.95)]:7.3f} ms"
+        )
+
+    per_registration('look-ups + full saves', students[:count], lambda student: _previous_registration_form(event, student, forms[student.id]))
+    per_registration('one transaction, changed columns only', students[count:count * 2], lean)
+
+    # a changed department is one UPDATE of that column
+    for student in students[count * 2:]:
+        forms[student.id]['department'] = 'Maths'
+    per_registration('  ... profile changed by the form', students[count * 2:], lean)
+
+    def duplicate(student):
+        try:
+            lean(student)
+        except Exception:
+            pass
+    per_registration('  ... already registered ( rejected )', students[count:count * 2], duplicate)
+
+
+
+# moderator querysets on a big club table: joining clubs on moderator_id vs the cached club ids
+@benchmark('moderator_scope')
+def bench_moderator_scope(report, scale=1, clubs=20000, moderators=200, events_per_club=2):
+    clubs *= scale
+    owners = seed_users(moderators, 'scopemod', role='moderator')
+    creator = seed_users(1, 'scopecreator')[0]
+    # a typical moderator with 5 clubs, a busy one with 100, the rest spread over the others
+    assigned = [owners[0]] * 5 + [owners[1]] * 100
+    assigned += [owners[2 + i % (moderators - 2)] for i in range(clubs - len(assigned))]
+    all_clubs = Club.objects.bulk_create(
+        [
+            Club(name=f"scopeclub{i}", description='benchmark club', moderator=owner, created_by=creator, status='approved')
+            for i, owner in enumerate(assigned)
+        ],
+        batch_size=1000,
+    )
+    events = seed_events(all_clubs, events_per_club)
+    report(f"{clubs} clubs, {len(events)} events")
+
+    bench_cache = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'bench-moderator-scope'}
+    with override_settings(CACHES={**settings.CACHES, 'bench_scope': bench_cache}, MODERATOR_SCOPE_CACHE='bench_scope'):
+        cache = caches['bench_scope']
+        for moderator in owners[:2]:
+            club_ids = lambda: moderated_club_ids(moderator)
+            event = Event.objects.filter(club__moderator=moderator).first()
+            querysets = [
+                ('moderator events',
+                 lambda: Event.objects.filter(club__moderator=moderator, approved=True),
+                 lambda: Event.objects.filter(club_id__in=club_ids(), approved=True)),
+                ('membership requests',
+                 lambda: ClubMember.objects.filter(club__moderator=moderator, club__deleted_at__isnull=True, approved=False),
+                 lambda: ClubMember.objects.filter(club_id__in=club_ids(), approved=False)),
+                ('statistics',
+                 lambda: Event.objects.filter(club__moderator=moderator).with_statistics(),
+                 lambda: Event.objects.filter(club_id__in=club_ids()).with_statistics()),
+                ('ownership check',
+                 lambda: Event.objects.filter(id=event.id, club__moderator=moderator),
+                 lambda: [found for found in Event.objects.filter(id=event.id) if found.club_id in club_ids()]),
+            ]
+
+            report(f"-- moderator of {len(club_ids())} clubs")
+            report(format_result('club ids, cold cache', measure(lambda: (cache.clear(), club_ids()), repeat=10)))
+            report(format_result('club ids, cached', measure(club_ids, repeat=10)))
+            for label, joined, scoped in querysets:
+                report(format_result(f"{label}: join", measure(lambda: list(joined()), repeat=10)))
+                report(format_result(f"{label}: cached ids", measure(lambda: list(scoped()), repeat=10)))
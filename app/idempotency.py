@@ -0,0 +1,79 @@
+import hashlib
+import functools
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+
+# Idempotency-Key support for write endpoints.
+#
+# The first response for (user, route, key) is stored in the shared cache for
+# IDEMPOTENCY_TTL seconds; retries with the same key get it back without running
+# the view again. A retry that arrives while the first request is still running
+# gets 409, and reusing a key with a different body gets 422.
+
+
+def _fingerprint(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def idempotent(handler):
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key or not request.user.is_authenticated:
+            return handler(self, request, *args, **kwargs)
+        if len(key) > 255:
+            return Response({"error": "Idempotency-Key must be at most 255 characters."}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache = caches[settings.IDEMPOTENCY_CACHE]
+        scope = f"{request.user.pk}:{request.method}:{request.path}:{key}"
+        cache_key = 'idempotency:' + hashlib.sha256(scope.encode()).hexdigest()
+        fingerprint = _fingerprint(request)
+
+        stored = cache.get(cache_key)
+        if stored is None and cache.add(cache_key, {'state': 'running', 'fingerprint': fingerprint}, settings.IDEMPOTENCY_LOCK_SECONDS):
+            return _run_and_store(self, handler, request, args, kwargs, cache, cache_key, fingerprint)
+        stored = stored or cache.get(cache_key) or {}
+
+        if stored.get('fingerprint') != fingerprint:
+            return Response(
+                {"error": "This Idempotency-Key was already used with a different request body."},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+            )
+        if stored.get('state') != 'done':
+            return Response(
+                {"error": "A request with this Idempotency-Key is still being processed."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        response = Response(stored['data'], status=stored['status'])
+        response['Idempotent-Replayed'] = 'true'
+        return response
+
+    return wrapper
+
+
+def _run_and_store(view, handler, request, args, kwargs, cache, cache_key, fingerprint):
+    try:
+        try:
+            response = handler(view, request, *args, **kwargs)
+        except Exception as exc:
+            # validation errors, 404s etc. are answers too and are replayed like successes
+            response = view.handle_exception(exc)
+    except Exception:
+        cache.delete(cache_key)
+        raise
+
+    if response.status_code >= 500:
+        # let the client retry server errors for real
+        cache.delete(cache_key)
+        return response
+
+    cache.set(
+        cache_key,
+        {'state': 'done', 'fingerprint': fingerprint, 'status': response.status_code, 'data': response.data},
+        settings.IDEMPOTENCY_TTL,
+    )
+    return response
@@ -0,0 +1,216 @@
+import os
+import socket
+import threading
+import time
+import traceback
+import multiprocessing
+import django
+from datetime import timedelta
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import contextmanager
+from django.conf import settings
+from django.db import DatabaseError, connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Job
+from .sharding import current_tenant, tenant_context
+
+
+# name -> handler(job) registry, filled by the @job decorator in app/tasks.py
+JOB_HANDLERS = {}
+
+
+def job(name):
+    def register(func):
+        JOB_HANDLERS[name] = func
+        return func
+    return register
+
+
+# Queue a job; safe to call from any view, inside or outside a transaction.
+# The job runs against the current tenant's shard unless `tenant` is given.
+def enqueue(name, payload=None, user=None, run_after=None, max_attempts=None, tenant=None):
+    if name not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job '{name}'.")
+    return Job.objects.create(
+        name=name,
+        payload=payload or {},
+        created_by=user if user and user.is_authenticated else None,
+        run_after=run_after or timezone.now(),
+        max_attempts=max_attempts or settings.JOB_MAX_ATTEMPTS,
+        tenant=tenant if tenant is not None else current_tenant() or '',
+    )
+
+
+# Store how far a running job got, shown by the job status endpoint
+def update_progress(job_obj, progress):
+    job_obj.progress = progress
+    Job.objects.filter(id=job_obj.id).update(progress=progress)
+
+
+def _due_jobs(now):
+    # pending jobs whose time has come, plus running jobs whose worker lost its lease
+    # and that have attempts left
+    return Job.objects.filter(
+        Q(status='pending', run_after__lte=now) |
+        Q(status='running', locked_until__lt=now, attempts__lt=F('max_attempts'))
+    )
+
+
+# running jobs whose worker lost its lease on the last attempt ( a job that keeps
+# killing its worker ) are failed instead of being retried forever
+def _fail_exhausted_jobs(now):
+    return Job.objects.filter(status='running', locked_until__lt=now, attempts__gte=F('max_attempts')).update(
+        status='failed',
+        error="The worker running the job was lost on the last attempt.",
+        locked_until=None,
+        locked_by='',
+        finished_at=now,
+    )
+
+
+# Claim up to `limit` jobs for this worker. On SQLite the transaction takes the
+# write lock at BEGIN, so two workers can never claim the same row; the
+# conditional update keeps it correct on other databases as well.
+def claim_jobs(worker_id, limit):
+    now = timezone.now()
+    lease = now + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    claimed = []
+
+    with transaction.atomic():
+        _fail_exhausted_jobs(now)
+        candidates = list(_due_jobs(now).order_by('run_after', 'id').values_list('id', 'status', 'locked_until')[:limit])
+        for job_id, job_status, locked_until in candidates:
+            updated = Job.objects.filter(id=job_id, status=job_status, locked_until=locked_until).update(
+                status='running',
+                locked_by=worker_id,
+                locked_until=lease,
+                started_at=now,
+                attempts=F('attempts') + 1,
+            )
+            if updated:
+                claimed.append(job_id)
+    return claimed
+
+
+def _retry_delay(attempts):
+    return timedelta(seconds=settings.JOB_RETRY_BACKOFF_SECONDS * (2 ** (attempts - 1)))
+
+
+# Keep extending the lease of a running job from a background thread, so a job that
+# runs longer than JOB_LEASE_SECONDS is not claimed and run a second time
+@contextmanager
+def _lease_heartbeat(job_id, worker_id):
+    stop = threading.Event()
+
+    def beat():
+        try:
+            while not stop.wait(settings.JOB_HEARTBEAT_SECONDS):
+                try:
+                    Job.objects.filter(id=job_id, status='running', locked_by=worker_id).update(
+                        locked_until=timezone.now() + timedelta(seconds=settings.JOB_LEASE_SECONDS)
+                    )
+                except DatabaseError:
+                    pass   # the job holds the write lock for now, try again on the next beat
+        finally:
+            connections.close_all()
+
+    thread = threading.Thread(target=beat, name=f"job-{job_id}-heartbeat", daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+# Run one claimed job and store its outcome (executed inside a worker process)
+def execute_job(job_id, worker_id):
+    job_obj = Job.objects.get(id=job_id)
+    handler = JOB_HANDLERS.get(job_obj.name)
+
+    try:
+        if handler is None:
+            raise ValueError(f"Unknown job '{job_obj.name}'.")
+        with tenant_context(job_obj.tenant), _lease_heartbeat(job_id, worker_id):
+            result = handler(job_obj)
+    except Exception:
+        error = traceback.format_exc()
+        fields = {'error': error, 'locked_until': None, 'locked_by': ''}
+        if job_obj.attempts < job_obj.max_attempts:
+            fields.update(status='pending', run_after=timezone.now() + _retry_delay(job_obj.attempts))
+        else:
+            fields.update(status='failed', finished_at=timezone.now())
+        Job.objects.filter(id=job_id, locked_by=worker_id).update(**fields)
+        return job_id, fields['status']
+
+    Job.objects.filter(id=job_id, locked_by=worker_id).update(
+        status='succeeded',
+        result=result,
+        error='',
+        locked_until=None,
+        finished_at=timezone.now(),
+    )
+    return job_id, 'succeeded'
+
+
+def _run_in_process(job_id, worker_id):
+    try:
+        return execute_job(job_id, worker_id)
+    finally:
+        connections.close_all()
+
+
+# Jobs of a pool that broke ( a child process died ) are handed back right away instead
+# of waiting for their lease to expire; the attempt is counted, so a job that keeps
+# killing its worker ends up failed
+def _release_lost_jobs(job_ids, worker_id):
+    return Job.objects.filter(id__in=job_ids, status='running', locked_by=worker_id).update(
+        locked_until=timezone.now(), locked_by=''
+    )
+
+
+# Worker loop: claim jobs and run them in a pool of processes
+def run_worker(processes, once=False, poll_interval=1.0, report=None):
+    worker_id = f"{socket.gethostname()}:{os.getpid()}"
+    totals = {'succeeded': 0, 'pending': 0, 'failed': 0}
+    started = time.monotonic()
+
+    # spawned children set Django up themselves instead of inheriting open DB connections
+    # (the initializer must not live in this module: unpickling it would import the models too early)
+    context = multiprocessing.get_context('spawn')
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=django.setup)
+    try:
+        while True:
+            job_ids = claim_jobs(worker_id, processes)
+            if not job_ids:
+                if once:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            futures = {job_id: pool.submit(_run_in_process, job_id, worker_id) for job_id in job_ids}
+            lost = []
+            for job_id, future in futures.items():
+                try:
+                    job_id, job_status = future.result()
+                except BrokenProcessPool:
+                    lost.append(job_id)
+                    continue
+                totals[job_status] += 1
+                if report:
+                    report(f"job #{job_id}: {job_status}")
+
+            if lost:
+                _release_lost_jobs(lost, worker_id)
+                totals['pending'] += len(lost)
+                if report:
+                    report(f"worker process died, jobs {', '.join(f'#{job_id}' for job_id in lost)} handed back")
+                pool.shutdown(wait=False, cancel_futures=True)
+                pool = ProcessPoolExecutor(max_workers=processes, mp_context=context, initializer=django.setup)
+    finally:
+        pool.shutdown()
+
+    totals['seconds'] = time.monotonic() - started
+    return totals
@@ -0,0 +1,39 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.archive import archive_events, archive_horizon, table_sizes, hot_query_latency
+from app.sharding import all_tenants, tenant_context
+
+
+class Command(BaseCommand):
+    help = "Move past events with their registrations and feedback into the archive tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.ARCHIVE_AFTER_DAYS,
+                            help="Archive events that took place more than this many days ago.")
+        parser.add_argument('--chunk-size', type=int, default=settings.ARCHIVE_CHUNK_SIZE,
+                            help="Events moved per transaction.")
+        parser.add_argument('--tenant', help="Only this university's shard (default: every database).")
+
+    def report_state(self, label):
+        self.stdout.write(f"{label}:")
+        for table, rows in table_sizes().items():
+            self.stdout.write(f"  {table:<32} {rows:10d} rows")
+        for query, ms in hot_query_latency().items():
+            self.stdout.write(f"  {query:<32} {ms:10.2f} ms")
+
+    def handle(self, *args, **options):
+        for tenant in [options['tenant']] if options['tenant'] else all_tenants():
+            with tenant_context(tenant):
+                self.archive(options, tenant or 'default')
+
+    def archive(self, options, database):
+        self.report_state(f"{database} before")
+        totals = archive_events(
+            archive_horizon(options['days']),
+            options['chunk_size'],
+            report=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.report_state(f"{database} after")
+        self.stdout.write(self.style.SUCCESS(
+            f"{database}: archived {totals['events']} events, {totals['registrations']} registrations, {totals['feedback']} feedback"
+        ))
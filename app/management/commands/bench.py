@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand, CommandError
+from app.benchmarks import BENCHMARKS, run
+
+
+class Command(BaseCommand):
+    help = "Run a benchmark on throwaway data (everything it creates is rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', nargs='?', help="Benchmark to run; omit to list them.")
+        parser.add_argument('--scale', type=int, default=1, help="Multiply the seeded data size.")
+
+    def handle(self, *args, **options):
+        name = options['name']
+        if not name:
+            for bench_name in sorted(BENCHMARKS):
+                self.stdout.write(bench_name)
+            return
+        if name not in BENCHMARKS:
+            raise CommandError(f"Unknown benchmark '{name}'. Available: {', '.join(sorted(BENCHMARKS))}")
+
+        run(name, self.stdout.write, scale=options['scale'])
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.recommendations import build_similarities
+from app.sharding import all_tenants, tenant_context
+
+
+class Command(BaseCommand):
+    help = "Rebuild event similarities used by \"recommended for you\" (run it periodically, e.g. nightly from cron)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top-k', type=int, default=settings.RECOMMENDATION_TOP_K,
+                            help="Similar upcoming events stored per event.")
+        parser.add_argument('--tenant', help="Only this university's shard (default: every database).")
+
+    def handle(self, *args, **options):
+        # similarities are per shard: students only register for events of their own university
+        for tenant in [options['tenant']] if options['tenant'] else all_tenants():
+            with tenant_context(tenant):
+                stats = build_similarities(top_k=options['top_k'])
+            self.stdout.write(self.style.SUCCESS(
+                f"{tenant or 'default'}: {stats['similarities']} similarities for {stats['events']} events "
+                f"({stats['interactions']} interactions of {stats['students']} students, "
+                f"{stats['candidates']} upcoming events) in {stats['seconds']:.2f}s"
+            ))
@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.outbox import run_worker
+
+
+class Command(BaseCommand):
+    help = "Send queued notification emails from the outbox in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.OUTBOX_BATCH_SIZE)
+        parser.add_argument('--workers', type=int, default=4, help="Number of sender threads.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to wait when the outbox is empty.")
+        parser.add_argument('--once', action='store_true', help="Exit once no message is due instead of polling.")
+
+    def handle(self, *args, **options):
+        report = self.stdout.write if options['verbosity'] > 1 else None
+        totals = run_worker(
+            batch_size=options['batch_size'],
+            workers=options['workers'],
+            once=options['once'],
+            poll_interval=options['interval'],
+            report=report,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"sent={totals['sent']} retried={totals['retried']} failed={totals['failed']} "
+            f"batches={totals['batches']} in {totals['seconds']:.2f}s "
+            f"({totals['throughput']:.1f} msg/s)"
+        ))
@@ -0,0 +1,37 @@
+from collections import defaultdict
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from app.startup import import_times
+
+
+class Command(BaseCommand):
+    help = "Show what importing the app costs at worker start-up, per module (python -X importtime)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('modules', nargs='*',
+                            help="Modules imported after django.setup() (default: the WSGI module and the URLconf).")
+        parser.add_argument('--limit', type=int, default=25, help="Modules listed.")
+        parser.add_argument('--sort', choices=['self', 'cumulative'], default='self')
+        parser.add_argument('--prefix', default='', help="Only list modules whose name starts with this.")
+        parser.add_argument('--no-warm-up', action='store_true',
+                            help="Import the WSGI module with WARM_UP_ON_STARTUP=0 (views stay lazy).")
+
+    def handle(self, *args, **options):
+        modules = options['modules'] or [settings.WSGI_APPLICATION.rsplit('.', 1)[0], settings.ROOT_URLCONF]
+        rows = import_times(modules, environ={'WARM_UP_ON_STARTUP': '0'} if options['no_warm_up'] else None)
+        total = sum(own for _, own, _ in rows)
+
+        column = 1 if options['sort'] == 'self' else 2
+        listed = sorted((row for row in rows if row[0].startswith(options['prefix'])), key=lambda row: -row[column])
+        self.stdout.write(f"{'module':<60} {'self ms':>9} {'cumulative ms':>14}")
+        for name, own, cumulative in listed[:options['limit']]:
+            self.stdout.write(f"{name:<60} {own / 1000:9.2f} {cumulative / 1000:14.2f}")
+
+        # cost per top-level package
+        packages = defaultdict(int)
+        for name, own, _ in rows:
+            packages[name.split('.')[0]] += own
+        self.stdout.write("")
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:10]:
+            self.stdout.write(f"{package:<60} {own / 1000:9.2f}")
+        self.stdout.write(self.style.SUCCESS(f"{len(rows)} modules imported in {total / 1000:.1f} ms"))
@@ -0,0 +1,33 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+from app.models import User, StudentProfile
+from app.sharding import mirror
+
+
+class Command(BaseCommand):
+    help = "Apply migrations to the global database and every university shard, then copy users into their shard."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--skip-mirror', action='store_true',
+                            help="Do not copy existing users and student profiles into their shard.")
+
+    def handle(self, *args, **options):
+        verbosity = options['verbosity']
+        for alias in [DEFAULT_DB_ALIAS, *settings.SHARDS.values()]:
+            self.stdout.write(f"migrating {alias}")
+            call_command('migrate', database=alias, interactive=False, verbosity=max(verbosity - 1, 0))
+
+        if options['skip_mirror']:
+            return
+        # users registered before their university got a shard ( new ones are copied on save )
+        for tenant, alias in settings.SHARDS.items():
+            users = User.objects.filter(tenant=tenant)
+            for user in users.iterator(chunk_size=1000):
+                mirror(user, tenant)
+            profiles = StudentProfile.objects.filter(user__tenant=tenant)
+            for profile in profiles.iterator(chunk_size=1000):
+                mirror(profile, tenant)
+            self.stdout.write(f"{alias}: {users.count()} users, {profiles.count()} student profiles copied")
+        self.stdout.write(self.style.SUCCESS(f"{1 + len(settings.SHARDS)} databases migrated"))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from app.rollups import rebuild_rollups
+from app.sharding import all_tenants, tenant_context
+
+
+class Command(BaseCommand):
+    help = "Recount the hourly and daily registration rollups from the raw registrations."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--event', type=int, action='append', dest='events',
+                            help="Only rebuild this event (can be repeated).")
+        parser.add_argument('--tenant', help="Only this university's shard (default: every database).")
+
+    def handle(self, *args, **options):
+        for tenant in [options['tenant']] if options['tenant'] else all_tenants():
+            with tenant_context(tenant):
+                created = rebuild_rollups(options['events'])
+            self.stdout.write(self.style.SUCCESS(f"{tenant or 'default'}: {created} rollup rows written"))
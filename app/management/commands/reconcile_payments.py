@@ -0,0 +1,46 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from app.models import Event
+from app.payments import PaymentFileError, parse_payment_file, reconcile_payments
+from app.sharding import tenant_context
+
+
+class Command(BaseCommand):
+    help = "Mark registrations of an event as paid from a payment file (CSV: university_id, email, amount)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('event_id', type=int)
+        parser.add_argument('file', help="Path of the CSV payment file.")
+        parser.add_argument('--batch-size', type=int, default=settings.PAYMENT_RECONCILE_BATCH_SIZE,
+                            help="Registrations marked paid per UPDATE.")
+        parser.add_argument('--tenant', help="University whose shard holds the event.")
+
+    def handle(self, *args, **options):
+        with tenant_context(options['tenant']):
+            self.reconcile(options)
+
+    def reconcile(self, options):
+        try:
+            event = Event.objects.get(id=options['event_id'])
+        except Event.DoesNotExist:
+            raise CommandError(f"Event {options['event_id']} does not exist.")
+
+        started = time.monotonic()
+        try:
+            with open(options['file'], newline='', encoding='utf-8-sig') as f:
+                rows = parse_payment_file(f)
+        except (OSError, PaymentFileError) as exc:
+            raise CommandError(str(exc))
+        report = reconcile_payments(event, rows, options['batch_size'])
+
+        for kind in ['unmatched', 'ambiguous', 'duplicates', 'invalid']:
+            for row in report[kind]:
+                reason = row.get('reason') or f"duplicate of line {row.get('first_line')}"
+                self.stdout.write(f"line {row['line']}: {kind} ({reason})")
+        self.stdout.write(self.style.SUCCESS(
+            f"{report['rows']} rows in {time.monotonic() - started:.2f}s: {report['matched']} matched "
+            f"({report['newly_paid']} newly paid, {report['already_paid']} already paid), "
+            f"{len(report['unmatched'])} unmatched, {len(report['ambiguous'])} ambiguous, "
+            f"{len(report['duplicates'])} duplicates, {len(report['invalid'])} invalid"
+        ))
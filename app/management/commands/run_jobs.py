@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+from app.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = "Run queued background jobs in a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=2, help="Number of worker processes.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to wait when no job is due.")
+        parser.add_argument('--once', action='store_true', help="Exit once no job is due instead of polling.")
+
+    def handle(self, *args, **options):
+        totals = run_worker(
+            processes=options['processes'],
+            once=options['once'],
+            poll_interval=options['interval'],
+            report=self.stdout.write if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"succeeded={totals['succeeded']} retrying={totals['pending']} failed={totals['failed']} "
+            f"in {totals['seconds']:.2f}s"
+        ))
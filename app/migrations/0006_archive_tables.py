@@ -0,0 +1,53 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:20
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0005_feedentry'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedEvent',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=150)),
+                ('description', models.TextField()),
+                ('date_time', models.DateTimeField()),
+                ('venue', models.CharField(max_length=150)),
+                ('max_participants', models.PositiveIntegerField()),
+                ('fee', models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True)),
+                ('requires_approval', models.BooleanField(default=False)),
+                ('approved', models.BooleanField(default=False)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_events', to='app.club')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ArchivedEventRegistration',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('registered_at', models.DateTimeField()),
+                ('payment_done', models.BooleanField(default=False)),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registrations', to='app.archivedevent')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_registrations', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('event', 'student')},
+            },
+        ),
+        migrations.CreateModel(
+            name='ArchivedFeedback',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('rating', models.PositiveIntegerField(default=5)),
+                ('comments', models.TextField(blank=True)),
+                ('registration', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='feedback', to='app.archivedeventregistration')),
+            ],
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0009_eventsimilarity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistrationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granularity', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=10)),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('club', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registration_rollups', to='app.club')),
+                ('event', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='registration_rollups', to='app.event')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['club', 'granularity', 'bucket_start'], name='app_registr_club_id_b7ab5d_idx')],
+                'unique_together': {('event', 'granularity', 'bucket_start')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_registrationrollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='tenant',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='tenant',
+            field=models.CharField(blank=True, max_length=50),
+        ),
+    ]
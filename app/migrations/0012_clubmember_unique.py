@@ -0,0 +1,33 @@
+# Generated by Django 5.2.7 on 2026-10-19 09:58
+
+from django.db import migrations
+from django.db.models import Count
+
+
+# Applications sent twice ( before the constraint ) leave one row per club and user:
+# the approved one if any, else the oldest
+def remove_duplicate_members(apps, schema_editor):
+    ClubMember = apps.get_model('app', 'ClubMember')
+    members = ClubMember.objects.using(schema_editor.connection.alias)
+    duplicates = members.values('club_id', 'user_id').annotate(rows=Count('id')).filter(rows__gt=1)
+    for pair in duplicates.iterator():
+        ids = list(
+            members.filter(club_id=pair['club_id'], user_id=pair['user_id'])
+            .order_by('-approved', 'id').values_list('id', flat=True)
+        )
+        members.filter(id__in=ids[1:]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0011_tenants'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_members, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='clubmember',
+            unique_together={('club', 'user')},
+        ),
+    ]
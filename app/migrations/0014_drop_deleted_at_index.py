@@ -0,0 +1,28 @@
+# Generated by Django 5.2.7 on 2026-10-19 10:19
+
+from django.db import migrations, models
+
+
+# deleted_at is NULL on almost every row, and without ANALYZE statistics SQLite treats
+# "deleted_at IS NULL" ( added to every query by LiveManager ) as a selective equality:
+# it searched the live rows through this index instead of using the club_id or
+# date_time index of the query
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0013_token_revocation'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='club',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='event',
+            name='deleted_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
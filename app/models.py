@@ -1,5 +1,7 @@
 from django.contrib.auth.models import AbstractUser
 from django.db import models
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 
 # Role model
@@ -14,6 +16,7 @@ class Role(models.Model):
 class User(AbstractUser):
     email = models.EmailField(unique=True)
     roles = models.ManyToManyField(Role, related_name='users')
+    tenant = models.CharField(max_length=50, blank=True)   # university code, picks the shard ( see app/sharding.py )
 
     def has_role(self, role_name):
         return self.roles.filter(name=role_name).exists()
@@ -29,6 +32,12 @@ class StudentProfile(models.Model):
         return f"{self.user.username} - Student"
 
 
+# manager that hides soft-deleted rows ( they are purged later by a background job )
+class LiveManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 # club model
 class Club(models.Model):
     STATUS_CHOICES = [
@@ -43,10 +52,29 @@ class Club(models.Model):
     moderator = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='moderated_clubs')
     created_by = models.ForeignKey(User, on_delete=models.CASCADE, related_name='created_clubs')
     created_at = models.DateTimeField(auto_now_add=True)
+    feed_on_read = models.BooleanField(default=False)  # too many members to copy events into their feeds
+    deleted_at = models.DateTimeField(null=True, blank=True)  # set on delete, row purged by a job ( not indexed, almost all NULL )
+
+    objects = LiveManager()
+    all_objects = models.Manager()
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # the moderator and deletion as loaded: a change drops the cached club ids ( app/moderation.py )
+        instance._loaded_moderator_id = instance.__dict__.get('moderator_id')
+        instance._loaded_deleted_at = instance.__dict__.get('deleted_at')
+        return instance
+
+    # hide the club and its events at once; the rows are purged by the 'purge_club' job
+    def soft_delete(self):
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+        Event.all_objects.filter(club=self, deleted_at__isnull=True).update(deleted_at=self.deleted_at)
+
 
 #club member model
 class ClubMember(models.Model):
@@ -54,11 +82,38 @@ class ClubMember(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='club_memberships')
     approved = models.BooleanField(default=False)   # approved by moderator
 
+    class Meta:
+        unique_together = ('club', 'user')
+
     def __str__(self):
         return f"{self.user.username} in {self.club.name}"
 
 
 
+# event queryset
+class EventQuerySet(models.QuerySet):
+    def with_statistics(self):
+        # total registrations and amount collected per event ( deactivated students are left out )
+        active = models.Q(registrations__student__is_active=True)
+        return self.annotate(
+            total_registrations=models.Count('registrations', filter=active, distinct=True),
+            total_amount_collected=models.ExpressionWrapper(
+                models.Count('registrations', filter=active, distinct=True) * models.F('fee'),
+                output_field=models.DecimalField(max_digits=10, decimal_places=2)
+            )
+        )
+
+    def with_registration_count(self):
+        # registrations per event as a subquery, so it can be combined with other joins and
+        # annotations; read by ApprovedEventListSerializer.seats_left. Seats of deactivated
+        # students are free again, their rows wait for the purge job
+        registrations = (
+            EventRegistration.objects.filter(event=models.OuterRef('pk'), student__is_active=True).order_by()
+            .values('event').annotate(total=models.Count('id')).values('total')
+        )
+        return self.annotate(registration_count=Coalesce(models.Subquery(registrations), 0))
+
+
 # event model
 class Event(models.Model):
     club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name='events')
@@ -70,10 +125,19 @@ class Event(models.Model):
     fee = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     requires_approval = models.BooleanField(default=False)
     approved = models.BooleanField(default=False)  # moderator approval
+    deleted_at = models.DateTimeField(null=True, blank=True)  # set on delete, row purged by a job ( not indexed, almost all NULL )
+
+    objects = LiveManager.from_queryset(EventQuerySet)()
+    all_objects = EventQuerySet.as_manager()
 
     def __str__(self):
         return f"{self.title} ({self.club.name})"
 
+    # hide the event; the row and its dependents are purged by the 'purge_event' job
+    def soft_delete(self):
+        self.deleted_at = timezone.now()
+        self.save(update_fields=['deleted_at'])
+
 
 
 # Event Registration model
@@ -91,6 +155,22 @@ class EventRegistration(models.Model):
 
 
 
+# Event waitlist model ( FIFO queue of students waiting for a seat )
+class EventWaitlist(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='waitlist')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='waitlisted_events')
+    position = models.PositiveIntegerField()   # increasing per event, head of the queue is the lowest
+    joined_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # (event, position) is also the index used to pop the head of the queue
+        unique_together = [('event', 'student'), ('event', 'position')]
+
+    def __str__(self):
+        return f"{self.student.username} waiting for {self.event.title} (#{self.position})"
+
+
+
 # Feedback model
 class Feedback(models.Model):
     registration = models.OneToOneField(EventRegistration, on_delete=models.CASCADE, related_name='feedback')
@@ -98,4 +178,199 @@ class Feedback(models.Model):
     comments = models.TextField(blank=True)
 
     def __str__(self):
-        return f"Feedback by {self.registration.student.username} for {self.registration.event.title}"
\ No newline at end of file
+        return f"Feedback by {self.registration.student.username} for {self.registration.event.title}"
+
+
+
+# Registration rollup model ( registrations per event and hour / day, kept up to date by
+# app/registrations.py and rebuilt by `manage.py rebuild_rollups` )
+class RegistrationRollup(models.Model):
+    GRANULARITY_CHOICES = [
+        ('hour', 'Hour'),
+        ('day', 'Day'),
+    ]
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='registration_rollups')
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name='registration_rollups')
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket_start = models.DateTimeField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('event', 'granularity', 'bucket_start')
+        indexes = [models.Index(fields=['club', 'granularity', 'bucket_start'])]
+
+    def __str__(self):
+        return f"{self.event_id} {self.granularity} {self.bucket_start}: {self.count}"
+
+
+
+# Attendance model ( a registration checked in at the door, at most once )
+class Attendance(models.Model):
+    registration = models.OneToOneField(EventRegistration, on_delete=models.CASCADE, related_name='attendance')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='attendances')
+    checked_in_at = models.DateTimeField(auto_now_add=True)
+    checked_in_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+
+    def __str__(self):
+        return f"{self.registration_id} checked in to {self.event_id}"
+
+
+
+# Outbox model ( notifications written with the state change, sent later by a worker )
+class OutboxMessage(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    recipient = models.EmailField()
+    subject = models.CharField(max_length=200)
+    body = models.TextField()
+    attempts = models.PositiveIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)   # not claimed before this time (retry backoff / lease)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'available_at'])]
+
+    def __str__(self):
+        return f"{self.subject} -> {self.recipient} ({self.status})"
+
+
+
+# Background job model ( heavy operations run by `manage.py run_jobs` instead of the request )
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    progress = models.JSONField(null=True, blank=True)   # updated by long jobs while they run
+    error = models.TextField(blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_until = models.DateTimeField(null=True, blank=True)   # lease of the worker running the job
+    locked_by = models.CharField(max_length=100, blank=True)
+    tenant = models.CharField(max_length=50, blank=True)   # the job runs against this tenant's database
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'run_after'])]
+
+    def __str__(self):
+        return f"{self.name} #{self.id} ({self.status})"
+
+
+
+# Feed entry model ( precomputed "my feed" row per member and upcoming event )
+class FeedEntry(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='feed_entries')
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='feed_entries')
+    date_time = models.DateTimeField()   # copy of event.date_time so the feed is read from this table's index
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('user', 'event')
+        indexes = [models.Index(fields=['user', 'date_time', 'event'])]
+
+    def __str__(self):
+        return f"{self.event_id} in feed of {self.user_id}"
+
+
+
+# Event similarity model ( for each event, the upcoming events most often chosen by the same
+# students; rebuilt by `manage.py build_recommendations` )
+class EventSimilarity(models.Model):
+    event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='similar_events')
+    similar_event = models.ForeignKey(Event, on_delete=models.CASCADE, related_name='similar_from')
+    score = models.FloatField()   # cosine similarity of the two events' student vectors
+
+    class Meta:
+        unique_together = ('event', 'similar_event')
+
+    def __str__(self):
+        return f"{self.event_id} ~ {self.similar_event_id} ({self.score:.3f})"
+
+
+
+# Archive models: past events moved out of the hot tables by `manage.py archive_events`.
+# Rows keep their original ids, so event ids in URLs stay valid after archiving.
+
+# archived event model
+class ArchivedEvent(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    club = models.ForeignKey(Club, on_delete=models.CASCADE, related_name='archived_events')
+    title = models.CharField(max_length=150)
+    description = models.TextField()
+    date_time = models.DateTimeField()
+    venue = models.CharField(max_length=150)
+    max_participants = models.PositiveIntegerField()
+    fee = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
+    requires_approval = models.BooleanField(default=False)
+    approved = models.BooleanField(default=False)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    objects = EventQuerySet.as_manager()
+
+    def __str__(self):
+        return f"{self.title} ({self.club.name}, archived)"
+
+
+# archived event registration model
+class ArchivedEventRegistration(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    event = models.ForeignKey(ArchivedEvent, on_delete=models.CASCADE, related_name='registrations')
+    student = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_registrations')
+    registered_at = models.DateTimeField()
+    payment_done = models.BooleanField(default=False)
+
+    class Meta:
+        unique_together = ('event', 'student')
+
+    def __str__(self):
+        return f"{self.student.username} registered for {self.event.title} (archived)"
+
+
+# archived feedback model
+class ArchivedFeedback(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    registration = models.OneToOneField(ArchivedEventRegistration, on_delete=models.CASCADE, related_name='feedback')
+    rating = models.PositiveIntegerField(default=5)
+    comments = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"Feedback by {self.registration.student.username} for {self.registration.event.title} (archived)"
+
+
+# Token revocation models ( read into memory by app/revocation.py, not per request )
+
+# revoked token model ( one logged out access or refresh token, kept until it expires )
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.jti} revoked until {self.expires_at}"
+
+
+# user token cutoff model ( every token of the user issued before not_before is revoked )
+class UserTokenCutoff(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='token_cutoff')
+    not_before = models.FloatField(db_index=True)   # unix time with microseconds
+
+    def __str__(self):
+        return f"tokens of {self.user_id} issued before {self.not_before}"
@@ -0,0 +1,93 @@
+import uuid
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.http import Http404
+from django.shortcuts import get_object_or_404
+from .models import Club, Event
+from .sharding import tenant_db
+
+
+# Moderator scope: the ids of the ( live ) clubs a moderator moderates, cached in
+# MODERATOR_SCOPE_CACHE. Moderator views filter with club_id IN (...) and check
+# ownership with set membership instead of joining clubs on moderator_id.
+#
+# The ids are stored under a per-moderator version. A change replaces the version once it
+# has committed, so ids read before the change -- even if a slow request caches them
+# after the invalidation -- sit under a version nobody reads any more: a moderator who
+# lost a club loses access to it right away. A lost version key only causes a re-read.
+#
+# A club's moderator and deleted_at are remembered when the club is loaded
+# ( Club.from_db ); saving a club that changes either, creating or deleting one drops the
+# cached ids of its old and new moderator ( receivers connected in AppConfig.ready ).
+# Queryset .update() calls that change Club.moderator or Club.deleted_at must call
+# invalidate_moderator_scope() themselves.
+
+
+def _cache():
+    return caches[settings.MODERATOR_SCOPE_CACHE]
+
+
+def _version_key(moderator_id, using):
+    return f"moderator-clubs-version:{using}:{moderator_id}"
+
+
+def _version(moderator_id, using):
+    key = _version_key(moderator_id, using)
+    version = _cache().get(key)
+    if version is None:
+        # first look-up, or the key was evicted: a fresh version, never one used before
+        _cache().add(key, uuid.uuid4().hex, None)
+        version = _cache().get(key)
+    return version
+
+
+def _key(moderator_id, using, version):
+    return f"moderator-clubs:{using}:{moderator_id}:{version}"
+
+
+# frozenset of the ids of the clubs `user` moderates, in the current tenant's database
+def moderated_club_ids(user):
+    using = tenant_db()
+    key = _key(user.pk, using, _version(user.pk, using))
+    club_ids = _cache().get(key)
+    if club_ids is None:
+        club_ids = list(Club.objects.using(using).filter(moderator_id=user.pk).values_list('id', flat=True))
+        _cache().set(key, club_ids, settings.MODERATOR_SCOPE_TTL)
+    return frozenset(club_ids)
+
+
+# The event with `event_id` if it belongs to one of the user's clubs ( a primary key
+# look-up and a set membership test ), else 404
+def get_moderated_event(user, event_id):
+    event = get_object_or_404(Event, id=event_id)
+    if event.club_id not in moderated_club_ids(user):
+        raise Http404("No Event matches the given query.")
+    return event
+
+
+def invalidate_moderator_scope(moderator_ids, using=None):
+    using = using or tenant_db()
+    _cache().set_many(
+        {_version_key(moderator_id, using): uuid.uuid4().hex for moderator_id in set(moderator_ids) if moderator_id is not None},
+        None,
+    )
+
+
+# post_save / post_delete receiver for Club, connected in AppConfig.ready. Only saves that
+# change who moderates the club or whether it is live matter ( not status, feed_on_read,
+# ... ); the versions are replaced on commit, a reader before that still sees the old rows
+def club_changed(sender, instance, using, signal, created=False, **kwargs):
+    loaded_moderator_id = getattr(instance, '_loaded_moderator_id', None)
+    changed = (
+        created
+        or signal is post_delete
+        or instance.moderator_id != loaded_moderator_id
+        or instance.deleted_at != getattr(instance, '_loaded_deleted_at', None)
+    )
+    if changed:
+        moderator_ids = [instance.moderator_id, loaded_moderator_id]
+        transaction.on_commit(lambda: invalidate_moderator_scope(moderator_ids, using), using=using)
+    instance._loaded_moderator_id = instance.moderator_id
+    instance._loaded_deleted_at = instance.deleted_at
@@ -0,0 +1,128 @@
+import time
+from datetime import timedelta
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+from .models import OutboxMessage
+from .sharding import all_tenants, tenant_context, tenant_db
+
+
+# Queue an email; call inside the transaction that makes the change, so the
+# message exists if and only if the change is committed.
+def queue_email(recipient, subject, body):
+    if not recipient:
+        return None
+    return OutboxMessage.objects.create(recipient=recipient, subject=subject, body=body)
+
+
+# Queue the same email for many users with a single insert
+def queue_bulk_email(recipients, subject, body):
+    messages = [
+        OutboxMessage(recipient=recipient, subject=subject, body=body)
+        for recipient in recipients if recipient
+    ]
+    return OutboxMessage.objects.bulk_create(messages, batch_size=500)
+
+
+def _backoff(attempts):
+    # exponential backoff: base, 2*base, 4*base ... capped
+    delay = settings.OUTBOX_BACKOFF_SECONDS * (2 ** (attempts - 1))
+    return timedelta(seconds=min(delay, settings.OUTBOX_MAX_BACKOFF_SECONDS))
+
+
+# Claim up to batch_size due messages by pushing their available_at forward (a lease);
+# if the worker dies the messages become due again when the lease runs out.
+def claim_batch(batch_size):
+    now = timezone.now()
+    with transaction.atomic(using=tenant_db()):
+        ids = list(
+            OutboxMessage.objects.filter(status='pending', available_at__lte=now)
+            .order_by('available_at', 'id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            return []
+        OutboxMessage.objects.filter(id__in=ids, status='pending', available_at__lte=now).update(
+            available_at=now + timedelta(seconds=settings.OUTBOX_LEASE_SECONDS)
+        )
+    return list(OutboxMessage.objects.filter(id__in=ids).order_by('id'))
+
+
+def _send(message):
+    try:
+        connection = get_connection()
+        EmailMessage(message.subject, message.body, settings.DEFAULT_FROM_EMAIL, [message.recipient], connection=connection).send()
+        return message, None
+    except Exception as exc:
+        return message, exc
+    finally:
+        close_old_connections()
+
+
+# Send one claimed batch in parallel and record the results
+def process_batch(messages, executor):
+    sent, retried, failed = [], [], []
+    now = timezone.now()
+
+    for message, error in executor.map(_send, messages):
+        message.attempts += 1
+        if error is None:
+            message.status = 'sent'
+            message.sent_at = now
+            message.last_error = ''
+            sent.append(message)
+        elif message.attempts >= settings.OUTBOX_MAX_ATTEMPTS:
+            message.status = 'failed'
+            message.last_error = str(error)
+            failed.append(message)
+        else:
+            message.available_at = now + _backoff(message.attempts)
+            message.last_error = str(error)
+            retried.append(message)
+
+    OutboxMessage.objects.bulk_update(
+        sent + retried + failed,
+        ['status', 'attempts', 'available_at', 'last_error', 'sent_at']
+    )
+    return len(sent), len(retried), len(failed)
+
+
+# Drain the outbox; runs until empty when once=True, otherwise polls forever
+def run_worker(batch_size, workers, once=False, poll_interval=1.0, report=None):
+    totals = {'sent': 0, 'retried': 0, 'failed': 0, 'batches': 0}
+    started = time.monotonic()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while True:
+            # one batch from the outbox of every shard per round ( see app/sharding.py )
+            claimed = 0
+            for tenant in all_tenants():
+                with tenant_context(tenant):
+                    batch = claim_batch(batch_size)
+                    if not batch:
+                        continue
+                    batch_started = time.monotonic()
+                    sent, retried, failed = process_batch(batch, executor)
+                    elapsed = time.monotonic() - batch_started
+
+                claimed += len(batch)
+                totals['sent'] += sent
+                totals['retried'] += retried
+                totals['failed'] += failed
+                totals['batches'] += 1
+                if report:
+                    report(
+                        f"batch of {len(batch)}: sent={sent} retried={retried} failed={failed} "
+                        f"in {elapsed:.3f}s ({len(batch) / elapsed if elapsed else 0:.1f} msg/s)"
+                    )
+
+            if not claimed:
+                if once:
+                    break
+                time.sleep(poll_interval)
+
+    totals['seconds'] = time.monotonic() - started
+    totals['throughput'] = totals['sent'] / totals['seconds'] if totals['seconds'] else 0
+    return totals
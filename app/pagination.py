@@ -0,0 +1,8 @@
+from rest_framework.pagination import PageNumberPagination
+
+
+# page-number pagination for list endpoints that can grow large
+class StandardPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
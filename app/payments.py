@@ -0,0 +1,113 @@
+import csv
+import io
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .models import EventRegistration
+from .sharding import tenant_db
+
+
+# Payment reconciliation: a payment file (CSV with university_id, email and amount
+# columns, one row per payment for one event) is matched against the event's
+# registrations and the matched registrations are marked as paid.
+#
+# All registrations of the event are read with one joined values() query and matched
+# in memory, then payment_done is set with one UPDATE per batch of ids.
+#
+# university_id is not unique: a university id shared by several registered students
+# does not identify a payment, such rows are matched by email or reported as ambiguous.
+
+
+class PaymentFileError(ValueError):
+    pass
+
+
+# rows of the payment file as dicts: line, university_id, email, amount
+def parse_payment_file(file):
+    if isinstance(file, bytes):
+        file = file.decode('utf-8-sig')
+    if isinstance(file, str):
+        file = io.StringIO(file)
+
+    reader = csv.DictReader(file)
+    columns = {(name or '').strip().lower() for name in reader.fieldnames or []}
+    if 'amount' not in columns or not columns & {'university_id', 'email'}:
+        raise PaymentFileError("The payment file needs an 'amount' column and a 'university_id' or 'email' column.")
+
+    rows = []
+    for line, raw in enumerate(reader, start=2):
+        row = {(key or '').strip().lower(): (value or '').strip() for key, value in raw.items()}
+        rows.append({
+            'line': line,
+            'university_id': row.get('university_id', ''),
+            'email': row.get('email', '').lower(),
+            'amount': row.get('amount', ''),
+        })
+    return rows
+
+
+def _amount(value):
+    try:
+        return Decimal(value)
+    except (InvalidOperation, TypeError):
+        return None
+
+
+# Match payment rows against the registrations of `event` and mark them paid
+def reconcile_payments(event, rows, batch_size=1000):
+    by_university_id = {}
+    shared_university_ids = set()
+    by_email = {}
+    paid = {}
+    registrations = EventRegistration.objects.filter(event=event).values_list(
+        'id', 'payment_done', 'student__email', 'student__student_profile__university_id'
+    )
+    for registration_id, payment_done, email, university_id in registrations.iterator(chunk_size=5000):
+        paid[registration_id] = payment_done
+        by_email[email.lower()] = registration_id
+        if university_id:
+            if university_id in by_university_id:
+                shared_university_ids.add(university_id)
+            by_university_id[university_id] = registration_id
+    for university_id in shared_university_ids:
+        del by_university_id[university_id]
+
+    report = {
+        'rows': len(rows), 'matched': 0, 'newly_paid': 0, 'already_paid': 0,
+        'unmatched': [], 'ambiguous': [], 'duplicates': [], 'invalid': [],
+    }
+    seen = {}
+    to_mark = []
+    for row in rows:
+        amount = _amount(row['amount'])
+        if amount is None:
+            report['invalid'].append({**row, 'reason': "amount is not a number"})
+            continue
+
+        registration_id = by_university_id.get(row['university_id']) or by_email.get(row['email'])
+        if registration_id is None:
+            if row['university_id'] in shared_university_ids:
+                report['ambiguous'].append({**row, 'reason': "university id is shared by several registered students"})
+            else:
+                report['unmatched'].append({**row, 'reason': "no registration for this student"})
+            continue
+        if registration_id in seen:
+            report['duplicates'].append({**row, 'registration_id': registration_id, 'first_line': seen[registration_id]})
+            continue
+
+        if event.fee is not None and amount != event.fee:
+            report['invalid'].append({**row, 'registration_id': registration_id, 'reason': f"amount does not match the fee {event.fee}"})
+            continue
+        # only a valid row claims the registration, a corrected row after a wrong one still counts
+        seen[registration_id] = row['line']
+
+        report['matched'] += 1
+        if paid[registration_id]:
+            report['already_paid'] += 1
+        else:
+            to_mark.append(registration_id)
+
+    with transaction.atomic(using=tenant_db()):
+        for start in range(0, len(to_mark), batch_size):
+            EventRegistration.objects.filter(id__in=to_mark[start:start + batch_size]).update(payment_done=True)
+    report['newly_paid'] = len(to_mark)
+    return report
@@ -14,3 +14,8 @@ class IsModerator(BasePermission):
 class IsAdminRole(BasePermission):
     def has_permission(self, request, view):
         return request.user and request.user.is_authenticated and request.user.has_role('admin')
+
+
+class IsModeratorOrAdmin(BasePermission):
+    def has_permission(self, request, view):
+        return request.user and request.user.is_authenticated and request.user.roles.filter(name__in=['moderator', 'admin']).exists()
@@ -0,0 +1,85 @@
+import time
+from django.db import DEFAULT_DB_ALIAS, router, transaction
+from .models import (
+    User, Club, ClubMember, Event, EventRegistration, EventWaitlist, Feedback, FeedEntry, Attendance, EventSimilarity, RegistrationRollup,
+    ArchivedEvent, ArchivedEventRegistration, ArchivedFeedback,
+)
+from .sharding import tenant_db
+
+
+# Background removal of soft-deleted clubs, events and deactivated users.
+#
+# The delete views only mark the row ( deleted_at / is_active ) and queue a purge job.
+# The job deletes dependents leaf first, `chunk_size` rows per transaction, so the
+# write lock is held for one small chunk at a time instead of for the whole cascade.
+# When the parent row is finally deleted there is nothing left for Django to collect.
+
+
+# Delete the rows of `queryset` in chunks; `progress(label, rows, seconds)` is called after every chunk
+def delete_in_chunks(queryset, chunk_size, label, progress=None):
+    model = queryset.model
+    total = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return total
+        started = time.perf_counter()
+        with transaction.atomic(using=queryset.db):
+            model._base_manager.using(queryset.db).filter(pk__in=ids).delete()
+        total += len(ids)
+        if progress:
+            progress(label, len(ids), time.perf_counter() - started)
+
+
+def _delete_row(model, pk, label, progress=None, using=None):
+    using = using or router.db_for_write(model)
+    started = time.perf_counter()
+    with transaction.atomic(using=using):
+        model._base_manager.using(using).filter(pk=pk).delete()
+    if progress:
+        progress(label, 1, time.perf_counter() - started)
+
+
+def purge_event(event_id, chunk_size, progress=None):
+    delete_in_chunks(Feedback.objects.filter(registration__event_id=event_id), chunk_size, 'feedback', progress)
+    delete_in_chunks(Attendance.objects.filter(event_id=event_id), chunk_size, 'attendance', progress)
+    delete_in_chunks(EventRegistration.objects.filter(event_id=event_id), chunk_size, 'registrations', progress)
+    delete_in_chunks(EventWaitlist.objects.filter(event_id=event_id), chunk_size, 'waitlist', progress)
+    delete_in_chunks(FeedEntry.objects.filter(event_id=event_id), chunk_size, 'feed_entries', progress)
+    delete_in_chunks(EventSimilarity.objects.filter(event_id=event_id), chunk_size, 'similarities', progress)
+    delete_in_chunks(RegistrationRollup.objects.filter(event_id=event_id), chunk_size, 'rollups', progress)
+    delete_in_chunks(EventSimilarity.objects.filter(similar_event_id=event_id), chunk_size, 'similarities', progress)
+    _delete_row(Event, event_id, 'events', progress)
+
+
+def _purge_archived_events(club_id, chunk_size, progress=None):
+    delete_in_chunks(ArchivedFeedback.objects.filter(registration__event__club_id=club_id), chunk_size, 'archived_feedback', progress)
+    delete_in_chunks(ArchivedEventRegistration.objects.filter(event__club_id=club_id), chunk_size, 'archived_registrations', progress)
+    delete_in_chunks(ArchivedEvent.objects.filter(club_id=club_id), chunk_size, 'archived_events', progress)
+
+
+def purge_club(club_id, chunk_size, progress=None):
+    for event_id in list(Event.all_objects.filter(club_id=club_id).order_by('id').values_list('id', flat=True)):
+        purge_event(event_id, chunk_size, progress)
+    _purge_archived_events(club_id, chunk_size, progress)
+    delete_in_chunks(ClubMember.objects.filter(club_id=club_id), chunk_size, 'club_members', progress)
+    _delete_row(Club, club_id, 'clubs', progress)
+
+
+def purge_user(user_id, chunk_size, progress=None):
+    # clubs created by the user cascade with it, like a plain user.delete() would
+    for club_id in list(Club.all_objects.filter(created_by_id=user_id).order_by('id').values_list('id', flat=True)):
+        purge_club(club_id, chunk_size, progress)
+
+    delete_in_chunks(Feedback.objects.filter(registration__student_id=user_id), chunk_size, 'feedback', progress)
+    delete_in_chunks(Attendance.objects.filter(registration__student_id=user_id), chunk_size, 'attendance', progress)
+    delete_in_chunks(EventRegistration.objects.filter(student_id=user_id), chunk_size, 'registrations', progress)
+    delete_in_chunks(EventWaitlist.objects.filter(student_id=user_id), chunk_size, 'waitlist', progress)
+    delete_in_chunks(FeedEntry.objects.filter(user_id=user_id), chunk_size, 'feed_entries', progress)
+    delete_in_chunks(ClubMember.objects.filter(user_id=user_id), chunk_size, 'club_members', progress)
+    delete_in_chunks(ArchivedFeedback.objects.filter(registration__student_id=user_id), chunk_size, 'archived_feedback', progress)
+    delete_in_chunks(ArchivedEventRegistration.objects.filter(student_id=user_id), chunk_size, 'archived_registrations', progress)
+    if tenant_db() != DEFAULT_DB_ALIAS:
+        # the copy of the user in its shard ( see app/sharding.py )
+        _delete_row(User, user_id, 'users', using=tenant_db())
+    _delete_row(User, user_id, 'users', progress)
@@ -0,0 +1,153 @@
+import time
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import transaction
+from django.db.models import Sum
+from django.utils import timezone
+from .models import ClubMember, Event, EventRegistration, EventSimilarity
+from .sharding import tenant_db
+
+
+# "Recommended for you": item-item similarity over co-registrations.
+#
+# build_similarities() loads every (student, event) interaction with two values_list
+# queries -- a registration counts 1, an approved membership counts
+# RECOMMENDATION_MEMBER_WEIGHT for each event of that club -- and computes the cosine
+# similarity between every event and every upcoming approved event with NumPy, in
+# blocks of events x chunks of students so memory stays bounded. The top
+# RECOMMENDATION_TOP_K similar upcoming events of each event are stored in
+# EventSimilarity, and recommended_events() reads them with one indexed join.
+#
+# NumPy is only needed to build; serving the recommendations does not import it.
+
+
+def _numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise ImproperlyConfigured("Building recommendations requires numpy ( pip install numpy ).")
+    return numpy
+
+
+# indexes starts[i] .. starts[i] + counts[i] - 1 for every i, concatenated
+def _expand(np, starts, counts):
+    offsets = np.cumsum(counts) - counts
+    return np.repeat(starts - offsets, counts) + np.arange(counts.sum())
+
+
+def _interactions(np):
+    registrations = np.array(list(EventRegistration.objects.values_list('student_id', 'event_id')), dtype=np.int64).reshape(-1, 2)
+
+    memberships = np.array(list(ClubMember.objects.filter(approved=True).values_list('user_id', 'club_id')), dtype=np.int64).reshape(-1, 2)
+    club_events = np.array(list(Event.objects.values_list('club_id', 'id').order_by('club_id')), dtype=np.int64).reshape(-1, 2)
+    starts = np.searchsorted(club_events[:, 0], memberships[:, 1], side='left')
+    counts = np.searchsorted(club_events[:, 0], memberships[:, 1], side='right') - starts
+    member_students = np.repeat(memberships[:, 0], counts)
+    member_events = club_events[_expand(np, starts, counts), 1]
+
+    students = np.concatenate([registrations[:, 0], member_students])
+    events = np.concatenate([registrations[:, 1], member_events])
+    weights = np.concatenate([
+        np.ones(len(registrations), dtype=np.float32),
+        np.full(len(member_events), settings.RECOMMENDATION_MEMBER_WEIGHT, dtype=np.float32),
+    ])
+    return students, events, weights
+
+
+# Rebuild EventSimilarity; returns build statistics
+def build_similarities(top_k=None, event_batch=None, student_batch=None):
+    np = _numpy()
+    top_k = top_k or settings.RECOMMENDATION_TOP_K
+    event_batch = event_batch or settings.RECOMMENDATION_EVENT_BATCH
+    student_batch = student_batch or settings.RECOMMENDATION_STUDENT_BATCH
+    started = time.monotonic()
+
+    students, events, weights = _interactions(np)
+    student_ids, s_idx = np.unique(students, return_inverse=True)
+    event_ids, e_idx = np.unique(events, return_inverse=True)
+    n_students, n_events = len(student_ids), len(event_ids)
+
+    # a registration and a membership for the same (student, event) count once, with the higher weight
+    order = np.argsort(-weights, kind='stable')
+    _, first = np.unique((s_idx * n_events + e_idx)[order], return_index=True)
+    keep = order[first]
+    s_idx, e_idx, weights = s_idx[keep], e_idx[keep], weights[keep]
+
+    norms = np.sqrt(np.bincount(e_idx, weights=weights.astype(np.float64) ** 2, minlength=n_events)).astype(np.float32)
+
+    # CSR views: events of each student, students of each event
+    by_student = np.argsort(s_idx, kind='stable')
+    student_ptr = np.concatenate([[0], np.cumsum(np.bincount(s_idx, minlength=n_students))])
+    by_event = np.argsort(e_idx, kind='stable')
+    event_ptr = np.concatenate([[0], np.cumsum(np.bincount(e_idx, minlength=n_events))])
+
+    # only upcoming approved events are worth recommending
+    candidate_ids = np.array(
+        list(Event.objects.filter(approved=True, date_time__gt=timezone.now()).values_list('id', flat=True)), dtype=np.int64
+    )
+    candidates = np.nonzero(np.isin(event_ids, candidate_ids))[0]
+
+    similarities = []
+    for block_start in range(0, n_events if len(candidates) else 0, event_batch):
+        block = np.arange(block_start, min(block_start + event_batch, n_events))
+
+        # dense columns: the block's events and the candidates ( an event can be both )
+        needed = np.union1d(block, candidates)
+        columns = np.full(n_events, -1, dtype=np.int64)
+        columns[needed] = np.arange(len(needed))
+        block_columns, candidate_columns = columns[block], columns[candidates]
+
+        block_students = np.unique(s_idx[by_event[_expand(np, event_ptr[block], event_ptr[block + 1] - event_ptr[block])]])
+        scores = np.zeros((len(block), len(candidates)), dtype=np.float32)
+        for chunk_start in range(0, len(block_students), student_batch):
+            chunk = block_students[chunk_start:chunk_start + student_batch]
+            counts = student_ptr[chunk + 1] - student_ptr[chunk]
+            entries = by_student[_expand(np, student_ptr[chunk], counts)]
+            rows = np.repeat(np.arange(len(chunk)), counts)
+            cols = columns[e_idx[entries]]
+            wanted = cols >= 0
+            matrix = np.zeros((len(chunk), len(needed)), dtype=np.float32)
+            matrix[rows[wanted], cols[wanted]] = weights[entries[wanted]]
+            scores += matrix[:, block_columns].T @ matrix[:, candidate_columns]
+
+        scores /= norms[block][:, None] * norms[candidates][None, :]
+        scores[block[:, None] == candidates[None, :]] = 0   # an event is not similar to itself
+
+        k = min(top_k, len(candidates))
+        best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(scores, best, axis=1)
+        for row, column in zip(*np.nonzero(best_scores > 0)):
+            similarities.append(EventSimilarity(
+                event_id=int(event_ids[block[row]]),
+                similar_event_id=int(event_ids[candidates[best[row, column]]]),
+                score=float(best_scores[row, column]),
+            ))
+
+    with transaction.atomic(using=tenant_db()):
+        EventSimilarity.objects.all().delete()
+        EventSimilarity.objects.bulk_create(similarities, batch_size=1000)
+
+    return {
+        'students': int(n_students),
+        'events': int(n_events),
+        'interactions': int(len(weights)),
+        'candidates': int(len(candidates)),
+        'similarities': len(similarities),
+        'seconds': round(time.monotonic() - started, 3),
+    }
+
+
+# Upcoming events similar to the ones the student registered for, best first
+def recommended_events(user, limit=None):
+    return (
+        Event.objects.filter(
+            similar_from__event__registrations__student=user,
+            approved=True,
+            date_time__gt=timezone.now(),
+        )
+        .exclude(registrations__student=user)
+        .annotate(recommendation_score=Sum('similar_from__score'))
+        .with_registration_count()
+        .select_related('club')
+        .order_by('-recommendation_score', 'date_time')[:limit or settings.RECOMMENDATION_LIMIT]
+    )
@@ -0,0 +1,136 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Exists, Max, OuterRef
+from .models import Event, EventRegistration, EventWaitlist
+from .outbox import queue_email
+from .rollups import record_registration
+from .seats import publish_seats
+from .sharding import tenant_db
+
+
+# Seats are handed out under a lock on the event row (SQLite takes the write
+# lock at BEGIN, see DATABASES in settings), so registration, cancellation and
+# promotion never race for the same seat.
+def _lock_event(event):
+    return Event.objects.select_for_update().get(pk=event.pk)
+
+
+# deactivated students' seats count as free ( their rows are removed by the purge job )
+def _seats_left(event):
+    return event.max_participants - event.registrations.filter(student__is_active=True).count()
+
+
+# (seats left, whether anybody is waiting) with one query, read after the lock is held
+def _seat_state(event):
+    registered, waiting = (
+        Event.objects.filter(pk=event.pk)
+        .with_registration_count()
+        .annotate(waiting=Exists(EventWaitlist.objects.filter(event=OuterRef('pk'), student__is_active=True)))
+        .values_list('registration_count', 'waiting')
+        .get()
+    )
+    return event.max_participants - registered, waiting
+
+
+# raised by register_student for a student who already has a seat or a waitlist spot
+class DuplicateRegistrationError(ValueError):
+    pass
+
+
+# Register a student, or put them at the tail of the waitlist when the event is full
+def register_student(event, user):
+    """
+    Returns (registration, waitlist_entry); exactly one of them is set.
+    Duplicates are caught by the unique constraints, not looked up before the insert.
+    """
+    # no savepoint: called inside the registration form's transaction, which is
+    # rolled back as a whole when the student turns out to be registered already
+    with transaction.atomic(using=tenant_db(), savepoint=False):
+        event = _lock_event(event)
+
+        # FIFO: once somebody is waiting, new students queue behind them
+        seats_left, waiting = _seat_state(event)
+        if seats_left > 0 and waiting:
+            # seats freed without a cancellation ( a deactivated student ) go to the queue first
+            promote_waitlist(event)
+            seats_left, waiting = _seat_state(event)
+        if seats_left > 0 and not waiting:
+            try:
+                registration = EventRegistration.objects.create(event=event, student=user)
+            except IntegrityError:
+                raise DuplicateRegistrationError("You have already registered for this event.")
+            record_registration(event, registration)
+            publish_seats(event, seats_left - 1)
+            queue_email(
+                user.email,
+                f"Registered for {event.title}",
+                f"You are registered for '{event.title}' on {event.date_time:%Y-%m-%d %H:%M} at {event.venue}."
+            )
+            return registration, None
+
+        # a full event: the student may hold one of the seats
+        if event.registrations.filter(student=user).exists():
+            raise DuplicateRegistrationError("You have already registered for this event.")
+        try:
+            entry = _join_waitlist(event, user)
+        except IntegrityError:
+            raise DuplicateRegistrationError("You are already on the waitlist for this event.")
+        queue_email(
+            user.email,
+            f"Waitlisted for {event.title}",
+            f"'{event.title}' is full. You are on the waitlist and will be registered automatically if a seat frees up."
+        )
+        return None, entry
+
+
+def _join_waitlist(event, user):
+    # the tail is read through the (event, position) index, no rescan of the queue
+    tail = event.waitlist.aggregate(tail=Max('position'))['tail'] or 0
+    return EventWaitlist.objects.create(event=event, student=user, position=tail + 1)
+
+
+# Position of a waitlist entry counted from the head of the queue (1 = next in line)
+def waitlist_rank(entry):
+    return EventWaitlist.objects.filter(event_id=entry.event_id, position__lt=entry.position).count() + 1
+
+
+# Cancel a registration (or leave the waitlist) and hand free seats to the waitlist
+def cancel_registration(event, user):
+    """
+    Returns the list of registrations created for promoted students, or None
+    if the user was neither registered nor waitlisted for the event.
+    """
+    with transaction.atomic(using=tenant_db()):
+        event = _lock_event(event)
+
+        registration = EventRegistration.objects.filter(event=event, student=user).first()
+        if registration is None:
+            deleted, _ = EventWaitlist.objects.filter(event=event, student=user).delete()
+            if not deleted:
+                return None
+            return []
+
+        registration.delete()
+        record_registration(event, registration, delta=-1)
+        return promote_waitlist(event)
+
+
+# Move students from the head of the waitlist into free seats (caller holds the event lock)
+def promote_waitlist(event):
+    promoted = []
+    seats_left = _seats_left(event)
+    while seats_left > 0:
+        head = event.waitlist.filter(student__is_active=True).select_related('student').order_by('position').first()
+        if head is None:
+            break
+        head.delete()
+        registration = EventRegistration.objects.create(event=event, student_id=head.student_id)
+        record_registration(event, registration)
+        promoted.append(registration)
+        seats_left -= 1
+        queue_email(
+            head.student.email,
+            f"A seat opened up for {event.title}",
+            f"Good news! A seat became available and you are now registered for '{event.title}'."
+        )
+    publish_seats(event, seats_left)
+    return promoted
@@ -0,0 +1,29 @@
+from itertools import islice
+from rest_framework.utils.encoders import JSONEncoder
+
+
+# Renders a JSON array incrementally: rows are pulled from an iterator in chunks,
+# each chunk is turned into dicts by `serialize_chunk` and encoded on its own, so
+# memory use depends on the chunk size and not on the number of rows.
+class StreamingJSONRenderer:
+    media_type = 'application/json'
+    charset = 'utf-8'
+
+    def __init__(self, chunk_size=500):
+        self.chunk_size = chunk_size
+        self.encoder = JSONEncoder(ensure_ascii=False, separators=(',', ':'))
+
+    def render(self, rows, serialize_chunk):
+        rows = iter(rows)
+        yield b'['
+        first = True
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            items = [self.encoder.encode(item) for item in serialize_chunk(chunk)]
+            text = ','.join(items)
+            yield (text if first else ',' + text).encode(self.charset)
+            first = False
+        yield b']'
+
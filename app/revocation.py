@@ -0,0 +1,155 @@
+import hashlib
+import threading
+import time
+import uuid
+from datetime import datetime, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from rest_framework_simplejwt.settings import api_settings
+from .models import RevokedToken, UserTokenCutoff
+
+
+# JWT revocation without a database lookup per request.
+#
+# Two kinds of revocation are stored in the database ( the source of truth ):
+#   * UserTokenCutoff: user id -> unix time; every token of that user issued before it
+#     is rejected ("sign out everywhere", admin revoke)
+#   * RevokedToken: one logged out jti until it expires
+#
+# Each worker keeps the cutoffs and a bloom filter of the revoked jtis in memory. A bloom
+# hit is confirmed with an exact RevokedToken look-up, so a false positive costs one
+# indexed query, never a wrong 401. The worker reloads both when the version key in the
+# shared cache changes, checked at most every REVOCATION_SYNC_SECONDS; a revocation made
+# in another worker is therefore seen within that delay. Losing the version key ( cache
+# cull or restart ) only makes workers reload, it never loses a revocation.
+#
+# Tokens from the login view carry ISSUED_CLAIM, the issue time with microseconds, so a
+# login right after "sign out everywhere" is not caught by a cutoff in the same second.
+
+VERSION_KEY = 'revocation:version'
+ISSUED_CLAIM = 'issued_at'
+
+
+# fixed-size bloom filter, positions by double hashing of one blake2b digest
+class BloomFilter:
+    def __init__(self, bits, hashes, data=None):
+        self.bits = bits
+        self.hashes = hashes
+        self.data = bytearray(data) if data is not None else bytearray(bits // 8)
+
+    def _positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * second) % self.bits for i in range(self.hashes)]
+
+    def add(self, item):
+        for position in self._positions(item):
+            self.data[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.data[position >> 3] & (1 << (position & 7)) for position in self._positions(item))
+
+
+def _cache():
+    return caches[settings.REVOCATION_CACHE]
+
+
+def _utc(timestamp):
+    return datetime.fromtimestamp(timestamp, dt_timezone.utc)
+
+
+def _oldest_cutoff():
+    # cutoffs older than the longest token lifetime cannot match a valid token any more
+    return time.time() - api_settings.REFRESH_TOKEN_LIFETIME.total_seconds()
+
+
+# this worker's copy of the state
+class _LocalState:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.version = None
+        self.checked = 0.0
+        self.not_before = {}
+        self.bloom = None
+
+    def load(self, version):
+        bloom = BloomFilter(settings.REVOCATION_BLOOM_BITS, settings.REVOCATION_BLOOM_HASHES)
+        for jti in RevokedToken.objects.filter(expires_at__gt=_utc(time.time())).values_list('jti', flat=True).iterator():
+            bloom.add(jti)
+        self.not_before = {
+            str(user_id): not_before
+            for user_id, not_before in UserTokenCutoff.objects.filter(not_before__gt=_oldest_cutoff()).values_list('user_id', 'not_before')
+        }
+        self.bloom = bloom
+        self.version = version
+
+
+_local = _LocalState()
+
+
+def _sync(force=False):
+    now = time.monotonic()
+    if not force and _local.version is not None and now - _local.checked < settings.REVOCATION_SYNC_SECONDS:
+        return
+    with _local.lock:
+        cache = _cache()
+        version = cache.get(VERSION_KEY)
+        if version is None:
+            # first worker up, or the key was evicted: publish one so the others settle on it
+            cache.add(VERSION_KEY, uuid.uuid4().hex, None)
+            version = cache.get(VERSION_KEY)
+        if force or version != _local.version:
+            _local.load(version)
+        _local.checked = now
+
+
+# after the revocation commits: tell every worker to reload, this one right away
+def _publish():
+    _cache().set(VERSION_KEY, uuid.uuid4().hex, None)
+    _sync(force=True)
+
+
+# Stamp a new token with its issue time to the microsecond ( see ISSUED_CLAIM )
+def stamp_issue_time(token):
+    token[ISSUED_CLAIM] = time.time()
+    return token
+
+
+# Revoke one token (access or refresh) until it expires
+def revoke_token(payload):
+    jti = payload.get(api_settings.JTI_CLAIM)
+    expires = int(payload.get('exp', 0))
+    now = time.time()
+    if not jti or expires <= now:
+        return
+
+    with transaction.atomic():
+        RevokedToken.objects.filter(expires_at__lte=_utc(now)).delete()
+        RevokedToken.objects.get_or_create(jti=jti, defaults={'expires_at': _utc(expires)})
+        transaction.on_commit(_publish)
+
+
+# Revoke every token issued to the user so far
+def revoke_user(user_id):
+    with transaction.atomic():
+        UserTokenCutoff.objects.filter(not_before__lte=_oldest_cutoff()).delete()
+        UserTokenCutoff.objects.update_or_create(user_id=user_id, defaults={'not_before': time.time()})
+        transaction.on_commit(_publish)
+
+
+def is_revoked(payload):
+    _sync()
+    not_before = _local.not_before.get(str(payload.get(api_settings.USER_ID_CLAIM)))
+    if not_before is not None:
+        issued = payload.get(ISSUED_CLAIM)
+        if issued is None:
+            # whole-second 'iat' only: a token from the cutoff's second may predate it
+            if payload.get('iat', 0) <= not_before:
+                return True
+        elif issued < not_before:
+            return True
+    jti = payload.get(api_settings.JTI_CLAIM)
+    if jti and jti in _local.bloom:
+        return RevokedToken.objects.filter(jti=jti, expires_at__gt=_utc(time.time())).exists()
+    return False
@@ -0,0 +1,89 @@
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDay, TruncHour
+from django.utils import timezone
+from .models import EventRegistration, RegistrationRollup
+from .sharding import tenant_db
+
+
+# Registration counts per (event, hour) and (event, day), so registration velocity is
+# read from a few rollup rows instead of counting raw registrations. Buckets start on
+# the hour / midnight in the current time zone, the same as TruncHour / TruncDay.
+
+GRANULARITIES = {
+    'hour': TruncHour,
+    'day': TruncDay,
+}
+
+
+def bucket_start(moment, granularity):
+    moment = timezone.localtime(moment).replace(minute=0, second=0, microsecond=0)
+    if granularity == 'day':
+        moment = moment.replace(hour=0)
+    return moment
+
+
+def _bump(event, granularity, bucket, delta):
+    rollups = RegistrationRollup.objects.filter(event_id=event.id, granularity=granularity, bucket_start=bucket)
+    if rollups.update(count=F('count') + delta) or delta < 0:
+        return
+    try:
+        with transaction.atomic(using=tenant_db()):
+            RegistrationRollup.objects.create(
+                event_id=event.id, club_id=event.club_id, granularity=granularity, bucket_start=bucket, count=delta
+            )
+    except IntegrityError:
+        # created by a concurrent registration in between
+        rollups.update(count=F('count') + delta)
+
+
+# Count a new registration (delta=1) or a cancelled one (delta=-1); called inside the registration transaction
+def record_registration(event, registration, delta=1):
+    for granularity in GRANULARITIES:
+        _bump(event, granularity, bucket_start(registration.registered_at, granularity), delta)
+
+
+# Recount the rollups from the raw registrations ( all events, or only `event_ids` )
+def rebuild_rollups(event_ids=None, batch_size=1000):
+    registrations = EventRegistration.objects.all()
+    rollups = RegistrationRollup.objects.all()
+    if event_ids is not None:
+        registrations = registrations.filter(event_id__in=event_ids)
+        rollups = rollups.filter(event_id__in=event_ids)
+
+    with transaction.atomic(using=tenant_db()):
+        rollups.delete()
+        created = 0
+        for granularity, trunc in GRANULARITIES.items():
+            rows = (
+                registrations.annotate(bucket=trunc('registered_at'))
+                .values('event_id', 'event__club_id', 'bucket')
+                .annotate(total=Count('id'))
+                .order_by()
+            )
+            created += len(RegistrationRollup.objects.bulk_create(
+                [
+                    RegistrationRollup(
+                        event_id=row['event_id'], club_id=row['event__club_id'], granularity=granularity,
+                        bucket_start=row['bucket'], count=row['total'],
+                    )
+                    for row in rows.iterator(chunk_size=5000)
+                ],
+                batch_size=batch_size,
+            ))
+    return created
+
+
+# Time series [{bucket_start, count}] of one event or of all events of one club
+def registration_series(granularity, event_id=None, club_id=None, start=None, end=None):
+    rollups = RegistrationRollup.objects.filter(granularity=granularity)
+    if event_id is not None:
+        rollups = rollups.filter(event_id=event_id)
+    else:
+        rollups = rollups.filter(club_id=club_id)
+    if start is not None:
+        rollups = rollups.filter(bucket_start__gte=bucket_start(start, granularity))
+    if end is not None:
+        rollups = rollups.filter(bucket_start__lt=end)
+    rows = rollups.values('bucket_start').annotate(total=Sum('count')).filter(total__gt=0).order_by('bucket_start')
+    return [{'bucket_start': row['bucket_start'], 'count': row['total']} for row in rows]
@@ -0,0 +1,148 @@
+import asyncio
+import json
+from collections import defaultdict
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Count, Q
+from .models import Event
+from .sharding import tenant_db
+
+
+# Live seat availability ( GET event/seats/stream/ ).
+#
+# Registration writes publish the new seats_left of the event to SEATS_CACHE when their
+# transaction commits; that cache is the cross-worker channel ( the shared file cache
+# on one host, a networked cache otherwise ). Every worker runs one SeatHub: it polls
+# the cache only for the events its own watchers are subscribed to, at most every
+# SEATS_STREAM_INTERVAL seconds, and hands each change to all of them. Thousands of
+# watchers of an event cost one cache read per interval and worker, not a COUNT(*) each,
+# and a burst of registrations reaches them as a single coalesced update.
+
+
+def _cache():
+    return caches[settings.SEATS_CACHE]
+
+
+def seats_key(event_id, using=None):
+    return f"seats:{using or tenant_db()}:{event_id}"
+
+
+# Publish the seats left of `event` once the current transaction commits
+def publish_seats(event, seats_left):
+    key = seats_key(event.id, event._state.db)
+    transaction.on_commit(
+        lambda: _cache().set(key, max(seats_left, 0), settings.SEATS_CACHE_TTL),
+        using=event._state.db,
+    )
+
+
+# {event id: seats left} for the events in `event_ids`, from the cache; the ones it does
+# not have yet are counted with one query and published
+def current_seats(event_ids):
+    keys = {seats_key(event_id): event_id for event_id in event_ids}
+    cached = _cache().get_many(keys)
+    seats = {keys[key]: value for key, value in cached.items()}
+    missing = [event_id for event_id in event_ids if event_id not in seats]
+    if missing:
+        counted = {
+            event_id: max(capacity - taken, 0)
+            for event_id, capacity, taken in Event.objects.filter(id__in=missing)
+            .annotate(taken=Count('registrations', filter=Q(registrations__student__is_active=True))).values_list('id', 'max_participants', 'taken')
+        }
+        _cache().set_many({seats_key(event_id): value for event_id, value in counted.items()}, settings.SEATS_CACHE_TTL)
+        seats.update(counted)
+    return seats
+
+
+class Subscriber:
+    def __init__(self, keys):
+        self.keys = keys          # cache key -> event id
+        self.pending = {}         # event id -> seats left not sent yet ( newer values overwrite older ones )
+        self.changed = asyncio.Event()
+
+    def push(self, event_id, seats_left):
+        self.pending[event_id] = seats_left
+        self.changed.set()
+
+    def take(self):
+        pending, self.pending = self.pending, {}
+        self.changed.clear()
+        return pending
+
+
+# One per event loop ( worker ): fans cache changes out to the local subscribers
+class SeatHub:
+    def __init__(self):
+        self.subscribers = defaultdict(set)   # cache key -> subscribers
+        self.values = {}                      # cache key -> last value handed out
+        self.poller = None
+        self.polls = 0                        # cache reads so far
+
+    def subscribe(self, keys, initial):
+        subscriber = Subscriber(keys)
+        for key, event_id in keys.items():
+            self.subscribers[key].add(subscriber)
+            self.values.setdefault(key, initial[event_id])
+            subscriber.push(event_id, initial[event_id])
+        if self.poller is None or self.poller.done():
+            self.poller = asyncio.get_running_loop().create_task(self._poll())
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        for key in subscriber.keys:
+            self.subscribers[key].discard(subscriber)
+            if not self.subscribers[key]:
+                del self.subscribers[key]
+                self.values.pop(key, None)
+
+    async def _poll(self):
+        while self.subscribers:
+            await asyncio.sleep(settings.SEATS_STREAM_INTERVAL)
+            keys = list(self.subscribers)
+            if not keys:
+                break
+            self.polls += 1
+            for key, value in (await _cache().aget_many(keys)).items():
+                if value == self.values.get(key) or key not in self.subscribers:
+                    continue
+                self.values[key] = value
+                for subscriber in self.subscribers[key]:
+                    subscriber.push(subscriber.keys[key], value)
+
+
+_hubs = {}
+
+
+def get_hub():
+    loop = asyncio.get_running_loop()
+    if loop not in _hubs:
+        # drop the hubs of closed loops ( tests, management commands )
+        for closed in [other for other in _hubs if other.is_closed()]:
+            del _hubs[closed]
+        _hubs[loop] = SeatHub()
+    return _hubs[loop]
+
+
+def _sse(name, data):
+    return f"event: {name}\ndata: {json.dumps(data)}\n\n".encode()
+
+
+# Server-Sent Events for `keys` ( cache key -> event id ): the `initial` seats, then a
+# `seats` message per change and a comment line every SEATS_STREAM_KEEPALIVE seconds so
+# proxies keep the connection open. Subscribes on first iteration, i.e. on the server's
+# event loop ( the view itself may run on a temporary one behind sync middleware ).
+async def seat_events(keys, initial):
+    hub = get_hub()
+    subscriber = hub.subscribe(keys, initial)
+    try:
+        while True:
+            try:
+                await asyncio.wait_for(subscriber.changed.wait(), settings.SEATS_STREAM_KEEPALIVE)
+            except asyncio.TimeoutError:
+                yield b": keepalive\n\n"
+                continue
+            for event_id, seats_left in subscriber.take().items():
+                yield _sse('seats', {'event_id': event_id, 'seats_left': seats_left})
+    finally:
+        hub.unsubscribe(subscriber)
@@ -1,8 +1,28 @@
 from rest_framework import serializers
-from .models import User, Role, StudentProfile, Club, ClubMember, Event, EventRegistration, Feedback
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.tokens import RefreshToken
+from .revocation import is_revoked, stamp_issue_time
+from .models import User, Role, StudentProfile, Club, ClubMember, Event, EventRegistration, Feedback, Job
+from .registrations import DuplicateRegistrationError, register_student
+from .sharding import tenant_db, user_db
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
 from django.utils import timezone
 from django.contrib.auth.hashers import make_password
 
+# Run one INSERT that may hit a unique constraint ( the caller catches IntegrityError ).
+# In autocommit the statement is its own transaction; inside a transaction ( batch
+# requests, tests ) it gets a savepoint, so the error does not break the outer block.
+def insert_or_conflict(create, using=None):
+    using = using or tenant_db()
+    if not transaction.get_connection(using).in_atomic_block:
+        return create()
+    with transaction.atomic(using=using):
+        return create()
+
+
 #Role Serializer
 class RoleSerializer(serializers.ModelSerializer):
     class Meta:
@@ -25,9 +45,15 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'password', 'student_profile']
+        fields = ['id', 'username', 'email', 'password', 'tenant', 'student_profile']
         extra_kwargs = {'password': {'write_only': True}}
 
+    def validate_tenant(self, value):
+        # with sharding on, only universities that have a database ( settings.SHARDS )
+        if value and settings.SHARDS and value not in settings.SHARDS:
+            raise serializers.ValidationError("Unknown university.")
+        return value
+
     def create(self, validated_data):
         student_data = validated_data.pop('student_profile', None)
         password = validated_data.pop('password')
@@ -48,8 +74,8 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = User
-        fields = ['id', 'username', 'email', 'roles', 'student_profile']
-        read_only_fields = ['id', 'roles']
+        fields = ['id', 'username', 'email', 'roles', 'tenant', 'student_profile']
+        read_only_fields = ['id', 'roles', 'tenant']
 
     def update(self, instance, validated_data):
         student_data = validated_data.pop('student_profile', None)
@@ -107,6 +133,16 @@ class ClubSerializer(serializers.ModelSerializer):
                     f"Assigned user '{club.moderator.username}' is not a valid moderator."
                 )
         return value
+
+    def validate(self, data):
+        # the moderator must belong to the club's tenant ( see app/sharding.py )
+        moderator = data.get('moderator')
+        club_db = self.instance._state.db if self.instance is not None else tenant_db()
+        if moderator is not None and user_db(moderator) != club_db:
+            raise serializers.ValidationError(
+                {"moderator": f"'{moderator.username}' belongs to another university than this club."}
+            )
+        return data
     
     
 # club list serializer
@@ -169,11 +205,11 @@ class ClubMembershipApplySerializer(serializers.ModelSerializer):
         if apply == 'no':
             raise serializers.ValidationError({"apply": "You chose not to apply for this club."})
 
-        # Prevent duplicate applications
-        if ClubMember.objects.filter(user=user, club=club).exists():
+        # Prevent duplicate applications: the (club, user) unique constraint rejects them, no look-up first
+        try:
+            return insert_or_conflict(lambda: ClubMember.objects.create(user=user, club=club))
+        except IntegrityError:
             raise serializers.ValidationError({"detail": "You have already applied for this club."})
-
-        return ClubMember.objects.create(user=user, club=club)
     
 
 # Membership request serializer   
@@ -270,7 +306,10 @@ class ApprovedEventListSerializer(serializers.ModelSerializer):
         fields = ['id', 'title', 'club_name', 'description', 'date_time', 'venue', 'fee', 'seats_left']
 
     def get_seats_left(self, obj):
-        total_registered = obj.registrations.count()
+        # list views annotate the count ( Event.objects.with_registration_count() )
+        total_registered = getattr(obj, 'registration_count', None)
+        if total_registered is None:
+            total_registered = obj.registrations.filter(student__is_active=True).count()
         return max(obj.max_participants - total_registered, 0)
     
     
@@ -310,7 +349,6 @@ class EventRegistrationFormSerializer(serializers.ModelSerializer):
         read_only_fields = ['event']
 
     def validate(self, attrs):
-        user = self.context['request'].user
         event = self.context.get('event')
 
         # Check if event exists and is approved
@@ -321,15 +359,7 @@ class EventRegistrationFormSerializer(serializers.ModelSerializer):
         if event.date_time <= timezone.now():
             raise serializers.ValidationError("Cannot register for past events.")
 
-        # Check seat availability
-        total_registered = event.registrations.count()
-        if total_registered >= event.max_participants:
-            raise serializers.ValidationError("No seats are available for this event.")
-
-        # Check if already registered
-        if EventRegistration.objects.filter(event=event, student=user).exists():
-            raise serializers.ValidationError("You have already registered for this event.")
-
+        # already registered / waitlisted is caught by the unique constraints in create()
         return attrs
 
     def create(self, validated_data):
@@ -338,24 +368,44 @@ class EventRegistrationFormSerializer(serializers.ModelSerializer):
 
         # Extract form fields
         student_name = validated_data.pop('student_name')
-        university_id = validated_data.pop('university_id')
-        department = validated_data.pop('department')
+        details = {
+            'department': validated_data.pop('department'),
+            'university_id': validated_data.pop('university_id'),
+        }
         gmail = validated_data.pop('gmail')
 
-        # Update student's profile if not already filled
-        student_profile, _ = StudentProfile.objects.get_or_create(user=user)
-        student_profile.department = department
-        student_profile.university_id = university_id
-        student_profile.save()
-
-        # Ensure user's email matches entered Gmail
-        user.email = gmail
-        user.save()
-
-        # Register the student for event
-        registration = EventRegistration.objects.create(event=event, student=user)
-
-        return registration
+        # one transaction: the profile and email changes are kept only if the student gets
+        # a seat or a waitlist spot ( users live on the global database, see app/sharding.py )
+        try:
+            with transaction.atomic(), transaction.atomic(using=tenant_db(), savepoint=False):
+                self._update_student(user, details, gmail)
+                registration, waitlist_entry = register_student(event, user)
+        except DuplicateRegistrationError as exc:
+            raise serializers.ValidationError(str(exc))
+
+        return registration or waitlist_entry
+
+    # Fill in the student's profile and email, writing only the columns the form changes
+    def _update_student(self, user, details, gmail):
+        profile = StudentProfile.objects.filter(user=user).first()
+        if profile is None:
+            StudentProfile.objects.create(user=user, **details)
+        else:
+            changed = [field for field, value in details.items() if getattr(profile, field) != value]
+            for field in changed:
+                setattr(profile, field, details[field])
+            if changed:
+                profile.save(update_fields=changed)
+
+        # Ensure user's email matches entered Gmail ( unique: another account may have it,
+        # the error leaves the transaction and rolls it back )
+        if user.email != gmail:
+            previous, user.email = user.email, gmail
+            try:
+                user.save(update_fields=['email'])
+            except IntegrityError:
+                user.email = previous
+                raise serializers.ValidationError({"gmail": "This email is already used by another account."})
     
     
     
@@ -396,21 +446,22 @@ class FeedbackSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if request and hasattr(request, "user"):
             user = request.user
-            # Only include past events user registered for and hasn't given feedback
+            # Only include past events user registered for, with the id of that registration
             self.fields['event'].queryset = Event.objects.filter(
                 registrations__student=user,
                 date_time__lt=timezone.now()  # past events only
-            ).exclude(
-                registrations__feedback__isnull=False  # exclude events already reviewed
-            ).distinct()
+            ).annotate(student_registration_id=F('registrations__id'))
 
     def create(self, validated_data):
         event = validated_data.pop('event')
-        user = self.context['request'].user
 
-        registration = EventRegistration.objects.get(event=event, student=user)
-        feedback = Feedback.objects.create(registration=registration, **validated_data)
-        return feedback
+        # one feedback per registration ( one-to-one ): a second one is rejected by the insert
+        try:
+            return insert_or_conflict(
+                lambda: Feedback.objects.create(registration_id=event.student_registration_id, **validated_data)
+            )
+        except IntegrityError:
+            raise serializers.ValidationError({"event": "You have already given feedback for this event."})
 
 
 
@@ -433,4 +484,163 @@ class EventStatisticsSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Event
-        fields = ['id', 'title', 'total_registrations', 'total_amount_collected']
\ No newline at end of file
+        fields = ['id', 'title', 'total_registrations', 'total_amount_collected']
+
+
+# background job status serializer
+class JobSerializer(serializers.ModelSerializer):
+    created_by = serializers.ReadOnlyField(source='created_by.username')
+
+    class Meta:
+        model = Job
+        fields = [
+            'id', 'name', 'status', 'payload', 'progress', 'result', 'error', 'attempts', 'max_attempts',
+            'created_by', 'created_at', 'started_at', 'finished_at'
+        ]
+        read_only_fields = fields
+
+
+
+# Fast read-only serializer for list endpoints. Instead of building model instances it
+# fetches only the requested columns (joined relations included) with values() in one
+# query and renames them into response dicts. Supports sparse fieldsets (?fields=a,b).
+class ValuesSerializer:
+    # response field -> ORM lookup
+    field_lookups = {}
+    # response field -> DRF field used to format the raw value (dates, decimals)
+    field_formats = {}
+
+    def __init__(self, fields=None):
+        if fields:
+            requested = [name.strip() for name in fields.split(',') if name.strip()]
+            unknown = [name for name in requested if name not in self.field_lookups]
+            if unknown:
+                raise serializers.ValidationError(
+                    {"fields": f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(self.field_lookups)}."}
+                )
+            self.fields = requested
+        else:
+            self.fields = list(self.field_lookups)
+
+    def values(self, queryset):
+        return queryset.values(*(self.field_lookups[name] for name in self.fields))
+
+    def to_representation(self, rows):
+        columns = [(name, self.field_lookups[name], self.field_formats.get(name)) for name in self.fields]
+        return [
+            {
+                name: fmt.to_representation(row[lookup]) if fmt and row[lookup] is not None else row[lookup]
+                for name, lookup, fmt in columns
+            }
+            for row in rows
+        ]
+
+
+# club list ( same output as ClubListSerializer )
+class ClubListValuesSerializer(ValuesSerializer):
+    field_lookups = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'moderator': 'moderator__username',
+        'created_by': 'created_by__username',
+        'status': 'status',
+        'created_at': 'created_at',
+    }
+    field_formats = {'created_at': serializers.DateTimeField()}
+
+
+# moderator event list ( same output as ModeratorEventSerializer )
+class ModeratorEventValuesSerializer(ValuesSerializer):
+    field_lookups = {
+        'id': 'id',
+        'club_name': 'club__name',
+        'title': 'title',
+        'description': 'description',
+        'date_time': 'date_time',
+        'venue': 'venue',
+        'max_participants': 'max_participants',
+        'fee': 'fee',
+        'approved': 'approved',
+    }
+    field_formats = {
+        'date_time': serializers.DateTimeField(),
+        'fee': serializers.DecimalField(max_digits=8, decimal_places=2),
+    }
+
+
+# moderator club list ( same output as ModeratorClubSerializer )
+class ModeratorClubValuesSerializer(ValuesSerializer):
+    field_lookups = {
+        'id': 'id',
+        'name': 'name',
+        'description': 'description',
+        'status': 'status',
+        'created_by': 'created_by__username',
+        'moderator': 'moderator__username',
+        'created_at': 'created_at',
+    }
+    field_formats = {'created_at': serializers.DateTimeField()}
+
+
+# membership requests ( same output as ClubMemberRequestSerializer )
+class ClubMemberRequestValuesSerializer(ValuesSerializer):
+    field_lookups = {
+        'id': 'id',
+        'club_name': 'club__name',
+        'user_name': 'user__username',
+        'approved': 'approved',
+    }
+
+
+# pending events ( same output as PendingEventListSerializer )
+class PendingEventValuesSerializer(ValuesSerializer):
+    field_lookups = {
+        'id': 'id',
+        'club_name': 'club__name',
+        'title': 'title',
+    }
+
+
+# event statistics, on a queryset annotated by with_statistics() ( same output as EventStatisticsSerializer )
+class EventStatisticsValuesSerializer(ValuesSerializer):
+    field_lookups = {
+        'id': 'id',
+        'title': 'title',
+        'total_registrations': 'total_registrations',
+        'total_amount_collected': 'total_amount_collected',
+    }
+    field_formats = {'total_amount_collected': serializers.DecimalField(max_digits=10, decimal_places=2)}
+
+
+
+# login that stamps the tokens with their issue time to the microsecond ( see app/revocation.py )
+class RevocableTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        return stamp_issue_time(super().get_token(user))
+
+
+# token refresh that refuses revoked refresh tokens
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        if is_revoked(RefreshToken(attrs['refresh']).payload):
+            raise InvalidToken({"detail": "Token has been revoked.", "code": "token_revoked"})
+        return super().validate(attrs)
+
+
+
+# query parameters of the registration analytics endpoint
+class RegistrationAnalyticsQuerySerializer(serializers.Serializer):
+    event = serializers.IntegerField(required=False)
+    club = serializers.IntegerField(required=False)
+    granularity = serializers.ChoiceField(choices=['hour', 'day'], default='day')
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+
+    def validate(self, data):
+        if ('event' in data) == ('club' in data):
+            raise serializers.ValidationError("Provide exactly one of 'event' or 'club'.")
+        if 'start' in data and 'end' in data and data['start'] >= data['end']:
+            raise serializers.ValidationError("'start' must be before 'end'.")
+        return data
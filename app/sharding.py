@@ -0,0 +1,154 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.http import HttpResponseBadRequest
+from django.urls import reverse
+
+
+# Per-university sharding.
+#
+# SHARDS maps a tenant ( User.tenant, the university code ) to a database alias. Clubs,
+# events and everything hanging off them -- memberships, registrations, waitlists,
+# feedback, attendance, feeds, rollups, similarities, archives and the email outbox --
+# live in the database of the tenant of the authenticated user. Users, roles, student
+# profiles, jobs and the contrib apps stay on the global 'default' database, which is
+# also the database of users without a tenant ( and of everybody when SHARDS is empty ).
+#
+# Every database has the full schema. Users and student profiles are copied into the
+# database of their tenant when saved, so sharded rows keep real foreign keys to them
+# and joins such as registration -> student -> profile run inside one database.
+#
+# The tenant is a context variable: TenantMiddleware sets it for session users and
+# RevocableJWTAuthentication for API users; jobs run with the tenant they were queued in.
+# Admins work across tenants, so they pick one explicitly: ?tenant=<code> on the admin
+# API views ( TenantSelectionMixin ) and on any admin site page ( kept in the session ).
+# A club's moderator must belong to the club's tenant, the only shard that has a copy
+# of them and the one their own requests are routed to.
+
+SHARDED_MODELS = {
+    'club', 'clubmember', 'event', 'eventregistration', 'eventwaitlist', 'feedback',
+    'attendance', 'feedentry', 'eventsimilarity', 'registrationrollup', 'outboxmessage',
+    'archivedevent', 'archivedeventregistration', 'archivedfeedback',
+}
+MIRRORED_MODELS = {'user', 'studentprofile'}
+
+_tenant = ContextVar('tenant', default=None)
+
+
+def current_tenant():
+    return _tenant.get()
+
+
+def set_tenant(tenant):
+    return _tenant.set(tenant or None)
+
+
+@contextmanager
+def tenant_context(tenant):
+    token = set_tenant(tenant)
+    try:
+        yield
+    finally:
+        _tenant.reset(token)
+
+
+# Database alias of a tenant ( default: the tenant of the current context )
+def tenant_db(tenant=None):
+    return settings.SHARDS.get(tenant or current_tenant(), DEFAULT_DB_ALIAS)
+
+
+# Database alias of the tenant `user` belongs to ( the global one for users without a tenant )
+def user_db(user):
+    return settings.SHARDS.get(user.tenant, DEFAULT_DB_ALIAS) if user.tenant else DEFAULT_DB_ALIAS
+
+
+# A tenant picked by an admin: None for the global database, ValueError for an unknown code
+def parse_tenant(value):
+    if value and value not in settings.SHARDS:
+        raise ValueError(f"Unknown tenant '{value}'.")
+    return value or None
+
+
+# Every tenant with its own database, None standing for the global database
+def all_tenants():
+    return [None, *settings.SHARDS]
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'app' and model._meta.model_name in SHARDED_MODELS
+
+
+class TenantRouter:
+    def _db(self, model, hints):
+        if not is_sharded(model):
+            return DEFAULT_DB_ALIAS
+        # related managers of a sharded row stay in the database the row came from
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db and is_sharded(type(instance)):
+            return instance._state.db
+        return tenant_db()
+
+    def db_for_read(self, model, **hints):
+        return self._db(model, hints)
+
+    def db_for_write(self, model, **hints):
+        return self._db(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # users and profiles are mirrored into every shard
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return True
+
+
+# Copy a user or student profile into the database of its tenant
+def mirror(instance, tenant):
+    alias = tenant_db(tenant) if tenant else DEFAULT_DB_ALIAS
+    if alias == DEFAULT_DB_ALIAS:
+        return
+    model = type(instance)
+    fields = {field.attname: getattr(instance, field.attname) for field in model._meta.concrete_fields}
+    manager = model._base_manager.db_manager(alias)
+    if not manager.filter(pk=instance.pk).update(**fields):
+        manager.bulk_create([model(**fields)])
+
+
+# post_save receiver, connected in AppConfig.ready
+def mirror_on_save(sender, instance, using, raw=False, **kwargs):
+    if raw or using != DEFAULT_DB_ALIAS or not settings.SHARDS:
+        return
+    if sender._meta.model_name == 'user':
+        mirror(instance, instance.tenant)
+    elif sender._meta.model_name == 'studentprofile':
+        mirror(instance, instance.user.tenant)
+
+
+# Middleware: requests start without a tenant; session users ( the admin ) get theirs,
+# or on the admin site the one they picked with ?tenant=<code> ( ?tenant= for the global database )
+class TenantMiddleware:
+    SESSION_KEY = 'admin_tenant'
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = getattr(request, 'user', None)
+        authenticated = user is not None and user.is_authenticated
+        tenant = user.tenant if authenticated else None
+        if authenticated and user.is_staff and request.path.startswith(reverse('admin:index')):
+            if 'tenant' in request.GET:
+                # taken out of the query string, the changelists would read it as a filter
+                request.GET = request.GET.copy()
+                try:
+                    request.session[self.SESSION_KEY] = parse_tenant(request.GET.pop('tenant')[-1]) or ''
+                except ValueError as exc:
+                    return HttpResponseBadRequest(str(exc))
+            tenant = request.session.get(self.SESSION_KEY, tenant)
+
+        token = set_tenant(tenant)
+        try:
+            return self.get_response(request)
+        finally:
+            _tenant.reset(token)
@@ -0,0 +1,133 @@
+import logging
+import os
+import subprocess
+import sys
+import time
+from importlib import import_module
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from django.utils.functional import cached_property
+
+
+# Worker start-up.
+#
+# The URLconf refers to views through LazyViews, so loading it does not import
+# app/views.py, the serializers, DRF's views or simplejwt; the view module is imported
+# the first time one of its routes is hit. warm_up(), called from wsgi.py / asgi.py
+# when WARM_UP_ON_STARTUP is set, does that import before the worker takes traffic,
+# builds the fields of every view's serializer once ( which fills Django's model meta
+# caches ) and checks that every database can be reached. The connections are closed
+# again: the process may still fork ( gunicorn --preload ), requests may run in other
+# threads, and under ASGI each request gets its own connection anyway, so a connection
+# opened here is not the one requests would use. import_times() reports what importing
+# a module costs, module by module ( `manage.py importtime` ).
+
+logger = logging.getLogger(__name__)
+
+
+# Stands in for SomeView.as_view(**initkwargs) until the view is first used
+class LazyView:
+    def __init__(self, path, initkwargs):
+        self.path = path
+        self.initkwargs = initkwargs
+
+    @cached_property
+    def view(self):
+        module, name = self.path.rsplit('.', 1)
+        return getattr(import_module(module), name).as_view(**self.initkwargs)
+
+    def __call__(self, request, *args, **kwargs):
+        return self.view(request, *args, **kwargs)
+
+    def __getattr__(self, name):
+        # view_class, csrf_exempt, ... are read from the real view ( this imports it )
+        return getattr(self.view, name)
+
+    def __repr__(self):
+        return f"<LazyView {self.path}>"
+
+
+class _LazyViewClass:
+    def __init__(self, path):
+        self.path = path
+
+    def as_view(self, **initkwargs):
+        return LazyView(self.path, initkwargs)
+
+
+# Module stand-in for the URLconf: `views.SomeView.as_view()` without importing the module
+class LazyViews:
+    def __init__(self, module):
+        self.module = module
+
+    def __getattr__(self, name):
+        return _LazyViewClass(f"{self.module}.{name}")
+
+
+def _url_patterns(patterns):
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from _url_patterns(pattern.url_patterns)
+        else:
+            yield pattern
+
+
+# Import every view, build the serializers' fields and check the database connections;
+# returns timings in ms
+def warm_up():
+    timings = {}
+    started = time.perf_counter()
+    resolver = get_resolver()
+    view_classes = {getattr(pattern.callback, 'view_class', None) for pattern in _url_patterns(resolver.url_patterns)}
+    resolver.reverse_dict   # reverse() lookups
+    timings['views'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for view_class in view_classes:
+        serializer_class = getattr(view_class, 'serializer_class', None)
+        if not isinstance(serializer_class, type):
+            continue
+        try:
+            serializer_class(context={}).fields
+        except Exception:
+            # serializers that need a real request are built on their first request instead
+            logger.debug("warm-up skipped %s", serializer_class.__name__, exc_info=True)
+    timings['serializers'] = (time.perf_counter() - started) * 1000
+
+    started = time.perf_counter()
+    for alias in connections:
+        with connections[alias].cursor() as cursor:
+            cursor.execute('SELECT 1')
+    # a forked worker must not inherit an open SQLite connection
+    connections.close_all()
+    timings['databases'] = (time.perf_counter() - started) * 1000
+    return timings
+
+
+# environment of a fresh interpreter running this project with the current settings
+def child_environ(extra=None):
+    return {
+        **os.environ,
+        'DJANGO_SETTINGS_MODULE': settings.SETTINGS_MODULE,
+        'PYTHONPATH': os.pathsep.join(sys.path),
+        **(extra or {}),
+    }
+
+
+# Import `modules` in a fresh interpreter with `python -X importtime`;
+# returns [(module, self us, cumulative us)] in import order
+def import_times(modules, setup=True, environ=None):
+    code = ['import django', 'django.setup()'] if setup else []
+    code += [f'import {module}' for module in modules]
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', '; '.join(code)],
+        env=child_environ(environ), capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        own, cumulative, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(own), int(cumulative)))
+    return rows
@@ -0,0 +1,134 @@
+import csv
+from pathlib import Path
+from django.conf import settings
+from .jobs import job, update_progress
+from .feed import sync_member_feed
+from .archive import archive_events, archive_horizon
+from .purge import purge_club, purge_event, purge_user
+from .recommendations import build_similarities
+from .models import User, Club, ClubMember, Event, EventRegistration
+
+
+# Background job handlers. Each receives the Job row and returns a JSON-serializable result.
+
+
+# Export the registration list of an event to a CSV file
+@job('export_event_registrations')
+def export_event_registrations(job_obj):
+    event_id = job_obj.payload['event_id']
+    export_dir = Path(settings.JOB_EXPORT_DIR)
+    export_dir.mkdir(parents=True, exist_ok=True)
+    path = export_dir / f"event_{event_id}_registrations_job_{job_obj.id}.csv"
+
+    rows = (
+        EventRegistration.objects.filter(event_id=event_id, student__is_active=True)
+        .order_by('id')
+        .values_list(
+            'id', 'student__username', 'student__email',
+            'student__student_profile__department', 'student__student_profile__university_id',
+            'registered_at', 'payment_done'
+        )
+    )
+
+    count = 0
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['id', 'student_name', 'gmail', 'department', 'university_id', 'registered_at', 'payment_done'])
+        for row in rows.iterator(chunk_size=2000):
+            writer.writerow(row)
+            count += 1
+
+    return {'file': str(path), 'rows': count}
+
+
+# Rebuild registration/amount statistics for all events of a moderator
+@job('event_statistics')
+def event_statistics(job_obj):
+    events = (
+        Event.objects.filter(club__moderator_id=job_obj.payload['moderator_id'])
+        .with_statistics()
+        .values('id', 'title', 'total_registrations', 'total_amount_collected')
+    )
+    return [
+        {**event, 'total_amount_collected': str(event['total_amount_collected'] or 0)}
+        for event in events
+    ]
+
+
+# Add many students to a club at once (approved memberships)
+@job('import_club_members')
+def import_club_members(job_obj):
+    club = Club.objects.get(id=job_obj.payload['club_id'])
+    emails = set(job_obj.payload.get('emails', []))
+
+    users = dict(User.objects.filter(email__in=emails).values_list('email', 'id'))
+    already = set(ClubMember.objects.filter(club=club, user_id__in=users.values()).values_list('user_id', flat=True))
+
+    new_members = [
+        ClubMember(club=club, user_id=user_id, approved=True)
+        for user_id in users.values() if user_id not in already
+    ]
+    # a student applying meanwhile keeps their own ( pending ) membership, so only the
+    # rows that are approved after the insert are counted and get the club's events
+    ClubMember.objects.bulk_create(new_members, batch_size=500, ignore_conflicts=True)
+    added = list(
+        ClubMember.objects.filter(club=club, approved=True, user_id__in=[member.user_id for member in new_members])
+        .values_list('user_id', flat=True)
+    )
+    sync_member_feed(added, club.id, approved=True)
+
+    return {
+        'added': len(added),
+        'already_members': len(already),
+        'unknown_emails': sorted(emails - set(users)),
+    }
+
+
+# Move past events into the archive tables (same as `manage.py archive_events`)
+@job('archive_events')
+def archive_past_events(job_obj):
+    days = job_obj.payload.get('days', settings.ARCHIVE_AFTER_DAYS)
+    return archive_events(archive_horizon(days), job_obj.payload.get('chunk_size', settings.ARCHIVE_CHUNK_SIZE))
+
+
+# Rebuild the event similarities behind "recommended for you" (same as `manage.py build_recommendations`)
+@job('build_recommendations')
+def build_recommendations(job_obj):
+    return build_similarities(top_k=job_obj.payload.get('top_k'))
+
+
+# progress callback for the purge jobs: rows deleted per table and the longest chunk transaction
+def _purge_progress(job_obj):
+    progress = {'deleted': {}, 'chunks': 0, 'max_chunk_ms': 0.0}
+
+    def report(label, rows, seconds):
+        progress['deleted'][label] = progress['deleted'].get(label, 0) + rows
+        progress['chunks'] += 1
+        progress['max_chunk_ms'] = max(progress['max_chunk_ms'], round(seconds * 1000, 2))
+        update_progress(job_obj, progress)
+
+    return progress, report
+
+
+# Remove a soft-deleted club with its events, registrations, feedback and members
+@job('purge_club')
+def purge_deleted_club(job_obj):
+    progress, report = _purge_progress(job_obj)
+    purge_club(job_obj.payload['club_id'], job_obj.payload.get('chunk_size', settings.PURGE_CHUNK_SIZE), report)
+    return progress
+
+
+# Remove a soft-deleted event with its registrations, feedback, waitlist and feed entries
+@job('purge_event')
+def purge_deleted_event(job_obj):
+    progress, report = _purge_progress(job_obj)
+    purge_event(job_obj.payload['event_id'], job_obj.payload.get('chunk_size', settings.PURGE_CHUNK_SIZE), report)
+    return progress
+
+
+# Remove a deactivated user with everything that belonged to them
+@job('purge_user')
+def purge_deleted_user(job_obj):
+    progress, report = _purge_progress(job_obj)
+    purge_user(job_obj.payload['user_id'], job_obj.payload.get('chunk_size', settings.PURGE_CHUNK_SIZE), report)
+    return progress
@@ -1,3 +1,1159 @@
-from django.test import TestCase
+import json
+import shutil
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from unittest import mock
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections, transaction
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+from . import moderation, revocation
+from .archive import archive_chunk
+from .feed import fan_out_event
+from .jobs import claim_jobs, enqueue, execute_job, job, run_worker
+from .payments import reconcile_payments
+from .models import (
+    User, Role, StudentProfile, Club, ClubMember, Event, EventRegistration, EventWaitlist, Feedback,
+    EventSimilarity, FeedEntry, Job, OutboxMessage,
+)
+from .registrations import cancel_registration, register_student
+from .sharding import tenant_context
+from .tasks import import_club_members
+from .tickets import issue_ticket
 
-# Create your tests here.
+
+# Query-count tests: every route in app/urls.py is called with its data seeded at two
+# sizes and must run the same number of queries at both, so a serializer or view that
+# reads a relation per row ( N+1 ) fails here instead of in production.
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'shared': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-shared'},
+}
+
+
+def make_user(username, role=None):
+    user = User.objects.create_user(username=username, email=f'{username}@example.com', password='secret-pass')
+    if role:
+        user.roles.add(Role.objects.get_or_create(name=role)[0])
+    return user
+
+
+def make_student(username):
+    student = make_user(username, 'student')
+    StudentProfile.objects.create(user=student, department='CS', university_id=f'U-{username}')
+    return student
+
+
+def make_students(prefix, count):
+    return [make_student(f'{prefix}{index}') for index in range(count)]
+
+
+def make_club(moderator, created_by, name='Chess', status='approved'):
+    return Club.objects.create(
+        name=name, description=f'{name} club', moderator=moderator, created_by=created_by, status=status
+    )
+
+
+def make_event(club, title='Open', days=7, approved=True, **fields):
+    fields.setdefault('max_participants', 100)
+    fields.setdefault('fee', 10)
+    return Event.objects.create(
+        club=club, title=title, description=f'{title} event', venue='Hall',
+        date_time=timezone.now() + timedelta(days=days),
+        approved=approved, requires_approval=not approved, **fields
+    )
+
+
+def reset_shared_state():
+    # throttle buckets, idempotency keys, seat counts and revocations of the previous run
+    for cache in caches.all():
+        cache.clear()
+    revocation._sync(force=True)
+
+
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class QueryCountTestCase(TestCase):
+    SIZES = (2, 6)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin', 'admin')
+        cls.moderator = make_user('moderator', 'moderator')
+        cls.student = make_student('student')
+        cls.club = make_club(cls.moderator, cls.student)
+        ClubMember.objects.create(club=cls.club, user=cls.student, approved=True)
+        cls.event = make_event(cls.club)
+
+    def setUp(self):
+        reset_shared_state()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        return client
+
+    # ?stream=true responses run their queries while the body is read
+    def streamed(self, response):
+        b''.join(response.streaming_content)
+        return response
+
+    # seed(size) adds `size` rows of whatever the endpoint reads and returns what
+    # request(seeded) needs; every size runs in its own rolled back transaction
+    def assertConstantQueries(self, seed, request):
+        runs = []
+        for size in self.SIZES:
+            with transaction.atomic():
+                seeded = seed(size)
+                reset_shared_state()
+                with CaptureQueriesContext(connection) as queries:
+                    response = request(seeded)
+                self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+                runs.append([query['sql'] for query in queries.captured_queries])
+                transaction.set_rollback(True)
+        reset_shared_state()
+        (small, large) = runs
+        self.assertEqual(
+            len(small), len(large),
+            f"{len(small)} queries at size {self.SIZES[0]}, {len(large)} at size {self.SIZES[-1]}:\n" + "\n".join(large)
+        )
+
+
+class AccountQueryCountTests(QueryCountTestCase):
+    def test_student_registration(self):
+        self.assertConstantQueries(
+            lambda size: make_students('other', size),
+            lambda seeded: APIClient().post('/register/student/', {
+                'username': 'newcomer', 'email': 'newcomer@example.com', 'password': 'secret-pass',
+                'student_profile': {'department': 'CS', 'university_id': 'U-new'},
+            }, format='json'),
+        )
+
+    def test_moderator_registration(self):
+        self.assertConstantQueries(
+            lambda size: [make_user(f'mod{index}', 'moderator') for index in range(size)],
+            lambda seeded: self.client_for(self.admin).post('/register/moderator/', {
+                'username': 'newmod', 'email': 'newmod@example.com', 'password': 'secret-pass',
+            }, format='json'),
+        )
+
+    def test_token_obtain(self):
+        self.assertConstantQueries(
+            lambda size: make_students('other', size),
+            lambda seeded: APIClient().post('/token/', {'username': 'student', 'password': 'secret-pass'}, format='json'),
+        )
+
+    def test_token_refresh(self):
+        self.assertConstantQueries(
+            lambda size: make_students('other', size),
+            lambda seeded: APIClient().post('/token/refresh/', {'refresh': str(RefreshToken.for_user(self.student))}, format='json'),
+        )
+
+    def test_logout(self):
+        def seed(size):
+            make_students('other', size)
+            return make_student('leaver')
+
+        self.assertConstantQueries(
+            seed,
+            lambda leaver: self.client_for(leaver).post('/token/logout/', {'refresh': str(RefreshToken.for_user(leaver))}, format='json'),
+        )
+
+    def test_logout_everywhere(self):
+        def seed(size):
+            make_students('other', size)
+            return make_student('leaver')
+
+        self.assertConstantQueries(seed, lambda leaver: self.client_for(leaver).post('/token/logout/all/'))
+
+    def test_admin_revokes_tokens(self):
+        def seed(size):
+            make_students('other', size)
+            return make_student('revoked')
+
+        self.assertConstantQueries(seed, lambda user: self.client_for(self.admin).post(f'/users/{user.id}/revoke-tokens/'))
+
+    def test_profile(self):
+        def seed(size):
+            for club in [make_club(self.moderator, self.student, f'Club {index}') for index in range(size)]:
+                ClubMember.objects.create(club=club, user=self.student, approved=True)
+                EventRegistration.objects.create(event=make_event(club), student=self.student)
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda seeded: client.get('/profile/'))
+        self.assertConstantQueries(seed, lambda seeded: client.patch(
+            '/profile/', {'student_profile': {'department': 'Maths', 'university_id': 'U-student'}}, format='json'
+        ))
+
+    def test_profile_delete(self):
+        def seed(size):
+            leaver = make_student('leaver')
+            for club in [make_club(self.moderator, leaver, f'Club {index}') for index in range(size)]:
+                ClubMember.objects.create(club=club, user=leaver, approved=True)
+            return leaver
+
+        self.assertConstantQueries(seed, lambda leaver: self.client_for(leaver).delete('/profile/'))
+
+
+class ClubQueryCountTests(QueryCountTestCase):
+    # clubs created and moderated by different users, so per-row user lookups would show
+    def make_clubs(self, size, status='approved', moderator=None):
+        return [
+            make_club(moderator or make_user(f'clubmod{index}', 'moderator'), make_student(f'founder{index}'), f'Club {index}', status)
+            for index in range(size)
+        ]
+
+    def test_club_request(self):
+        self.assertConstantQueries(
+            lambda size: self.make_clubs(size, 'pending'),
+            lambda seeded: self.client_for(self.student).post('/club/request/', {'name': 'Go', 'description': 'Go club'}, format='json'),
+        )
+
+    def test_pending_clubs(self):
+        client = self.client_for(self.admin)
+        self.assertConstantQueries(lambda size: self.make_clubs(size, 'pending'), lambda seeded: client.get('/club/approve/'))
+
+    def test_club_approval(self):
+        def seed(size):
+            return self.make_clubs(size, 'pending')[0]
+
+        client = self.client_for(self.admin)
+        self.assertConstantQueries(seed, lambda club: client.get(f'/club/approve/{club.id}/'))
+        self.assertConstantQueries(seed, lambda club: client.put(f'/club/approve/{club.id}/', {'status': 'approved'}, format='json'))
+
+    def test_club_list(self):
+        client = self.client_for(self.student)
+        self.assertConstantQueries(self.make_clubs, lambda seeded: client.get('/clubs/'))
+        self.assertConstantQueries(self.make_clubs, lambda seeded: self.streamed(client.get('/clubs/?stream=true')))
+
+    def test_club_apply(self):
+        def seed(size):
+            club = self.make_clubs(1)[0]
+            for member in make_students('member', size):
+                ClubMember.objects.create(club=club, user=member)
+            return club
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda club: client.get(f'/clubs/{club.id}/apply/'))
+        self.assertConstantQueries(seed, lambda club: client.post(f'/clubs/{club.id}/apply/', {'apply': 'yes'}, format='json'))
+
+    def seed_member_requests(self, size):
+        clubs = self.make_clubs(2, moderator=self.moderator)
+        members = [ClubMember.objects.create(club=clubs[index % 2], user=student) for index, student in enumerate(make_students('member', size))]
+        return members[0]
+
+    def test_member_requests(self):
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(self.seed_member_requests, lambda seeded: client.get('/club/member/request/'))
+        self.assertConstantQueries(self.seed_member_requests, lambda seeded: self.streamed(client.get('/club/member/request/?stream=true')))
+
+    def test_member_approval(self):
+        def seed(size):
+            member = self.seed_member_requests(size)
+            for index in range(size):
+                make_event(member.club, f'Upcoming {index}')
+            return member
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda member: client.get(f'/club/member/approve/{member.id}/'))
+        self.assertConstantQueries(seed, lambda member: client.put(f'/club/member/approve/{member.id}/', {'approved': True}, format='json'))
+
+    def test_moderator_clubs(self):
+        def seed(size):
+            clubs = self.make_clubs(size, moderator=self.moderator)
+            for club in clubs:
+                make_event(club)
+            return clubs[0]
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda club: client.get('/moderator/clubs/'))
+        self.assertConstantQueries(seed, lambda club: client.get(f'/moderator/clubs/{club.id}/'))
+        self.assertConstantQueries(seed, lambda club: client.delete(f'/moderator/clubs/{club.id}/'))
+
+    def test_member_import(self):
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(
+            lambda size: [student.email for student in make_students('imported', size)],
+            lambda emails: client.post(f'/club/{self.club.id}/members/import/', {'emails': emails}, format='json'),
+        )
+
+
+class EventQueryCountTests(QueryCountTestCase):
+    # upcoming approved events of the student's club, each with a few registrations
+    def make_events(self, size, club=None):
+        events = [make_event(club or self.club, f'Event {index}', days=index + 1) for index in range(size)]
+        for event in events:
+            for student in make_students(f'e{event.id}-', 2):
+                EventRegistration.objects.create(event=event, student=student)
+        return events
+
+    def test_event_create(self):
+        self.assertConstantQueries(
+            self.make_events,
+            lambda seeded: self.client_for(self.student).post('/event/create/', {
+                'club': self.club.id, 'title': 'Blitz', 'description': 'Blitz night', 'venue': 'Hall',
+                'date_time': (timezone.now() + timedelta(days=3)).isoformat(), 'max_participants': 20, 'fee': '5.00',
+            }, format='json'),
+        )
+
+    def test_pending_events(self):
+        def seed(size):
+            return [make_event(make_club(self.moderator, self.student, f'Club {index}'), approved=False) for index in range(size)]
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda seeded: client.get('/event/pending/'))
+        self.assertConstantQueries(seed, lambda seeded: self.streamed(client.get('/event/pending/?stream=true')))
+
+    def test_event_approval(self):
+        def seed(size):
+            for member in make_students('member', size):
+                ClubMember.objects.create(club=self.club, user=member, approved=True)
+            return make_event(self.club, 'Pending', approved=False)
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda event: client.get(f'/event/approve/{event.id}/'))
+        self.assertConstantQueries(seed, lambda event: client.put(f'/event/approve/{event.id}/', {'approved': True}, format='json'))
+        self.assertConstantQueries(seed, lambda event: client.put(f'/event/approve/{event.id}/', {'approved': False}, format='json'))
+
+    def seed_other_clubs_events(self, size):
+        return self.make_events(size, make_club(make_user('othermod', 'moderator'), self.student, 'Other'))
+
+    def test_approved_events(self):
+        client = self.client_for(self.student)
+        self.assertConstantQueries(self.seed_other_clubs_events, lambda seeded: client.get('/event/approved/'))
+        self.assertConstantQueries(self.seed_other_clubs_events, lambda seeded: self.streamed(client.get('/event/approved/?stream=true')))
+
+    def test_feed(self):
+        def seed(size):
+            events = self.make_events(size)
+            for event in events:
+                fan_out_event(event)
+            return events
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda seeded: client.get('/event/feed/'))
+        self.assertConstantQueries(seed, lambda seeded: self.streamed(client.get('/event/feed/?stream=true')))
+
+    def test_feed_on_read(self):
+        def seed(size):
+            Club.objects.filter(id=self.club.id).update(feed_on_read=True)
+            return self.make_events(size)
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda seeded: client.get('/event/feed/'))
+
+    def test_recommended_events(self):
+        def seed(size):
+            EventRegistration.objects.create(event=self.event, student=self.student)
+            for event in self.seed_other_clubs_events(size):
+                EventSimilarity.objects.create(event=self.event, similar_event=event, score=0.5)
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda seeded: client.get('/event/recommended/'))
+
+    def test_seat_stream(self):
+        async def first_message(event_ids):
+            response = await AsyncClient().get(
+                f"/event/seats/stream/?events={','.join(map(str, event_ids))}",
+                headers={'authorization': f"Bearer {RefreshToken.for_user(self.student).access_token}"},
+            )
+            messages = aiter(response.streaming_content)
+            await anext(messages)
+            await messages.aclose()
+            return response
+
+        self.assertConstantQueries(
+            lambda size: [event.id for event in self.make_events(size)],
+            async_to_sync(first_message),
+        )
+
+    def test_moderator_events(self):
+        def seed(size):
+            events = [self.make_events(1, make_club(self.moderator, self.student, f'Club {index}'))[0] for index in range(size)]
+            return events[0]
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda event: client.get('/moderator/events/'))
+        self.assertConstantQueries(seed, lambda event: self.streamed(client.get('/moderator/events/?stream=true')))
+        self.assertConstantQueries(seed, lambda event: client.get(f'/moderator/events/{event.id}/'))
+        self.assertConstantQueries(seed, lambda event: client.delete(f'/moderator/events/{event.id}/'))
+
+    def test_event_registration(self):
+        form = {'student_name': 'Student', 'university_id': 'U-student', 'department': 'CS', 'gmail': 'student@example.com'}
+
+        def seed(size):
+            event = make_event(self.club, 'Open seats')
+            for student in make_students('seated', size):
+                EventRegistration.objects.create(event=event, student=student)
+            return event
+
+        def seed_full(size):
+            event = make_event(self.club, 'Full', max_participants=size)
+            for student in make_students('seated', size):
+                EventRegistration.objects.create(event=event, student=student)
+            for position, student in enumerate(make_students('waiting', size), start=1):
+                EventWaitlist.objects.create(event=event, student=student, position=position)
+            return event
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda event: client.get(f'/event/register/{event.id}'))
+        self.assertConstantQueries(seed, lambda event: client.put(f'/event/register/{event.id}', form, format='json'))
+        self.assertConstantQueries(seed_full, lambda event: client.put(f'/event/register/{event.id}', form, format='json'))
+
+        def seed_registered(size):
+            event = seed_full(size)
+            registration = EventRegistration.objects.filter(event=event).first()
+            return event, self.client_for(registration.student)
+
+        self.assertConstantQueries(seed_registered, lambda seeded: seeded[1].delete(f'/event/register/{seeded[0].id}'))
+
+    def test_statistics(self):
+        def seed(size):
+            return self.make_events(size)
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda seeded: client.get('/event/statistics/'))
+        self.assertConstantQueries(seed, lambda seeded: self.streamed(client.get('/event/statistics/?stream=true')))
+
+    def test_statistics_rebuild(self):
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(self.make_events, lambda seeded: client.post('/event/statistics/rebuild/'))
+
+    def test_dashboard(self):
+        def seed(size):
+            clubs = [make_club(self.moderator, self.student, f'Club {index}') for index in range(size)]
+            for club in clubs:
+                self.make_events(1, club)
+                # archived events are part of the statistics section
+                archive_chunk([event.id for event in self.make_events(1, club)])
+                make_event(club, 'Pending', approved=False)
+                ClubMember.objects.create(club=club, user=make_student(f'applicant{club.id}'))
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda seeded: client.get('/moderator/dashboard/'))
+
+    def test_dashboard_statistics_include_archived_events(self):
+        event, archived = self.make_events(2)
+        archive_chunk([archived.id])
+        response = self.client_for(self.moderator).get('/moderator/dashboard/')
+        statistics = {row['id']: row['total_registrations'] for row in response.data['statistics']}
+        self.assertEqual((statistics[event.id], statistics[archived.id]), (2, 2))
+
+    def test_registration_analytics(self):
+        def seed(size):
+            for student in make_students('registered', size):
+                register_student(self.event, student)
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda seeded: client.get(f'/event/analytics/registrations/?event={self.event.id}&granularity=hour'))
+        self.assertConstantQueries(seed, lambda seeded: client.get(f'/event/analytics/registrations/?club={self.club.id}'))
+
+
+class RegistrationQueryCountTests(QueryCountTestCase):
+    def seed_registrations(self, size):
+        return [EventRegistration.objects.create(event=self.event, student=student) for student in make_students('registered', size)]
+
+    def seed_feedback(self, size):
+        past = make_event(self.club, 'Past', days=-1)
+        for registration in [EventRegistration.objects.create(event=past, student=student) for student in make_students('attendee', size)]:
+            Feedback.objects.create(registration=registration, rating=4, comments='Good')
+        return past
+
+    def test_registration_list(self):
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(self.seed_registrations, lambda seeded: client.get(f'/event/registrations/{self.event.id}/'))
+        self.assertConstantQueries(self.seed_registrations, lambda seeded: self.streamed(client.get(f'/event/registrations/{self.event.id}/?stream=true')))
+
+    def test_registration_export(self):
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(self.seed_registrations, lambda seeded: client.post(f'/event/registrations/{self.event.id}/export/'))
+
+    def test_feedback_create(self):
+        def seed(size):
+            for index in range(size):
+                past = make_event(self.club, f'Past {index}', days=-index - 2)
+                registration = EventRegistration.objects.create(event=past, student=self.student)
+                Feedback.objects.create(registration=registration)
+            past = make_event(self.club, 'Past', days=-1)
+            for student in [self.student, *make_students('attendee', size)]:
+                EventRegistration.objects.create(event=past, student=student)
+            return past
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda past: client.post('/feedback/', {'event': past.id, 'rating': 5, 'comments': 'Great'}, format='json'))
+
+    def test_feedback_list(self):
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(self.seed_feedback, lambda past: client.get(f'/event/{past.id}/feedbacks/'))
+        self.assertConstantQueries(self.seed_feedback, lambda past: self.streamed(client.get(f'/event/{past.id}/feedbacks/?stream=true')))
+
+    def test_payment_reconcile(self):
+        def seed(size):
+            registrations = self.seed_registrations(size)
+            rows = ['university_id,email,amount'] + [
+                f'{registration.student.student_profile.university_id},{registration.student.email},10' for registration in registrations
+            ]
+            return SimpleUploadedFile('payments.csv', '\n'.join(rows).encode(), content_type='text/csv')
+
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(seed, lambda upload: client.post(f'/event/{self.event.id}/payments/reconcile/', {'file': upload}, format='multipart'))
+
+    def test_ticket(self):
+        def seed(size):
+            self.seed_registrations(size)
+            return EventRegistration.objects.create(event=self.event, student=self.student)
+
+        client = self.client_for(self.student)
+        self.assertConstantQueries(seed, lambda seeded: client.get(f'/event/{self.event.id}/ticket/'))
+
+    def test_check_in(self):
+        client = self.client_for(self.moderator)
+        self.assertConstantQueries(
+            lambda size: [issue_ticket(registration) for registration in self.seed_registrations(size)],
+            lambda tickets: client.post(f'/event/{self.event.id}/checkin/', {'tickets': tickets}, format='json'),
+        )
+
+
+class JobAndBatchQueryCountTests(QueryCountTestCase):
+    def seed_jobs(self, size):
+        jobs = [enqueue('event_statistics', {'moderator_id': self.moderator.id}, user=self.moderator) for _ in range(size)]
+        return jobs[0]
+
+    def test_jobs(self):
+        for user in [self.moderator, self.admin]:
+            client = self.client_for(user)
+            self.assertConstantQueries(self.seed_jobs, lambda job: client.get('/jobs/'))
+            self.assertConstantQueries(self.seed_jobs, lambda job: client.get(f'/jobs/{job.id}/'))
+
+    def test_batch(self):
+        def seed(size):
+            EventQueryCountTests.make_events(self, size)
+            return self.seed_jobs(size)
+
+        client = self.client_for(self.student)
+        requests = [{'method': 'GET', 'path': '/profile/'}, {'method': 'GET', 'path': '/event/approved/'}, {'method': 'GET', 'path': '/clubs/'}]
+        self.assertConstantQueries(seed, lambda seeded: client.post('/batch/', {'requests': requests}, format='json'))
+
+
+# duplicates are caught by the unique constraints inside the registration transaction
+@override_settings(CACHES=TEST_CACHES)
+class RegistrationFormTests(TestCase):
+    form = {'student_name': 'Student', 'university_id': 'U-student', 'department': 'CS', 'gmail': 'student@example.com'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = make_user('moderator', 'moderator')
+        cls.student = make_student('student')
+        cls.event = make_event(make_club(cls.moderator, cls.student), max_participants=1)
+
+    def setUp(self):
+        reset_shared_state()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.student).access_token}")
+
+    def register(self, **changes):
+        return self.client.put(f'/event/register/{self.event.id}', {**self.form, **changes}, format='json')
+
+    def test_registered_twice(self):
+        self.assertEqual(self.register().status_code, 201)
+        response = self.register(department='Maths')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already registered", str(response.data))
+        # the rejected form changed nothing
+        self.assertEqual(StudentProfile.objects.get(user=self.student).department, 'CS')
+        self.assertEqual(EventRegistration.objects.filter(event=self.event).count(), 1)
+
+    def test_waitlisted_twice(self):
+        EventRegistration.objects.create(event=self.event, student=make_student('seated'))
+        self.assertEqual(self.register().status_code, 202)
+        response = self.register()
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already on the waitlist", str(response.data))
+
+    def test_registered_student_of_a_full_event(self):
+        self.assertEqual(self.register().status_code, 201)
+        EventWaitlist.objects.create(event=self.event, student=make_student('waiting'), position=1)
+        self.assertIn("already registered", str(self.register().data))
+        self.assertFalse(EventWaitlist.objects.filter(event=self.event, student=self.student).exists())
+
+    def test_email_of_another_account(self):
+        make_student('other')
+        response = self.register(gmail='other@example.com', department='Maths')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already used by another account", str(response.data))
+        # nothing of the form was kept
+        self.assertEqual(User.objects.get(id=self.student.id).email, 'student@example.com')
+        self.assertEqual(StudentProfile.objects.get(user=self.student).department, 'CS')
+        self.assertFalse(EventRegistration.objects.filter(event=self.event).exists())
+
+    def test_only_changed_columns_are_written(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.register(department='Maths', gmail='new@example.com').status_code, 201)
+        updates = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('UPDATE "app_')]
+        self.assertIn('UPDATE "app_studentprofile" SET "department" = ', '\n'.join(updates))
+        self.assertIn('UPDATE "app_user" SET "email" = ', '\n'.join(updates))
+        self.assertNotIn('"password"', '\n'.join(updates))
+
+
+# second applications and second feedback are rejected by the unique constraints
+@override_settings(CACHES=TEST_CACHES)
+class ConstraintConflictTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = make_user('moderator', 'moderator')
+        cls.student = make_student('student')
+        cls.club = make_club(cls.moderator, cls.moderator)
+        cls.past = make_event(cls.club, 'Past', days=-1)
+
+    def setUp(self):
+        reset_shared_state()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.student).access_token}")
+
+    def test_apply_twice(self):
+        self.assertEqual(self.client.post(f'/clubs/{self.club.id}/apply/', {'apply': 'yes'}, format='json').status_code, 201)
+        response = self.client.post(f'/clubs/{self.club.id}/apply/', {'apply': 'yes'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already applied", str(response.data))
+        self.assertEqual(ClubMember.objects.filter(club=self.club, user=self.student).count(), 1)
+
+    def test_feedback_twice(self):
+        EventRegistration.objects.create(event=self.past, student=self.student)
+        feedback = {'event': self.past.id, 'rating': 4, 'comments': 'Good'}
+        self.assertEqual(self.client.post('/feedback/', feedback, format='json').status_code, 201)
+        response = self.client.post('/feedback/', feedback, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already given feedback", str(response.data))
+
+    def test_feedback_of_other_students_does_not_block(self):
+        other = EventRegistration.objects.create(event=self.past, student=make_student('other'))
+        Feedback.objects.create(registration=other, rating=2)
+        registration = EventRegistration.objects.create(event=self.past, student=self.student)
+        response = self.client.post('/feedback/', {'event': self.past.id, 'rating': 5}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(Feedback.objects.filter(registration=registration).exists())
+
+    def test_import_skips_students_applying_meanwhile(self):
+        imported = make_student('imported')
+        upcoming = make_event(self.club)
+        job_obj = enqueue('import_club_members', {'club_id': self.club.id, 'emails': [self.student.email, imported.email]})
+        bulk_create = ClubMember.objects.bulk_create
+
+        def apply_first(members, **kwargs):
+            # the student's application lands between the import's read and its insert
+            ClubMember.objects.create(club=self.club, user=self.student, approved=False)
+            return bulk_create(members, **kwargs)
+
+        with mock.patch.object(ClubMember.objects, 'bulk_create', apply_first):
+            result = import_club_members(job_obj)
+
+        self.assertEqual(result['added'], 1)
+        self.assertFalse(ClubMember.objects.get(club=self.club, user=self.student).approved)
+        self.assertEqual(list(FeedEntry.objects.filter(event=upcoming).values_list('user_id', flat=True)), [imported.id])
+
+    def test_feedback_without_registration(self):
+        response = self.client.post('/feedback/', {'event': self.past.id, 'rating': 5}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+# moderator views read the moderator's club ids from the cache, dropped when a club changes
+@override_settings(CACHES=TEST_CACHES)
+class ModeratorScopeTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.first = make_user('first', 'moderator')
+        cls.second = make_user('second', 'moderator')
+        cls.student = make_student('student')
+        cls.club = make_club(cls.first, cls.student)
+        cls.event = make_event(cls.club)
+
+    def setUp(self):
+        reset_shared_state()
+
+    def moderator_events(self, moderator):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(moderator).access_token}")
+        return [event['id'] for event in client.get('/moderator/events/').data]
+
+    def test_moderator_change(self):
+        self.assertEqual(self.moderator_events(self.first), [self.event.id])
+        self.assertEqual(self.moderator_events(self.second), [])
+
+        club = Club.objects.get(id=self.club.id)
+        club.moderator = self.second
+        with self.captureOnCommitCallbacks(execute=True):
+            club.save()
+        self.assertEqual(self.moderator_events(self.first), [])
+        self.assertEqual(self.moderator_events(self.second), [self.event.id])
+
+    def test_stale_ids_cached_after_the_change(self):
+        self.assertEqual(self.moderator_events(self.first), [self.event.id])
+        version = moderation._version(self.first.pk, 'default')
+
+        club = Club.objects.get(id=self.club.id)
+        club.moderator = self.second
+        with self.captureOnCommitCallbacks(execute=True):
+            club.save()
+        # a request that read the ids before the change stores them after the invalidation
+        caches['shared'].set(moderation._key(self.first.pk, 'default', version), [self.club.id])
+        self.assertEqual(self.moderator_events(self.first), [])
+
+    def test_other_changes_keep_the_cache(self):
+        self.moderator_events(self.first)
+        version = moderation._version(self.first.pk, 'default')
+        club = Club.objects.get(id=self.club.id)
+        club.status, club.feed_on_read = 'rejected', True
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            club.save()
+        self.assertEqual(callbacks, [])
+        self.assertEqual(moderation._version(self.first.pk, 'default'), version)
+
+    def test_new_and_deleted_clubs(self):
+        self.assertEqual(self.moderator_events(self.second), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            club = make_club(self.second, self.student, 'Go')
+        event = make_event(club)
+        self.assertEqual(self.moderator_events(self.second), [event.id])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            club.soft_delete()
+        self.assertEqual(self.moderator_events(self.second), [])
+
+    def test_ownership_check(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.second).access_token}")
+        self.assertEqual(client.get(f'/event/registrations/{self.event.id}/').status_code, 403)
+        self.assertEqual(client.post(f'/event/{self.event.id}/checkin/', {'tickets': ['x']}, format='json').status_code, 404)
+
+
+# login attempts are limited per client IP and per username
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class LoginThrottleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_student('student')
+
+    def setUp(self):
+        reset_shared_state()
+
+    def login(self, username='student', **headers):
+        return APIClient().post('/token/', {'username': username, 'password': 'wrong'}, format='json', **headers).status_code
+
+    def test_forwarded_for_does_not_pick_the_bucket(self):
+        codes = [self.login(f'guess{index}', HTTP_X_FORWARDED_FOR=f'10.0.0.{index}') for index in range(8)]
+        self.assertEqual(codes, [401] * 5 + [429] * 3)
+
+    def test_username_bucket_across_addresses(self):
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}):
+            codes = [self.login(HTTP_X_FORWARDED_FOR=f'10.0.0.{index}') for index in range(12)]
+            self.assertEqual(codes, [401] * 10 + [429] * 2)
+            # other accounts still get their own attempts
+            self.assertEqual(self.login('other', HTTP_X_FORWARDED_FOR='10.0.1.1'), 401)
+
+    def test_attacker_cannot_lock_the_owner_out(self):
+        owner_login = lambda: APIClient().post(
+            '/token/', {'username': 'student', 'password': 'secret-pass'}, format='json', HTTP_X_FORWARDED_FOR='10.9.9.9'
+        ).status_code
+        now = time.time()
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'NUM_PROXIES': 1}), \
+                mock.patch('app.throttling.time', mock.Mock(time=lambda: now)):
+            # refused by the IP bucket, the flood costs the account nothing
+            codes = [self.login(HTTP_X_FORWARDED_FOR='10.0.0.1') for _ in range(30)]
+            self.assertEqual(codes, [401] * 5 + [429] * 25)
+            self.assertEqual(owner_login(), 200)
+
+            # as many failed attempts as the IP bucket lets through, for ten minutes
+            for _ in range(120):
+                now += 5
+                self.assertEqual(self.login(HTTP_X_FORWARDED_FOR='10.0.0.1'), 401)
+            self.assertEqual(owner_login(), 200)
+
+
+# revocations are stored in the database and cut off at the microsecond
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class RevocationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = make_student('student')
+
+    def setUp(self):
+        reset_shared_state()
+
+    def login(self):
+        return APIClient().post('/token/', {'username': 'student', 'password': 'secret-pass'}, format='json').data
+
+    def profile(self, access):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return client.get('/profile/').status_code
+
+    def test_login_right_after_sign_out_everywhere(self):
+        old = self.login()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {old['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.post('/token/logout/all/').status_code, 200)
+        new = self.login()
+        self.assertEqual(self.profile(old['access']), 401)
+        self.assertEqual(self.profile(new['access']), 200)
+
+    def test_revocations_survive_a_cleared_cache(self):
+        tokens = self.login()
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+        with self.captureOnCommitCallbacks(execute=True):
+            client.post('/token/logout/', {'refresh': tokens['refresh']}, format='json')
+        reset_shared_state()
+        self.assertEqual(self.profile(tokens['access']), 401)
+        refresh = APIClient().post('/token/refresh/', {'refresh': tokens['refresh']}, format='json')
+        self.assertEqual(refresh.status_code, 401)
+
+
+# students racing for the last seats and cancelling at the same time, each in its own
+# thread and connection: no seat is handed out twice and the waitlist is served in order
+@override_settings(CACHES=TEST_CACHES, PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class SeatConcurrencyTests(TransactionTestCase):
+    SEATS = 3
+
+    def setUp(self):
+        reset_shared_state()
+        moderator = make_user('moderator', 'moderator')
+        self.event = make_event(make_club(moderator, moderator), max_participants=self.SEATS)
+        self.students = make_students('racer', 12)
+
+    def race(self, action, students):
+        barrier = threading.Barrier(len(students))
+        errors = []
+
+        def run(student):
+            try:
+                barrier.wait()
+                action(self.event, student)
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=run, args=(student,)) for student in students]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def assertSeatsConsistent(self):
+        seated = set(EventRegistration.objects.filter(event=self.event).values_list('student_id', flat=True))
+        waiting = list(EventWaitlist.objects.filter(event=self.event).order_by('position').values_list('student_id', 'position'))
+        self.assertLessEqual(len(seated), self.SEATS)
+        self.assertEqual(seated & {student_id for student_id, _ in waiting}, set())
+        self.assertEqual(len({position for _, position in waiting}), len(waiting))
+        return seated, [student_id for student_id, _ in waiting]
+
+    def test_race_for_the_last_seats(self):
+        self.race(register_student, self.students)
+        seated, waiting = self.assertSeatsConsistent()
+        self.assertEqual(len(seated), self.SEATS)
+        self.assertEqual(len(waiting), len(self.students) - self.SEATS)
+
+    def test_cancellations_promote_in_order(self):
+        self.race(register_student, self.students)
+        seated, waiting = self.assertSeatsConsistent()
+
+        # every seated student and the first two in line leave at once
+        leaving = [student for student in self.students if student.id in seated or student.id in waiting[:2]]
+        self.race(cancel_registration, leaving)
+
+        now_seated, now_waiting = self.assertSeatsConsistent()
+        self.assertEqual(now_seated, set(waiting[2:2 + self.SEATS]))
+        self.assertEqual(now_waiting, waiting[2 + self.SEATS:])
+
+
+# a test job that sleeps, long enough for a few lease heartbeats
+@job('test_sleep')
+def sleeping_job(job_obj):
+    time.sleep(job_obj.payload['seconds'])
+    return {'locked_until': Job.objects.get(id=job_obj.id).locked_until.isoformat()}
+
+
+# a pool whose children all died: every job submitted to it fails with BrokenProcessPool
+class BrokenPool:
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_exception(BrokenProcessPool("A child process terminated abruptly."))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+# a pool that runs each job in the calling thread
+class InlinePool(BrokenPool):
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(execute_job(*args))
+        return future
+
+
+# leases of running jobs: expired ones are retried only while attempts are left,
+# long jobs keep theirs, and a broken process pool does not stop the worker
+@override_settings(CACHES=TEST_CACHES)
+class JobLeaseTests(TransactionTestCase):
+    def setUp(self):
+        reset_shared_state()
+
+    def running_job(self, attempts, locked_until, seconds=0, locked_by='lost-worker'):
+        return Job.objects.create(
+            name='test_sleep', payload={'seconds': seconds}, status='running', attempts=attempts,
+            max_attempts=3, locked_until=locked_until, locked_by=locked_by
+        )
+
+    def test_lost_job_on_its_last_attempt_fails(self):
+        expired = timezone.now() - timedelta(seconds=1)
+        retried = self.running_job(2, expired)
+        exhausted = self.running_job(3, expired)
+
+        self.assertEqual(claim_jobs('worker', 10), [retried.id])
+        exhausted.refresh_from_db()
+        self.assertEqual((exhausted.status, exhausted.attempts), ('failed', 3))
+        self.assertIsNotNone(exhausted.finished_at)
+
+    @override_settings(JOB_HEARTBEAT_SECONDS=0.05)
+    def test_heartbeat_extends_the_lease(self):
+        lease = timezone.now() + timedelta(seconds=5)
+        sleeping = self.running_job(1, lease, seconds=0.5, locked_by='worker')
+
+        self.assertEqual(execute_job(sleeping.id, 'worker'), (sleeping.id, 'succeeded'))
+        sleeping.refresh_from_db()
+        self.assertGreater(datetime.fromisoformat(sleeping.result['locked_until']), lease)
+
+    def test_broken_pool_is_replaced(self):
+        pools = iter([BrokenPool(), InlinePool()])
+        queued = enqueue('test_sleep', {'seconds': 0})
+        with mock.patch('app.jobs.ProcessPoolExecutor', lambda *args, **kwargs: next(pools)):
+            totals = run_worker(processes=1, once=True)
+
+        queued.refresh_from_db()
+        self.assertEqual((queued.status, queued.attempts), ('succeeded', 2))
+        self.assertEqual((totals['succeeded'], totals['pending']), (1, 1))
+
+
+# admins pick the tenant they work on; moderators must belong to the club's tenant
+@override_settings(CACHES=TEST_CACHES)
+class TenantSelectionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin', 'admin')
+        cls.admin.is_staff = cls.admin.is_superuser = True
+        cls.admin.save()
+        cls.local = make_user('local', 'moderator')
+        cls.foreign = make_user('foreign', 'moderator')
+        User.objects.filter(id=cls.foreign.id).update(tenant='uni1')   # no shard database in tests, no copy
+        cls.club = make_club(None, make_student('student'), status='pending')
+
+    def setUp(self):
+        reset_shared_state()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.admin).access_token}")
+
+    def test_unknown_tenant(self):
+        response = self.client.get('/club/approve/', {'tenant': 'nowhere'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Unknown tenant", str(response.data))
+        self.assertEqual(self.client.get('/club/approve/', {'tenant': ''}).status_code, 200)
+
+    @override_settings(SHARDS={'uni1': 'shard_uni1'})
+    def test_moderator_of_another_tenant(self):
+        response = self.client.put(f'/club/approve/{self.club.id}/', {'moderator': 'foreign'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("another university", str(response.data))
+        response = self.client.put(f'/club/approve/{self.club.id}/', {'moderator': 'local'}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    @override_settings(SHARDS={'uni1': 'shard_uni1'})
+    def test_admin_site_tenant(self):
+        self.client.force_login(self.admin)
+        self.assertEqual(self.client.get('/admin/app/club/', {'tenant': 'nowhere'}).status_code, 400)
+        # the pick is remembered and not passed on to the changelist as a filter
+        self.assertEqual(self.client.get('/admin/app/role/', {'tenant': ''}).status_code, 200)
+        self.assertEqual(self.client.session['admin_tenant'], '')
+
+
+# admin actions keep the rules of the API
+@override_settings(CACHES=TEST_CACHES)
+class AdminActionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = make_user('admin', 'admin')
+        cls.admin.is_staff = cls.admin.is_superuser = True
+        cls.admin.save()
+        cls.moderator = make_user('moderator', 'moderator')
+        student = make_student('student')
+        cls.ready = make_club(cls.moderator, student, 'Chess', status='pending')
+        cls.unmoderated = make_club(None, student, 'Go', status='pending')
+        cls.not_moderator = make_club(student, student, 'Bridge', status='pending')
+
+    def setUp(self):
+        reset_shared_state()
+        self.client.force_login(self.admin)
+
+    def test_approve_clubs_needs_a_moderator(self):
+        response = self.client.post('/admin/app/club/', {
+            'action': 'approve_clubs', '_selected_action': [self.ready.id, self.unmoderated.id, self.not_moderator.id],
+        }, follow=True)
+        self.assertEqual(
+            dict(Club.objects.values_list('name', 'status')),
+            {'Chess': 'approved', 'Go': 'pending', 'Bridge': 'pending'}
+        )
+        self.assertContains(response, "2 club(s) not approved")
+
+    def test_approvals_skip_deactivated_students(self):
+        active, inactive = make_students('member', 2)
+        User.objects.filter(id=inactive.id).update(is_active=False)
+        requests = [ClubMember.objects.create(club=self.ready, user=user, approved=user == active) for user in (active, inactive)]
+        pending = make_event(self.ready, 'Pending', approved=False)
+
+        self.client.post('/admin/app/clubmember/', {'action': 'approve_members', '_selected_action': [member.id for member in requests]})
+        self.client.post('/admin/app/event/', {'action': 'approve_events', '_selected_action': [pending.id]})
+        self.assertFalse(ClubMember.objects.get(user=inactive).approved)
+        self.assertEqual(list(FeedEntry.objects.values_list('user', flat=True)), [active.id])
+        self.assertFalse(OutboxMessage.objects.filter(recipient=inactive.email).exists())
+        self.assertTrue(OutboxMessage.objects.filter(recipient=active.email, subject='New event: Pending').exists())
+
+    def test_delete_event(self):
+        event = make_event(self.ready)
+        self.client.post('/admin/app/event/', {'action': 'delete_selected', '_selected_action': [event.id], 'post': 'yes'})
+        self.assertIsNotNone(Event.all_objects.get(id=event.id).deleted_at)
+        self.assertTrue(Job.objects.filter(name='purge_event', payload={'event_id': event.id}).exists())
+
+
+# a sharded moderator's lists, streamed after TenantMiddleware has reset the tenant
+@override_settings(CACHES=TEST_CACHES, SHARDS={'uni1': 'test_shard_uni1'})
+class ShardedStreamTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # a throwaway shard database, like scratch_shards in app/benchmarks.py; declared only
+        # now, the test runner sets up the databases it knows of before any class runs
+        cls.directory = tempfile.mkdtemp(prefix='test-shard-')
+        connections.settings['test_shard_uni1'] = {**connections.settings['default'], 'NAME': f'{cls.directory}/uni1.sqlite3'}
+        call_command('migrate', database='test_shard_uni1', verbosity=0)
+        cls.databases = {'default', 'test_shard_uni1'}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['test_shard_uni1'].close()
+        del connections['test_shard_uni1']
+        del connections.settings['test_shard_uni1']
+        shutil.rmtree(cls.directory, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = User.objects.create_user(username='moderator', email='moderator@example.com', password='secret-pass', tenant='uni1')
+        cls.moderator.roles.add(Role.objects.get_or_create(name='moderator')[0])
+        student = User.objects.create_user(username='student', email='student@example.com', password='secret-pass', tenant='uni1')
+        StudentProfile.objects.create(user=student, department='CS', university_id='U-student')
+        with tenant_context('uni1'):
+            cls.event = make_event(make_club(cls.moderator, cls.moderator))
+            EventRegistration.objects.create(event=cls.event, student=student)
+
+    def setUp(self):
+        reset_shared_state()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.moderator).access_token}")
+
+    def test_streamed_lists_read_the_shard(self):
+        for url in [f'/event/registrations/{self.event.id}/', '/moderator/events/']:
+            listed = self.client.get(url).data
+            streamed = json.loads(b''.join(self.client.get(url, {'stream': 'true'}).streaming_content))
+            self.assertEqual(len(streamed), 1, url)
+            self.assertEqual(len(streamed), len(listed if isinstance(listed, list) else listed['results']), url)
+
+
+# deactivated students wait for the purge job, but no longer hold seats or show in lists
+@override_settings(CACHES=TEST_CACHES)
+class DeactivatedStudentTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = make_user('moderator', 'moderator')
+        cls.club = make_club(cls.moderator, cls.moderator)
+        cls.event = make_event(cls.club, max_participants=1)
+        cls.past = make_event(cls.club, 'Past', days=-1)
+        cls.leaver, cls.waiting, cls.late = make_students('student', 3)
+        EventRegistration.objects.create(event=cls.event, student=cls.leaver)
+        EventWaitlist.objects.create(event=cls.event, student=cls.waiting, position=1)
+        ClubMember.objects.create(club=cls.club, user=cls.leaver)
+        Feedback.objects.create(registration=EventRegistration.objects.create(event=cls.past, student=cls.leaver), rating=1)
+        User.objects.filter(id=cls.leaver.id).update(is_active=False)
+
+    def setUp(self):
+        reset_shared_state()
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(user).access_token}")
+        return client
+
+    def test_seat_is_free_again(self):
+        [listed] = [event for event in self.client_for(self.waiting).get('/event/approved/').data if event['id'] == self.event.id]
+        self.assertEqual(listed['seats_left'], 1)
+
+        # the next registration hands the seat to the head of the waitlist first
+        register_student(self.event, self.late)
+        self.assertTrue(EventRegistration.objects.filter(event=self.event, student=self.waiting).exists())
+        self.assertTrue(EventWaitlist.objects.filter(event=self.event, student=self.late).exists())
+
+    def test_hidden_from_moderator_lists(self):
+        client = self.client_for(self.moderator)
+        self.assertEqual(client.get(f'/event/registrations/{self.event.id}/').data, [])
+        self.assertEqual(client.get('/club/member/request/').data, [])
+        self.assertEqual(client.get(f'/event/{self.past.id}/feedbacks/').status_code, 403)
+        statistics = {row['id']: row['total_registrations'] for row in client.get('/moderator/dashboard/').data['statistics']}
+        self.assertEqual(statistics[self.event.id], 0)
+
+
+class PaymentReconcileTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.moderator = make_user('moderator', 'moderator')
+        cls.event = make_event(make_club(cls.moderator, cls.moderator))
+        cls.first, cls.second = make_students('student', 2)
+        for student in (cls.first, cls.second):
+            EventRegistration.objects.create(event=cls.event, student=student)
+
+    def row(self, line, student, amount='10', university_id=None):
+        return {
+            'line': line, 'email': student.email, 'amount': amount,
+            'university_id': student.student_profile.university_id if university_id is None else university_id,
+        }
+
+    def test_corrected_row_after_a_wrong_amount(self):
+        report = reconcile_payments(self.event, [self.row(2, self.first, '5'), self.row(3, self.first)])
+        self.assertEqual([row['line'] for row in report['invalid']], [2])
+        self.assertEqual((report['matched'], report['newly_paid'], report['duplicates']), (1, 1, []))
+
+    def test_shared_university_id(self):
+        StudentProfile.objects.filter(user=self.second).update(university_id='U-student0')
+        report = reconcile_payments(self.event, [
+            self.row(2, self.first),
+            {'line': 3, 'university_id': 'U-student0', 'email': '', 'amount': '10'},
+        ])
+        # the email still tells the first row apart, the second one has nothing else to go by
+        self.assertEqual(report['matched'], 1)
+        self.assertEqual([row['line'] for row in report['ambiguous']], [3])
+        self.assertEqual(report['duplicates'], [])
+        self.assertEqual(list(EventRegistration.objects.filter(payment_done=True).values_list('student', flat=True)), [self.first.id])
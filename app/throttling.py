@@ -0,0 +1,116 @@
+import hashlib
+import time
+from abc import ABC, abstractmethod
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+
+# Token-bucket throttles. Each (scope, user, IP or username) has a bucket of `capacity` tokens that
+# refills at `refill_rate` tokens per second; a request takes one token or is rejected
+# with 429 and a Retry-After telling when the next token will be there ( the username
+# bucket is only charged for failed logins, see below ).
+#
+# Buckets live in the shared cache so every worker on the host sees the same counts.
+# The read-modify-write is not atomic across workers, so under a race a bucket can let a
+# request or two more through, never fewer.
+#
+# Views opt in with throttle_scope (and optionally throttle_methods to leave reads alone);
+# limits per scope are in settings.THROTTLE_BUCKETS.
+class TokenBucketThrottle(BaseThrottle, ABC):
+    kind = None   # 'user', 'ip' or 'username', key into THROTTLE_BUCKETS[scope]
+
+    def __init__(self):
+        self.wait_seconds = None
+
+    # who this request's bucket belongs to, None to let it through unthrottled
+    @abstractmethod
+    def get_ident_key(self, request):
+        ...
+
+    # (cache key, capacity, refill rate) of the bucket this request draws from, or None
+    def get_bucket(self, request, view):
+        methods = getattr(view, 'throttle_methods', None)
+        if methods is not None and request.method not in methods:
+            return None
+
+        scope = getattr(view, 'throttle_scope', None)
+        config = settings.THROTTLE_BUCKETS.get(scope, {}).get(self.kind)
+        if config is None:
+            return None
+        ident = self.get_ident_key(request)
+        if ident is None:
+            return None
+        return (f"throttle:{scope}:{self.kind}:{ident}", *config)
+
+    # take one token from the bucket ( take=False only checks that there is one )
+    def draw(self, bucket, take=True):
+        key, capacity, refill_rate = bucket
+        cache = caches[settings.THROTTLE_CACHE]
+        now = time.time()
+
+        tokens, updated = cache.get(key, (capacity, now))
+        tokens = min(capacity, tokens + (now - updated) * refill_rate)
+
+        allowed = tokens >= 1
+        if not allowed:
+            self.wait_seconds = (1 - tokens) / refill_rate
+        elif not take:
+            return True
+        else:
+            tokens -= 1
+
+        # keep the bucket only as long as it takes to refill completely
+        cache.set(key, (tokens, now), timeout=int(capacity / refill_rate) + 1)
+        return allowed
+
+    def allow_request(self, request, view):
+        bucket = self.get_bucket(request, view)
+        return bucket is None or self.draw(bucket)
+
+    def wait(self):
+        return self.wait_seconds
+
+
+# one bucket per authenticated user ( anonymous requests are left to the IP bucket )
+class UserTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'user'
+
+    def get_ident_key(self, request):
+        if request.user and request.user.is_authenticated:
+            return request.user.pk
+        return None
+
+
+# one bucket per client IP; X-Forwarded-For is only read behind the
+# REST_FRAMEWORK['NUM_PROXIES'] proxies, so a client cannot pick its own bucket
+class IPTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'ip'
+
+    def get_ident_key(self, request):
+        return self.get_ident(request)
+
+
+# one bucket per username sent to the login view, so rotating IPs cannot brute-force one account.
+# Only failed logins take a token ( the view calls charge() ), and DRF runs every throttle even
+# after one has refused: a request the IP bucket turns away costs the account nothing, so one
+# client cannot lock the owner out by flooding the login view from its own address.
+class UsernameTokenBucketThrottle(TokenBucketThrottle):
+    kind = 'username'
+
+    def get_ident_key(self, request):
+        username = request.data.get('username') if hasattr(request.data, 'get') else None
+        if not isinstance(username, str) or not username:
+            return None
+        # cache keys must stay short and printable whatever the client sends
+        return hashlib.sha256(username.strip().lower().encode()).hexdigest()
+
+    def allow_request(self, request, view):
+        bucket = self.get_bucket(request, view)
+        return bucket is None or self.draw(bucket, take=False)
+
+    # a failed password check for this request's username
+    def charge(self, request, view):
+        bucket = self.get_bucket(request, view)
+        if bucket is not None:
+            self.draw(bucket)
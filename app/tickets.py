@@ -0,0 +1,64 @@
+from django.core import signing
+from django.db import transaction
+from .models import EventRegistration, Attendance
+from .sharding import tenant_db
+
+
+# Event tickets are "<event id>-<registration id>" signed with HMAC (django.core.signing,
+# keyed by SECRET_KEY), so a scanned ticket is verified without reading the database.
+# Check-in takes a batch of scans and reads/writes the database once per batch.
+
+_signer = signing.Signer(salt='app.tickets')
+
+
+def issue_ticket(registration):
+    return _signer.sign(f"{registration.event_id}-{registration.id}")
+
+
+# (event id, registration id) of a ticket, or None if the signature does not match
+def read_ticket(token):
+    try:
+        event_id, registration_id = _signer.unsign(str(token)).split('-')
+        return int(event_id), int(registration_id)
+    except (signing.BadSignature, ValueError):
+        return None
+
+
+# Check in a batch of scanned tickets for `event`; returns one result per scan, in order
+def check_in(event, tokens, scanned_by=None):
+    results = []
+    pending = {}   # registration id -> index in results, for the scans that need the database
+    for index, token in enumerate(tokens):
+        ticket = read_ticket(token)
+        if ticket is None:
+            results.append({'index': index, 'status': 'invalid'})
+        elif ticket[0] != event.id:
+            results.append({'index': index, 'status': 'wrong_event'})
+        elif ticket[1] in pending:
+            results.append({'index': index, 'status': 'duplicate', 'registration_id': ticket[1]})
+        else:
+            pending[ticket[1]] = index
+            results.append({'index': index, 'status': 'checked_in', 'registration_id': ticket[1]})
+
+    with transaction.atomic(using=tenant_db()):
+        registrations = dict(
+            EventRegistration.objects.filter(event=event, id__in=pending).values_list('id', 'student__username')
+        )
+        already = dict(
+            Attendance.objects.filter(registration_id__in=registrations).values_list('registration_id', 'checked_in_at')
+        )
+        new = []
+        for registration_id, index in pending.items():
+            result = results[index]
+            if registration_id not in registrations:
+                # cancelled after the ticket was issued
+                result['status'] = 'not_registered'
+                continue
+            result['student'] = registrations[registration_id]
+            if registration_id in already:
+                result['status'] = 'already_checked_in'
+                result['checked_in_at'] = already[registration_id]
+            else:
+                new.append(Attendance(registration_id=registration_id, event=event, checked_in_by=scanned_by))
+        Attendance.objects.bulk_create(new, ignore_conflicts=True)
+    return results
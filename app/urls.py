@@ -1,64 +1,97 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from .views import StudentRegistrationView, ModeratorRegistrationView, UserProfileView, ClubRequestView, ClubApprovalView, ModeratorClubView, ClubMemberApprovalView, StudentClubListView, ClubMembershipApplyView, ClubMemberRequestListView, EventCreateView, PendingEventListView, EventApprovalView, ApprovedEventListView, ModeratorEventView, EventRegistrationFormView, EventRegistrationListByModeratorView, FeedbackCreateView, EventFeedbackListView, EventStatisticsView
+from .startup import LazyViews
+
+# views are imported on their first request ( or by the start-up warm-up, see app/startup.py )
+views = LazyViews('app.views')
 
 
 urlpatterns = [
     # User registration endpoints
-    path('register/student/', StudentRegistrationView.as_view(), name='student-register'),
-    path('register/moderator/', ModeratorRegistrationView.as_view(), name='moderator-register'),
+    path('register/student/', views.StudentRegistrationView.as_view(), name='student-register'),
+    path('register/moderator/', views.ModeratorRegistrationView.as_view(), name='moderator-register'),
     
     
     # JWT authentication endpoints, to obtain access and refresh tokens
-    path('token/', TokenObtainPairView.as_view()),
-    path('token/refresh/', TokenRefreshView.as_view()),
+    path('token/', views.ThrottledTokenObtainPairView.as_view()),
+    path('token/refresh/', views.RevocableTokenRefreshView.as_view()),
+    path('token/logout/', views.LogoutView.as_view()),
+    path('token/logout/all/', views.LogoutAllView.as_view()),
+    path('users/<int:user_id>/revoke-tokens/', views.UserTokenRevokeView.as_view()),
     
     # to get user profile details
-    path('profile/', UserProfileView.as_view()),
+    path('profile/', views.UserProfileView.as_view()),
     
     # to create new club 
-    path('club/request/', ClubRequestView.as_view()),
+    path('club/request/', views.ClubRequestView.as_view()),
     
     # to approve or reject created club 
-    path('club/approve/', ClubApprovalView.as_view()),
-    path('club/approve/<int:id>/', ClubApprovalView.as_view()),
+    path('club/approve/', views.ClubApprovalView.as_view()),
+    path('club/approve/<int:id>/', views.ClubApprovalView.as_view()),
     
     # to list all student clubs and apply for membership
-    path('clubs/', StudentClubListView.as_view()),
-    path('clubs/<int:club_id>/apply/', ClubMembershipApplyView.as_view(), name='apply-club'),
+    path('clubs/', views.StudentClubListView.as_view()),
+    path('clubs/<int:club_id>/apply/', views.ClubMembershipApplyView.as_view(), name='apply-club'),
     
     
     # to list all membership requests  and approve or reject membership requests
-    path('club/member/request/', ClubMemberRequestListView.as_view()),
-    path('club/member/approve/<int:id>/', ClubMemberApprovalView.as_view()),
+    path('club/member/request/', views.ClubMemberRequestListView.as_view()),
+    path('club/member/approve/<int:id>/', views.ClubMemberApprovalView.as_view()),
     
     # moderaotor's club list
-    path('moderator/clubs/', ModeratorClubView.as_view(), name='moderator-club-list'),
-    path('moderator/clubs/<int:id>/', ModeratorClubView.as_view(), name='moderator-club-detail'),
+    path('moderator/clubs/', views.ModeratorClubView.as_view(), name='moderator-club-list'),
+    path('moderator/clubs/<int:id>/', views.ModeratorClubView.as_view(), name='moderator-club-detail'),
     
     # event creation, pending event list and approval of pending events
-    path('event/create/', EventCreateView.as_view()),
-    path('event/pending/', PendingEventListView.as_view()), 
-    path('event/approve/<int:id>/', EventApprovalView.as_view()),
+    path('event/create/', views.EventCreateView.as_view()),
+    path('event/pending/', views.PendingEventListView.as_view()), 
+    path('event/approve/<int:id>/', views.EventApprovalView.as_view()),
     
     
     # approved events list for students and event registration
-    path('event/approved/', ApprovedEventListView.as_view()),
-    path('event/register/<int:id>', EventRegistrationFormView.as_view(), name = 'event-register-form'),
+    path('event/approved/', views.ApprovedEventListView.as_view()),
+    path('event/register/<int:id>', views.EventRegistrationFormView.as_view(), name = 'event-register-form'),
+
+    # upcoming events from the student's own clubs
+    path('event/feed/', views.StudentFeedView.as_view(), name='event-feed'),
+    path('event/recommended/', views.RecommendedEventListView.as_view(), name='event-recommended'),
+    path('event/seats/stream/', views.EventSeatStreamView.as_view(), name='event-seats-stream'),
     
     #event list ( which are moderated by the logged in moderator ) 
-    path('moderator/events/', ModeratorEventView.as_view(), name='moderator-events-list'),
-    path('moderator/events/<int:id>/', ModeratorEventView.as_view(), name='moderator-event-detail'),
+    path('moderator/events/', views.ModeratorEventView.as_view(), name='moderator-events-list'),
+    path('moderator/events/<int:id>/', views.ModeratorEventView.as_view(), name='moderator-event-detail'),
     
     #registration list for an event
-    path('event/registrations/<int:event_id>/', EventRegistrationListByModeratorView.as_view(), name='event-registrations'),
+    path('event/registrations/<int:event_id>/', views.EventRegistrationListByModeratorView.as_view(), name='event-registrations'),
     
     # feedback submission
-    path('feedback/', FeedbackCreateView.as_view(), name='event-feedback'),
-    path('event/<int:event_id>/feedbacks/', EventFeedbackListView.as_view(), name='event-feedback-list'),
+    path('feedback/', views.FeedbackCreateView.as_view(), name='event-feedback'),
+    path('event/<int:event_id>/feedbacks/', views.EventFeedbackListView.as_view(), name='event-feedback-list'),
     
     # event statistics for moderators
-    path('event/statistics/', EventStatisticsView.as_view(), name='event-statistics'),
+    path('event/statistics/', views.EventStatisticsView.as_view(), name='event-statistics'),
+
+    # several API calls in one request
+    path('batch/', views.BatchView.as_view(), name='batch'),
+
+    # everything the moderator dashboard needs in one request
+    path('moderator/dashboard/', views.ModeratorDashboardView.as_view(), name='moderator-dashboard'),
+
+    # moderator uploads a payment file and marks matching registrations as paid
+    path('event/<int:event_id>/payments/reconcile/', views.EventPaymentReconcileView.as_view(), name='event-payments-reconcile'),
+
+    # registrations per hour / day of an event or a club (?event= or ?club=, &granularity=&start=&end=)
+    path('event/analytics/registrations/', views.RegistrationAnalyticsView.as_view(), name='registration-analytics'),
+
+    # signed ticket of a registered student, and batch check-in of scanned tickets
+    path('event/<int:event_id>/ticket/', views.EventTicketView.as_view(), name='event-ticket'),
+    path('event/<int:event_id>/checkin/', views.EventCheckInView.as_view(), name='event-checkin'),
+
+    # background jobs ( queued operations answer 202 with a job id )
+    path('event/registrations/<int:event_id>/export/', views.EventRegistrationExportView.as_view(), name='event-registrations-export'),
+    path('event/statistics/rebuild/', views.EventStatisticsRebuildView.as_view(), name='event-statistics-rebuild'),
+    path('club/<int:club_id>/members/import/', views.ClubMemberImportView.as_view(), name='club-members-import'),
+    path('jobs/', views.JobStatusView.as_view(), name='job-list'),
+    path('jobs/<int:id>/', views.JobStatusView.as_view(), name='job-detail'),
      
      
 ]
\ No newline at end of file
@@ -1,13 +1,98 @@
 from rest_framework import generics, mixins, status
 from rest_framework.response import Response
-from rest_framework.exceptions import PermissionDenied
+from rest_framework.exceptions import PermissionDenied, ValidationError
 from rest_framework.permissions import IsAuthenticated, AllowAny
-from .serializers import UserRegistrationSerializer, UserProfileSerializer, ClubSerializer, ClubListSerializer, ModeratorClubSerializer, ClubMembershipApplySerializer, ClubMemberApprovalSerializer, ClubMemberRequestSerializer, EventCreateSerializer, PendingEventListSerializer, EventApprovalSerializer, ApprovedEventListSerializer, ModeratorEventSerializer, EventRegistrationFormSerializer, EventRegistrationListSerializer, FeedbackSerializer, FeedbacklistSerializer, EventStatisticsSerializer
-from .models import User, Role, Club, ClubMember, Event, EventRegistration, Feedback
+from rest_framework.parsers import MultiPartParser
+from .serializers import UserRegistrationSerializer, UserProfileSerializer, ClubSerializer, ClubListSerializer, ModeratorClubSerializer, ClubMembershipApplySerializer, ClubMemberApprovalSerializer, ClubMemberRequestSerializer, EventCreateSerializer, PendingEventListSerializer, EventApprovalSerializer, ApprovedEventListSerializer, ModeratorEventSerializer, EventRegistrationFormSerializer, EventRegistrationListSerializer, FeedbackSerializer, FeedbacklistSerializer, EventStatisticsSerializer, JobSerializer, ClubListValuesSerializer, ModeratorEventValuesSerializer, ModeratorClubValuesSerializer, ClubMemberRequestValuesSerializer, PendingEventValuesSerializer, EventStatisticsValuesSerializer, RegistrationAnalyticsQuerySerializer
+from .models import User, Role, Club, ClubMember, Event, EventRegistration, EventWaitlist, Feedback, Job, ArchivedEvent, ArchivedFeedback
+from .archive import statistics_with_archive
+from .registrations import cancel_registration, waitlist_rank
+from .outbox import queue_email, queue_bulk_email
+from .jobs import enqueue
+from .feed import fan_out_event, sync_member_feed, feed_queryset
+from .pagination import StandardPagination
+from .throttling import UserTokenBucketThrottle, IPTokenBucketThrottle, UsernameTokenBucketThrottle
+from .idempotency import idempotent
+from .renderers import StreamingJSONRenderer
+from .batch import run_batch
+from .revocation import revoke_token, revoke_user
+from .payments import PaymentFileError, parse_payment_file, reconcile_payments
+from .tickets import issue_ticket, check_in
+from .recommendations import recommended_events
+from .rollups import registration_series
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.views import View
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
 from django.shortcuts import get_object_or_404
-from .permission import IsStudent, IsModerator, IsAdminRole
+from .permission import IsStudent, IsModerator, IsAdminRole, IsModeratorOrAdmin
+from .sharding import parse_tenant, set_tenant, tenant_context, tenant_db
+from .authentication import RevocableJWTAuthentication
+from .seats import current_seats, seat_events, seats_key
+from .moderation import get_moderated_event, moderated_club_ids
 from django.utils import timezone
-from django.db.models import Count, Sum, F, DecimalField, ExpressionWrapper
+from django.db import transaction
+
+
+# list() through a ValuesSerializer: one values() query, no model instances,
+# and ?fields= to return only some of the columns
+class ValuesListMixin:
+    values_serializer_class = None
+
+    def list(self, request, *args, **kwargs):
+        values_serializer = self.values_serializer_class(fields=request.query_params.get('fields'))
+        rows = values_serializer.values(self.filter_queryset(self.get_queryset()))
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(values_serializer.to_representation(page))
+        return Response(values_serializer.to_representation(rows))
+
+
+# ?stream=true on a list endpoint returns the whole result as a streamed JSON array;
+# rows are read with iterator() and serialized chunk by chunk instead of all at once
+class StreamingListMixin:
+    def is_streaming(self):
+        return self.request.query_params.get('stream', '').lower() in ['true', '1', 'yes']
+
+    def list(self, request, *args, **kwargs):
+        if not self.is_streaming():
+            return super().list(request, *args, **kwargs)
+        return self.stream_list(self.filter_queryset(self.get_queryset()))
+
+    def stream_list(self, queryset):
+        renderer = StreamingJSONRenderer(chunk_size=settings.STREAM_CHUNK_SIZE)
+        # the body is read after TenantMiddleware has reset the tenant: pick the database now
+        queryset = queryset.using(queryset.db)
+        values_serializer_class = getattr(self, 'values_serializer_class', None)
+
+        if values_serializer_class:
+            values_serializer = values_serializer_class(fields=self.request.query_params.get('fields'))
+            rows = values_serializer.values(queryset).iterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+            serialize_chunk = values_serializer.to_representation
+        else:
+            rows = queryset.iterator(chunk_size=settings.STREAM_CHUNK_SIZE)
+            serialize_chunk = lambda chunk: self.get_serializer(chunk, many=True).data
+
+        return StreamingHttpResponse(renderer.render(rows, serialize_chunk), content_type=renderer.media_type)
+
+
+# Admin views over sharded rows: the admin picks the tenant with ?tenant=<code> ( ?tenant=
+# for the global database ), otherwise a global admin would only ever see the global database
+class TenantSelectionMixin:
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)   # authentication has set the admin's own tenant
+        if 'tenant' in request.query_params:
+            try:
+                set_tenant(parse_tenant(request.query_params['tenant']))
+            except ValueError as exc:
+                raise ValidationError({"tenant": str(exc)})
 
 
 # student registration view (open to all)
@@ -35,6 +120,68 @@ class ModeratorRegistrationView(generics.CreateAPIView):
         user.roles.add(moderator_role)
 
 
+# JWT login, throttled per IP because every attempt runs a password hash, and per
+# username so one account cannot be guessed at from many addresses ( failed attempts only )
+class ThrottledTokenObtainPairView(TokenObtainPairView):
+    throttle_classes = [IPTokenBucketThrottle, UsernameTokenBucketThrottle]
+    throttle_scope = 'token'
+    _serializer_class = 'app.serializers.RevocableTokenObtainPairSerializer'
+
+    def post(self, request, *args, **kwargs):
+        try:
+            return super().post(request, *args, **kwargs)
+        except AuthenticationFailed:
+            for throttle in self.get_throttles():
+                if isinstance(throttle, UsernameTokenBucketThrottle):
+                    throttle.charge(request, self)
+            raise
+
+
+# JWT refresh, revoked refresh tokens are refused
+class RevocableTokenRefreshView(TokenRefreshView):
+    _serializer_class = 'app.serializers.RevocableTokenRefreshSerializer'
+
+
+# Logout: revoke the access token of this request and, if given, the refresh token
+class LogoutView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        refresh = None
+        if request.data.get('refresh'):
+            try:
+                refresh = RefreshToken(request.data['refresh'])
+            except TokenError as exc:
+                return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+            if str(refresh.payload.get(jwt_settings.USER_ID_CLAIM)) != str(request.user.pk):
+                return Response({"error": "This refresh token belongs to another user."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.auth is not None:
+            revoke_token(request.auth.payload)
+        if refresh is not None:
+            revoke_token(refresh.payload)
+        return Response({"message": "Logged out successfully."}, status=status.HTTP_200_OK)
+
+
+# Sign out everywhere: every token issued to this user so far stops working
+class LogoutAllView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        revoke_user(request.user.pk)
+        return Response({"message": "Signed out of all sessions."}, status=status.HTTP_200_OK)
+
+
+# Admin forces a user to sign in again
+class UserTokenRevokeView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsAdminRole]
+
+    def post(self, request, user_id):
+        user = get_object_or_404(User, id=user_id)
+        revoke_user(user.pk)
+        return Response({"message": f"All sessions of '{user.username}' have been revoked."}, status=status.HTTP_200_OK)
+
+
 # To view user profile details
 class UserProfileView(generics.RetrieveUpdateDestroyAPIView):
     """
@@ -49,9 +196,13 @@ class UserProfileView(generics.RetrieveUpdateDestroyAPIView):
         return self.request.user
 
     def delete(self, request, *args, **kwargs):
+        # deactivate now ( the account can no longer log in ), remove the data in the background
         user = self.get_object()
-        user.delete()
-        return Response({"detail": "Profile deleted successfully."}, status=status.HTTP_204_NO_CONTENT)
+        with transaction.atomic():
+            user.is_active = False
+            user.save(update_fields=['is_active'])
+            job = enqueue('purge_user', {'user_id': user.id}, tenant=user.tenant)
+        return job_accepted_response(job, "Profile deleted successfully. Your data is being removed.")
 
 
 # Student creates club (pending approval)
@@ -77,8 +228,9 @@ class ClubRequestView(mixins.CreateModelMixin, generics.GenericAPIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     
-# Manage club approvals (admin only)
+# Manage club approvals (admin only, per tenant: ?tenant=<code>)
 class ClubApprovalView(
+    TenantSelectionMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.UpdateModelMixin,
@@ -91,7 +243,7 @@ class ClubApprovalView(
 
     def get_queryset(self):
         # Show only clubs pending approval
-        return Club.objects.filter(status='pending')
+        return Club.objects.filter(status='pending').select_related('moderator', 'created_by')
 
     def get(self, request, *args, **kwargs):
         # If id provided, show single club detail, else show all pending
@@ -104,7 +256,15 @@ class ClubApprovalView(
         club = self.get_object()
         serializer = self.get_serializer(club, data=request.data, partial=True)
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+
+        with transaction.atomic(using=tenant_db()):
+            serializer.save()
+            if 'status' in serializer.validated_data:
+                queue_email(
+                    club.created_by.email,
+                    f"Your club '{club.name}' has been {club.status}",
+                    f"Your request to create the club '{club.name}' has been {club.status}."
+                )
 
         status_value = club.status
         return Response(
@@ -117,9 +277,10 @@ class ClubApprovalView(
         
         
 # Only logged-In students can see the list of clubs
-class StudentClubListView(generics.ListAPIView):
-    queryset = Club.objects.filter(status='approved')  # only approved clubs
+class StudentClubListView(StreamingListMixin, ValuesListMixin, generics.ListAPIView):
+    queryset = Club.objects.filter(status='approved').select_related('moderator', 'created_by')  # only approved clubs
     serializer_class = ClubListSerializer
+    values_serializer_class = ClubListValuesSerializer
     permission_classes = [IsAuthenticated]
     
     
@@ -138,7 +299,7 @@ class ModeratorClubView(
 
     def get_queryset(self):
         # Return only clubs where this moderator is assigned
-        return Club.objects.filter(moderator=self.request.user)
+        return Club.objects.filter(moderator=self.request.user).select_related('created_by', 'moderator')
 
     def get(self, request, *args, **kwargs):
         if 'id' in kwargs:
@@ -154,11 +315,11 @@ class ModeratorClubView(
             )
 
         club = self.get_object()
-        club_name = club.name
-        club.delete()
-        return Response(
-            {"message": f"Club '{club_name}' has been deleted successfully."},
-            status=status.HTTP_204_NO_CONTENT
+        with transaction.atomic(using=tenant_db()):
+            club.soft_delete()
+            job = enqueue('purge_club', {'club_id': club.id}, user=request.user)
+        return job_accepted_response(
+            job, f"Club '{club.name}' has been deleted successfully. Its events and members are being removed."
         )
 
 
@@ -167,13 +328,14 @@ class ModeratorClubView(
 class ClubMembershipApplyView(generics.CreateAPIView):
     serializer_class = ClubMembershipApplySerializer
     permission_classes = [IsAuthenticated]
+    throttle_classes = [UserTokenBucketThrottle, IPTokenBucketThrottle]
+    throttle_scope = 'club_apply'
+    throttle_methods = ['POST']
 
     def get_serializer_context(self):
+        # the club post() has already loaded
         context = super().get_serializer_context()
-        try:
-            context['club'] = Club.objects.get(id=self.kwargs['club_id'])
-        except Club.DoesNotExist:
-            context['club'] = None
+        context['club'] = getattr(self, 'club', None)
         return context
 
     def get(self, request, club_id):
@@ -192,10 +354,11 @@ class ClubMembershipApplyView(generics.CreateAPIView):
         }
         return Response(data)
 
+    @idempotent
     def post(self, request, club_id):
         """Handle membership application."""
         try:
-            club = Club.objects.get(id=club_id)
+            self.club = club = Club.objects.get(id=club_id)
         except Club.DoesNotExist:
             return Response({"error": "Club not found."}, status=status.HTTP_404_NOT_FOUND)
 
@@ -206,7 +369,7 @@ class ClubMembershipApplyView(generics.CreateAPIView):
     
     
 # Moderator views membership requests for their clubs   
-class ClubMemberRequestListView(generics.ListAPIView):
+class ClubMemberRequestListView(StreamingListMixin, generics.ListAPIView):
     serializer_class = ClubMemberRequestSerializer
     permission_classes = [IsAuthenticated]
 
@@ -214,9 +377,10 @@ class ClubMemberRequestListView(generics.ListAPIView):
         user = self.request.user
         # Return only pending membership requests for clubs moderated by the logged-in user
         return ClubMember.objects.filter(
-            club__moderator=user,
-            approved=False
-        )
+            club_id__in=moderated_club_ids(user),
+            approved=False,
+            user__is_active=True
+        ).select_related('club', 'user')
 
 # MODERATOR APPROVES CLUB MEMBERSHIP REQUEST
 class ClubMemberApprovalView(generics.RetrieveUpdateAPIView):
@@ -227,7 +391,10 @@ class ClubMemberApprovalView(generics.RetrieveUpdateAPIView):
     #Show student + club details.
     def get_queryset(self):
         # Only clubs moderated by the current user
-        return ClubMember.objects.filter(club__moderator=self.request.user)
+        return ClubMember.objects.filter(
+            club_id__in=moderated_club_ids(self.request.user),
+            user__is_active=True
+        ).select_related('club', 'user__student_profile')
 
     
     # PUT → Approve or reject membership and return only message
@@ -245,8 +412,15 @@ class ClubMemberApprovalView(generics.RetrieveUpdateAPIView):
         if isinstance(approved_status, str):
             approved_status = approved_status.lower() in ['true', '1', 'yes']
 
-        club_member.approved = approved_status
-        club_member.save()
+        with transaction.atomic(using=tenant_db()):
+            club_member.approved = approved_status
+            club_member.save()
+            sync_member_feed([club_member.user_id], club_member.club_id, approved_status)
+            queue_email(
+                club_member.user.email,
+                f"Membership {'approved' if approved_status else 'rejected'}: {club_member.club.name}",
+                f"Your membership request for '{club_member.club.name}' has been {'approved' if approved_status else 'rejected'}."
+            )
 
         message = "Membership approved successfully." if approved_status else "Membership rejected."
         return Response({"message": message}, status=status.HTTP_200_OK)
@@ -264,16 +438,16 @@ class EventCreateView(generics.CreateAPIView):
         
         
 # Pending event list view
-class PendingEventListView(generics.ListAPIView):
+class PendingEventListView(StreamingListMixin, generics.ListAPIView):
     serializer_class = PendingEventListSerializer
     permission_classes = [IsAuthenticated, IsModerator]
 
     def get_queryset(self):
         return Event.objects.filter(
-            club__moderator=self.request.user,
+            club_id__in=moderated_club_ids(self.request.user),
             requires_approval=True,
             approved=False
-        )
+        ).select_related('club')
 
 
 # pending event approval view
@@ -283,7 +457,7 @@ class EventApprovalView(generics.RetrieveUpdateAPIView):
     lookup_field = 'id'
 
     def get_queryset(self):
-        return Event.objects.filter(club__moderator=self.request.user)
+        return Event.objects.filter(club_id__in=moderated_club_ids(self.request.user)).select_related('club__created_by')
 
     def update(self, request, *args, **kwargs):
         event = self.get_object()
@@ -298,9 +472,26 @@ class EventApprovalView(generics.RetrieveUpdateAPIView):
         if isinstance(approved_status, str):
             approved_status = approved_status.lower() in ['true', '1', 'yes']
 
-        event.approved = approved_status
-        event.requires_approval = False
-        event.save()
+        with transaction.atomic(using=tenant_db()):
+            event.approved = approved_status
+            event.requires_approval = False
+            event.save()
+            fan_out_event(event)
+
+            if approved_status:
+                # let every approved member of the club know about the new event
+                member_emails = ClubMember.objects.filter(club_id=event.club_id, approved=True, user__is_active=True).values_list('user__email', flat=True)
+                queue_bulk_email(
+                    member_emails,
+                    f"New event: {event.title}",
+                    f"{event.club.name} has a new event '{event.title}' on {event.date_time:%Y-%m-%d %H:%M} at {event.venue}."
+                )
+            else:
+                queue_email(
+                    event.club.created_by.email,
+                    f"Event rejected: {event.title}",
+                    f"The event '{event.title}' for {event.club.name} was not approved."
+                )
 
         message = "Event approved successfully." if approved_status else "Event rejected."
         return Response({"message": message}, status=status.HTTP_200_OK)
@@ -308,7 +499,7 @@ class EventApprovalView(generics.RetrieveUpdateAPIView):
 
 
 # approve events list view
-class ApprovedEventListView(generics.ListAPIView):
+class ApprovedEventListView(StreamingListMixin, generics.ListAPIView):
     serializer_class = ApprovedEventListSerializer
     permission_classes = [IsAuthenticated]
 
@@ -317,11 +508,32 @@ class ApprovedEventListView(generics.ListAPIView):
         return Event.objects.filter(
             approved=True,
             date_time__gt=now  # Only future events
-        ).order_by('date_time')
+        ).select_related('club').with_registration_count().order_by('date_time')
         
         
+# personalized feed: upcoming events of the clubs the student is a member of
+class StudentFeedView(StreamingListMixin, generics.ListAPIView):
+    serializer_class = ApprovedEventListSerializer
+    permission_classes = [IsAuthenticated, IsStudent]
+    pagination_class = StandardPagination
+
+    def get_queryset(self):
+        return feed_queryset(self.request.user).with_registration_count()
+
+
+# "recommended for you": upcoming events often chosen by students who chose the same events
+class RecommendedEventListView(generics.ListAPIView):
+    serializer_class = ApprovedEventListSerializer
+    permission_classes = [IsAuthenticated, IsStudent]
+
+    def get_queryset(self):
+        return recommended_events(self.request.user)
+
+
 # event list for moderator( only their club's approved events)
 class ModeratorEventView(
+    StreamingListMixin,
+    ValuesListMixin,
     mixins.ListModelMixin,
     mixins.RetrieveModelMixin,
     mixins.DestroyModelMixin,
@@ -329,15 +541,16 @@ class ModeratorEventView(
 ):
     # moderators can view list of events they moderate, view single event detail, and delete an event
     serializer_class = ModeratorEventSerializer
+    values_serializer_class = ModeratorEventValuesSerializer
     permission_classes = [IsAuthenticated, IsModerator]
     lookup_field = 'id'
 
     def get_queryset(self):
        # Return only approved events where this moderator is assigned
         return Event.objects.filter(
-            club__moderator=self.request.user,
+            club_id__in=moderated_club_ids(self.request.user),
             approved=True
-        )
+        ).select_related('club')
 
     def get(self, request, *args, **kwargs):
         if 'id' in kwargs:
@@ -353,11 +566,11 @@ class ModeratorEventView(
             )
 
         event = self.get_object()
-        event_name = event.title
-        event.delete()
-        return Response(
-            {"message": f"Event '{event_name}' deleted successfully."},
-            status=status.HTTP_204_NO_CONTENT
+        with transaction.atomic(using=tenant_db()):
+            event.soft_delete()
+            job = enqueue('purge_event', {'event_id': event.id}, user=request.user)
+        return job_accepted_response(
+            job, f"Event '{event.title}' deleted successfully. Its registrations are being removed."
         )
         
         
@@ -366,6 +579,9 @@ class ModeratorEventView(
 class EventRegistrationFormView(generics.RetrieveUpdateAPIView):
     serializer_class = EventRegistrationFormSerializer
     permission_classes = [IsAuthenticated, IsStudent]
+    throttle_classes = [UserTokenBucketThrottle, IPTokenBucketThrottle]
+    throttle_scope = 'event_register'
+    throttle_methods = ['PUT', 'DELETE']
     lookup_field = 'id'
 
     def get_object(self):
@@ -378,17 +594,44 @@ class EventRegistrationFormView(generics.RetrieveUpdateAPIView):
         serializer = self.get_serializer(instance=EventRegistration(event=event))
         return Response(serializer.data)
 
+    @idempotent
     def put(self, request, *args, **kwargs):
         event = self.get_object()
         serializer = self.get_serializer(data=request.data, context={'request': request, 'event': event})
         serializer.is_valid(raise_exception=True)
-        serializer.save()
+        entry = serializer.save()
+
+        if isinstance(entry, EventWaitlist):
+            return Response(
+                {
+                    "message": "This event is full. You have been added to the waitlist.",
+                    "waitlist_position": waitlist_rank(entry)
+                },
+                status=status.HTTP_202_ACCEPTED
+            )
         return Response({"message": "You have successfully registered for this event."}, status=status.HTTP_201_CREATED)
+
+    def delete(self, request, *args, **kwargs):
+        # Cancel registration (or leave the waitlist); a freed seat goes to the next student in line
+        event = self.get_object()
+        if event.date_time <= timezone.now():
+            return Response(
+                {"error": "Cannot cancel registration for past events."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        promoted = cancel_registration(event, request.user)
+        if promoted is None:
+            return Response(
+                {"error": "You are not registered or waitlisted for this event."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return Response({"message": "Your registration has been cancelled."}, status=status.HTTP_200_OK)
     
     
 
 # list of registration for an event
-class EventRegistrationListByModeratorView(generics.ListAPIView):
+class EventRegistrationListByModeratorView(StreamingListMixin, generics.ListAPIView):
     serializer_class = EventRegistrationListSerializer
     permission_classes = [IsAuthenticated, IsModerator]
 
@@ -403,11 +646,11 @@ class EventRegistrationListByModeratorView(generics.ListAPIView):
             raise PermissionDenied("Event not found.")
 
         # Check if moderator is allowed to view
-        if event.club.moderator != user:
+        if event.club_id not in moderated_club_ids(user):
             raise PermissionDenied("You are not authorized to view registrations for this event.")
 
-        # Return list of registered users
-        return EventRegistration.objects.filter(event=event)
+        # Return list of registered users ( deactivated ones are hidden until they are purged )
+        return EventRegistration.objects.filter(event=event, student__is_active=True).select_related('student__student_profile', 'event__club')
     
     
 # submit feedback view ( for registered students only)
@@ -416,11 +659,11 @@ class FeedbackCreateView(generics.CreateAPIView):
     permission_classes = [IsStudent]
 
     def get_queryset(self):
-        return Feedback.objects.filter(registration__student=self.request.user)
+        return Feedback.objects.filter(registration__student=self.request.user, registration__event__deleted_at__isnull=True)
     
  
 # Feedback list view for moderators   
-class EventFeedbackListView(generics.ListAPIView):
+class EventFeedbackListView(StreamingListMixin, generics.ListAPIView):
     
     # Feedback list view for moderators
     serializer_class = FeedbacklistSerializer
@@ -431,13 +674,20 @@ class EventFeedbackListView(generics.ListAPIView):
         event_id = self.kwargs.get('event_id')
 
         # Check if event exists and belongs to this moderator
+        club_ids = moderated_club_ids(user)
         try:
-            event = Event.objects.get(id=event_id, club__moderator=user)
+            event = Event.objects.get(id=event_id, club_id__in=club_ids)
         except Event.DoesNotExist:
+            # past events may have been moved to the archive
+            if ArchivedEvent.objects.filter(id=event_id, club_id__in=club_ids).exists():
+                return ArchivedFeedback.objects.filter(registration__event_id=event_id, registration__student__is_active=True).select_related(
+                    'registration__student',
+                    'registration__event__club'
+                )
             return Feedback.objects.none()  # Return empty if not their event
 
         # Fetch feedbacks related to this event
-        return Feedback.objects.filter(registration__event=event).select_related(
+        return Feedback.objects.filter(registration__event=event, registration__student__is_active=True).select_related(
             'registration__student',
             'registration__event__club'
         )
@@ -452,26 +702,276 @@ class EventFeedbackListView(generics.ListAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
 
+        if self.is_streaming():
+            return self.stream_list(queryset)
+
         serializer = self.get_serializer(queryset, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
     
     
     
 # Total number of registraions and amount collected for an event
-class EventStatisticsView(generics.ListAPIView):
+class EventStatisticsView(StreamingListMixin, generics.ListAPIView):
     serializer_class = EventStatisticsSerializer
     permission_classes = [IsAuthenticated, IsModerator]
 
     def get_queryset(self):
-        user = self.request.user
-        # Ensure only moderator’s club events are shown
-        return (
-            Event.objects.filter(club__moderator=user)
-            .annotate(
-                total_registrations=Count('registrations', distinct=True),
-                total_amount_collected=ExpressionWrapper(
-                    Count('registrations', distinct=True) * F('fee'),
-                    output_field=DecimalField(max_digits=10, decimal_places=2)
+        club_ids = moderated_club_ids(self.request.user)
+        # Ensure only moderator’s club events are shown ( archived events included )
+        return statistics_with_archive(
+            Event.objects.filter(club_id__in=club_ids),
+            ArchivedEvent.objects.filter(club_id__in=club_ids)
+        )
+
+
+
+# Moderator dashboard: clubs, membership requests, pending events, approved events and
+# statistics in one response. The moderator's clubs are loaded once and every other
+# section is a single values() query filtered by those club ids, so the number of
+# queries stays the same however much data the moderator has.
+class ModeratorDashboardView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsModerator]
+
+    @staticmethod
+    def _section(serializer_class, queryset):
+        serializer = serializer_class()
+        return serializer.to_representation(serializer.values(queryset))
+
+    def get(self, request):
+        clubs = self._section(ModeratorClubValuesSerializer, Club.objects.filter(moderator=request.user).order_by('id'))
+        club_ids = [club['id'] for club in clubs]
+        events = Event.objects.filter(club_id__in=club_ids).order_by('date_time', 'id')
+
+        return Response({
+            "clubs": clubs,
+            "member_requests": self._section(
+                ClubMemberRequestValuesSerializer,
+                ClubMember.objects.filter(club_id__in=club_ids, approved=False, user__is_active=True).order_by('id')
+            ),
+            "pending_events": self._section(
+                PendingEventValuesSerializer,
+                events.filter(requires_approval=True, approved=False)
+            ),
+            "events": self._section(ModeratorEventValuesSerializer, events.filter(approved=True)),
+            # archived events included, as in event/statistics/
+            "statistics": self._section(
+                EventStatisticsValuesSerializer,
+                statistics_with_archive(
+                    Event.objects.filter(club_id__in=club_ids),
+                    ArchivedEvent.objects.filter(club_id__in=club_ids)
                 )
+            ),
+        })
+
+
+
+# Batch endpoint: several API calls in one request, authenticated once
+class BatchView(generics.GenericAPIView):
+    """
+    POST {"requests": [{"method": "GET", "path": "/profile/", "body": {...}, "headers": {...}}, ...],
+          "parallel": false}
+    Answers {"responses": [{"status": 200, "body": {...}}, ...]} in the same order.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        specs = request.data.get('requests')
+        if not isinstance(specs, list) or not specs or not all(isinstance(spec, dict) for spec in specs):
+            return Response(
+                {"error": "Please provide 'requests' as a non-empty list of objects."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if len(specs) > settings.BATCH_MAX_REQUESTS:
+            return Response(
+                {"error": f"A batch can contain at most {settings.BATCH_MAX_REQUESTS} requests."},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        )
\ No newline at end of file
+
+        parallel = str(request.data.get('parallel', False)).lower() in ['true', '1', 'yes']
+        responses = run_batch(
+            request, request.user, request.auth, specs,
+            parallel=parallel,
+            max_workers=settings.BATCH_MAX_WORKERS,
+            excluded_views=(BatchView, EventSeatStreamView),   # the seat stream is async and never ends
+        )
+        return Response({"responses": responses}, status=status.HTTP_200_OK)
+
+
+
+# Queue a background job and answer 202 with where to follow it
+def job_accepted_response(job, message):
+    return Response(
+        {"message": message, "job_id": job.id, "status": job.status, "status_url": f"/jobs/{job.id}/"},
+        status=status.HTTP_202_ACCEPTED
+    )
+
+
+# export registrations of an event to CSV in the background
+class EventRegistrationExportView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsModerator]
+
+    def post(self, request, event_id):
+        event = get_moderated_event(request.user, event_id)
+        job = enqueue('export_event_registrations', {'event_id': event.id}, user=request.user)
+        return job_accepted_response(job, f"Export of registrations for '{event.title}' has been queued.")
+
+
+# rebuild event statistics for the logged-in moderator in the background
+class EventStatisticsRebuildView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsModerator]
+
+    def post(self, request):
+        job = enqueue('event_statistics', {'moderator_id': request.user.id}, user=request.user)
+        return job_accepted_response(job, "Statistics rebuild has been queued.")
+
+
+# bulk import approved members into a moderated club
+class ClubMemberImportView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsModerator]
+
+    def post(self, request, club_id):
+        club = get_object_or_404(Club, id=club_id, moderator=request.user)
+        emails = request.data.get('emails')
+        if not isinstance(emails, list) or not emails:
+            return Response(
+                {"error": "Please provide 'emails' as a non-empty list."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        job = enqueue('import_club_members', {'club_id': club.id, 'emails': emails}, user=request.user)
+        return job_accepted_response(job, f"Import of {len(emails)} members into '{club.name}' has been queued.")
+
+
+# moderator uploads a payment file (CSV: university_id, email, amount) and gets a reconciliation report
+class EventPaymentReconcileView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsModerator]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request, event_id):
+        event = get_moderated_event(request.user, event_id)
+        upload = request.FILES.get('file')
+        if upload is None:
+            return Response({"error": "Please upload the payment file as 'file'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            rows = parse_payment_file(upload.read())
+        except (PaymentFileError, UnicodeDecodeError) as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+        report = reconcile_payments(event, rows, settings.PAYMENT_RECONCILE_BATCH_SIZE)
+        return Response(report, status=status.HTTP_200_OK)
+
+
+# student gets the signed ticket for an event they are registered for
+class EventTicketView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsStudent]
+
+    def get(self, request, event_id):
+        registration = get_object_or_404(EventRegistration, event_id=event_id, student=request.user)
+        return Response({"event": registration.event_id, "ticket": issue_ticket(registration)}, status=status.HTTP_200_OK)
+
+
+# moderator checks in a batch of scanned tickets at the door
+class EventCheckInView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsModerator]
+
+    def post(self, request, event_id):
+        event = get_moderated_event(request.user, event_id)
+        tickets = request.data.get('tickets')
+        if not isinstance(tickets, list) or not tickets:
+            return Response({"error": "Please provide 'tickets' as a non-empty list."}, status=status.HTTP_400_BAD_REQUEST)
+        if len(tickets) > settings.CHECKIN_MAX_SCANS:
+            return Response(
+                {"error": f"At most {settings.CHECKIN_MAX_SCANS} tickets can be checked in at once."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = check_in(event, tickets, scanned_by=request.user)
+        return Response({
+            "checked_in": sum(result['status'] == 'checked_in' for result in results),
+            "results": results,
+        }, status=status.HTTP_200_OK)
+
+
+# registration velocity ( registrations per hour or day ) of one event or one club, read from the rollups
+class RegistrationAnalyticsView(generics.GenericAPIView):
+    permission_classes = [IsAuthenticated, IsModerator]
+
+    def get(self, request):
+        query = RegistrationAnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+
+        if 'event' in params:
+            get_moderated_event(request.user, params['event'])
+        else:
+            get_object_or_404(Club, id=params['club'], moderator=request.user)
+
+        series = registration_series(
+            params['granularity'], event_id=params.get('event'), club_id=params.get('club'),
+            start=params.get('start'), end=params.get('end'),
+        )
+        return Response({
+            "granularity": params['granularity'],
+            "total": sum(point['count'] for point in series),
+            "series": series,
+        }, status=status.HTTP_200_OK)
+
+
+# background job status (moderators see their own jobs, admins see all)
+class JobStatusView(mixins.ListModelMixin, mixins.RetrieveModelMixin, generics.GenericAPIView):
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated, IsModeratorOrAdmin]
+    lookup_field = 'id'
+
+    def get_queryset(self):
+        jobs = Job.objects.select_related('created_by').order_by('-id')
+        if self.request.user.has_role('admin'):
+            return jobs
+        return jobs.filter(created_by=self.request.user)
+
+    def get(self, request, *args, **kwargs):
+        if 'id' in kwargs:
+            return self.retrieve(request, *args, **kwargs)
+        return self.list(request, *args, **kwargs)
+
+
+# Live seats_left of upcoming approved events over Server-Sent Events ( ASGI only, see app/seats.py ):
+# GET event/seats/stream/?events=1,2,3 with the usual "Authorization: Bearer <access token>"
+class EventSeatStreamView(View):
+    async def get(self, request):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({"error": "The seat stream is only served by the ASGI application (asgi.py)."}, status=400)
+
+        try:
+            authenticated = await sync_to_async(RevocableJWTAuthentication().authenticate)(request)
+        except AuthenticationFailed as exc:
+            return JsonResponse({"detail": exc.detail}, status=401)
+        if authenticated is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."}, status=401)
+        user = authenticated[0]
+
+        try:
+            event_ids = sorted({int(value) for value in request.GET.get('events', '').split(',') if value.strip()})
+        except ValueError:
+            return JsonResponse({"error": "events must be a comma separated list of event IDs."}, status=400)
+        if not event_ids or len(event_ids) > settings.SEATS_STREAM_MAX_EVENTS:
+            return JsonResponse(
+                {"error": f"Subscribe to between 1 and {settings.SEATS_STREAM_MAX_EVENTS} events."}, status=400
+            )
+
+        with tenant_context(user.tenant):
+            seats = await sync_to_async(self.current_seats)(event_ids)
+            keys = {seats_key(event_id): event_id for event_id in seats}
+        missing = [event_id for event_id in event_ids if event_id not in seats]
+        if missing:
+            return JsonResponse({"error": f"No upcoming approved events with IDs {missing}."}, status=404)
+
+        response = StreamingHttpResponse(seat_events(keys, seats), content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'   # nginx: pass the events through unbuffered
+        return response
+
+    def current_seats(self, event_ids):
+        upcoming = Event.objects.filter(id__in=event_ids, approved=True, date_time__gt=timezone.now()).values_list('id', flat=True)
+        return current_seats(list(upcoming))
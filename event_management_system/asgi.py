@@ -14,3 +14,9 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'event_management_system.settings')
 
 application = get_asgi_application()
+
+# import the views, build the serializers and connect to the databases before taking traffic
+from django.conf import settings  # noqa: E402
+if settings.WARM_UP_ON_STARTUP:
+    from app.startup import warm_up  # noqa: E402
+    warm_up()
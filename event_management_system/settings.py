@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -48,6 +50,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'app.sharding.TenantMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,6 +74,11 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'event_management_system.wsgi.application'
 
+# wsgi.py / asgi.py import every view and connect to the databases before the worker
+# takes traffic ( app/startup.py ); WARM_UP_ON_STARTUP=0 starts faster and leaves that
+# to the first requests
+WARM_UP_ON_STARTUP = os.environ.get('WARM_UP_ON_STARTUP', '1') == '1'
+
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
@@ -79,9 +87,35 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {
+            # take the write lock when a transaction starts, so concurrent
+            # seat assignments queue up instead of failing with "database is locked"
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': 20,
+        },
+        # connections are closed after each request unless DB_CONN_MAX_AGE opts in to keeping
+        # them ( for single-threaded WSGI workers; Django advises against it under ASGI )
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+        'CONN_HEALTH_CHECKS': True,
+        # a file rather than SQLite's shared in-memory database, which fails with "table is
+        # locked" instead of waiting for the lock, so threaded tests lock like production
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
+# Per-university sharding ( see app/sharding.py ): SHARD_TENANTS=uni1,uni2 gives each
+# tenant its own SQLite file next to the global one. `manage.py migrate_shards` migrates all.
+SHARDS = {}
+for tenant in filter(None, os.environ.get('SHARD_TENANTS', '').split(',')):
+    SHARDS[tenant] = f'shard_{tenant}'
+    DATABASES[SHARDS[tenant]] = {
+        **DATABASES['default'],
+        'NAME': BASE_DIR / f'db_{tenant}.sqlite3',
+        'TEST': {'NAME': BASE_DIR / f'test_db_{tenant}.sqlite3'},
+    }
+
+DATABASE_ROUTERS = ['app.sharding.TenantRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -131,13 +165,62 @@ AUTH_USER_MODEL = 'app.User'
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'app.authentication.RevocableJWTAuthentication',
     
     ),
+    # reverse proxies in front of the app; X-Forwarded-For is ignored with 0, otherwise
+    # the client IP is taken that many hops from the right ( IP throttles rely on it )
+    'NUM_PROXIES': int(os.environ.get('NUM_PROXIES', '0')),
     
 }
 
 
+# 'shared' is visible to every worker process on this host (throttle buckets and other
+# cross-worker state); swap it for a networked cache when running on several hosts
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': Path(tempfile.gettempdir()) / 'event_management_system_cache',
+        # the default of 300 entries would evict idempotency keys and token revocations
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    },
+}
+
+
+# admin changelists count results exactly up to this many rows, bigger tables show an estimate
+ADMIN_EXACT_COUNT_LIMIT = 10000
+
+
+# rows per chunk when a list endpoint is streamed with ?stream=true
+STREAM_CHUNK_SIZE = 500
+
+
+# POST /batch/ limits
+BATCH_MAX_REQUESTS = 20
+BATCH_MAX_WORKERS = 4         # threads for {"parallel": true} batches of reads
+
+
+# Token buckets per throttle_scope: kind -> (capacity, refill per second)
+THROTTLE_CACHE = 'shared'
+THROTTLE_BUCKETS = {
+    # password hashing is expensive, a client gets 5 attempts then one every 5 seconds; an
+    # account takes 10 failed logins then one every 5 seconds, a single address alone never
+    # empties it
+    'token': {'ip': (5, 0.2), 'username': (10, 0.2)},
+    'event_register': {'user': (5, 0.5), 'ip': (50, 5)},
+    'club_apply': {'user': (5, 0.5), 'ip': (50, 5)},
+}
+
+
+# Responses to writes sent with an Idempotency-Key header are replayed for retries
+IDEMPOTENCY_CACHE = 'shared'
+IDEMPOTENCY_TTL = 24 * 60 * 60        # how long a key can be retried
+IDEMPOTENCY_LOCK_SECONDS = 60         # a request still running after this is assumed lost
+
+
 from datetime import timedelta
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=1),   # 👈 1 day validity
@@ -145,6 +228,75 @@ SIMPLE_JWT = {
 }
 
 
+# Revoked JWTs ( logout, sign out everywhere ) are stored in the database; the shared
+# cache only carries the version that tells workers to reload them
+REVOCATION_CACHE = 'shared'
+REVOCATION_SYNC_SECONDS = 1.0         # how often a worker checks for revocations made elsewhere
+REVOCATION_BLOOM_BITS = 1 << 20       # 128 KiB, ~1% false positives at 100k revoked tokens
+REVOCATION_BLOOM_HASHES = 7
+
+
 AUTHENTICATION_BACKENDS = [
     'django.contrib.auth.backends.ModelBackend',
 ]
+
+
+# Notification emails are queued in the outbox and sent by `manage.py drain_outbox`
+EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# EMAIL_BACKEND = 'django.core.mail.backends.filebased.EmailBackend'
+EMAIL_FILE_PATH = BASE_DIR / 'sent_emails'
+DEFAULT_FROM_EMAIL = 'noreply@eventmanagement.local'
+
+OUTBOX_BATCH_SIZE = 100
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF_SECONDS = 30         # first retry delay, doubled on every attempt
+OUTBOX_MAX_BACKOFF_SECONDS = 3600
+OUTBOX_LEASE_SECONDS = 300          # a claimed message is retried if not finished within this time
+
+
+# Background jobs are stored in the database and run by `manage.py run_jobs`
+JOB_MAX_ATTEMPTS = 3
+JOB_LEASE_SECONDS = 600             # a running job is reclaimed by another worker after this
+JOB_HEARTBEAT_SECONDS = 60          # how often a running job extends its lease
+JOB_RETRY_BACKOFF_SECONDS = 60      # first retry delay, doubled on every attempt
+JOB_EXPORT_DIR = BASE_DIR / 'exports'
+PURGE_CHUNK_SIZE = 500              # rows deleted per transaction when purging deleted clubs, events and users
+
+
+# registrations marked paid per UPDATE when a payment file is reconciled
+PAYMENT_RECONCILE_BATCH_SIZE = 1000
+
+
+# scanned tickets accepted by one POST event/<id>/checkin/
+CHECKIN_MAX_SCANS = 500
+
+
+# "recommended for you", rebuilt by `manage.py build_recommendations` ( needs numpy )
+RECOMMENDATION_TOP_K = 20                 # similar upcoming events stored per event
+RECOMMENDATION_MEMBER_WEIGHT = 0.3        # a club membership counts this much for each event of the club
+RECOMMENDATION_EVENT_BATCH = 256          # events per similarity block
+RECOMMENDATION_STUDENT_BATCH = 2048       # students per dense matrix chunk
+RECOMMENDATION_LIMIT = 20
+
+
+# live seats_left over Server-Sent Events ( event/seats/stream/, app/seats.py )
+SEATS_CACHE = 'shared'                # carries seat counts from the writing worker to every streaming worker
+SEATS_CACHE_TTL = 300                 # a published count is recounted from the database after this
+SEATS_STREAM_INTERVAL = 0.5           # at most one update per event and watcher in this many seconds
+SEATS_STREAM_KEEPALIVE = 15           # seconds between keep-alive comments on an idle stream
+SEATS_STREAM_MAX_EVENTS = 50          # events one stream can subscribe to
+
+
+# ids of the clubs each moderator moderates ( app/moderation.py ), dropped when a club changes
+MODERATOR_SCOPE_CACHE = 'shared'
+MODERATOR_SCOPE_TTL = 600             # also recomputed after this, in case a change bypassed the model
+
+
+# `manage.py archive_events` moves events older than this into the archive tables
+ARCHIVE_AFTER_DAYS = 180
+ARCHIVE_CHUNK_SIZE = 500      # events per transaction
+
+
+# Approved events are copied into the feed of every club member, except for clubs
+# larger than this; their events are looked up when the feed is read instead
+FEED_FANOUT_MAX_MEMBERS = 5000